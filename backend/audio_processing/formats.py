@@ -0,0 +1,89 @@
+"""
+Audio container detection and lazy format conversion for user uploads.
+
+Whisper accepts most compressed containers directly, while the chat audio
+model only takes WAV or MP3 input and the speech check runs on PCM. UserAudio
+keeps the original upload and converts it to WAV at most once.
+"""
+import io
+import logging
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Containers accepted by the transcription endpoint
+TRANSCRIPTION_FORMATS = {"flac", "m4a", "mp3", "mp4", "mpeg", "mpga", "oga", "ogg", "wav", "webm"}
+
+
+def sniff_format(audio_bytes: bytes) -> Optional[str]:
+    """Detect the audio container from its magic bytes."""
+    head = audio_bytes[:12]
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "wav"
+    if head[:4] == b"\x1A\x45\xDF\xA3":
+        return "webm"
+    if head[:4] == b"OggS":
+        return "ogg"
+    if head[:4] == b"fLaC":
+        return "flac"
+    if head[4:8] == b"ftyp":
+        return "m4a"
+    if head[:3] == b"ID3" or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return "mp3"
+    return None
+
+
+def convert_to_wav(audio_bytes: bytes, audio_format: Optional[str] = None) -> bytes:
+    """
+    Decode any ffmpeg-readable audio into a WAV file using pydub.
+
+    Raises:
+        ValueError: If the audio cannot be decoded
+    """
+    from pydub import AudioSegment
+
+    try:
+        audio = AudioSegment.from_file(io.BytesIO(audio_bytes), format=audio_format)
+        buf = io.BytesIO()
+        audio.export(buf, format="wav")
+        return buf.getvalue()
+    except Exception as e:
+        logger.error("Audio conversion failed: %s", str(e).split('\n')[0])
+        raise ValueError("Audio conversion failed") from e
+
+
+class UserAudio:
+    """
+    A user recording in its original container.
+
+    Args:
+        data: The raw uploaded bytes
+    """
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.format = sniff_format(data)
+        self._wav: Optional[bytes] = None
+
+    @property
+    def filename(self) -> str:
+        return f"audio.{self.format or 'wav'}"
+
+    def wav(self) -> bytes:
+        """The recording as WAV, converted on first use and cached."""
+        if self.format == "wav":
+            return self.data
+        if self._wav is None:
+            logger.info(f"Converting {self.format or 'unknown'} upload ({len(self.data)} bytes) to WAV")
+            self._wav = convert_to_wav(self.data, self.format)
+        return self._wav
+
+    def transcription_payload(self, wav_bytes: Optional[bytes] = None) -> Tuple[bytes, str]:
+        """
+        Bytes and filename to upload for transcription: a compressed upload the
+        API accepts as is, otherwise `wav_bytes` (e.g. the preprocessed recording)
+        or the converted WAV.
+        """
+        if self.format in TRANSCRIPTION_FORMATS and self.format != "wav":
+            return self.data, self.filename
+        return (wav_bytes if wav_bytes is not None else self.wav()), "audio.wav"
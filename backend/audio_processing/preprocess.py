@@ -0,0 +1,158 @@
+"""
+Preprocessing of user recordings before transcription.
+
+Recordings are decoded with the standard library, downmixed to mono, trimmed
+of leading and trailing silence with an energy-based voice activity check,
+loudness normalized and resampled to 16 kHz mono PCM16. Recordings without
+any speech are flagged as empty so no API call is made for them.
+"""
+import io
+import logging
+import os
+import wave
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from backend.audio_processing.vad import (
+    DEFAULT_SILENCE_DB,
+    FRAME_MS,
+    pcm16_to_wav,
+    speech_frames,
+)
+
+logger = logging.getLogger(__name__)
+
+TARGET_SAMPLE_RATE = 16000
+SILENCE_DB = float(os.environ.get("PREPROCESS_SILENCE_DB", str(DEFAULT_SILENCE_DB)))
+# Recordings with less detected speech than this are considered empty
+MIN_SPEECH_MS = int(os.environ.get("PREPROCESS_MIN_SPEECH_MS", "200"))
+# Silence kept before the first and after the last speech frame
+PADDING_MS = 250
+# Loudness normalization: target RMS of the kept audio, peak ceiling and maximum gain
+TARGET_RMS_DB = -20.0
+PEAK_CEILING_DB = -1.0
+MAX_GAIN_DB = 20.0
+
+
+@dataclass
+class PreprocessResult:
+    """Outcome of preprocessing a single recording."""
+    wav_bytes: Optional[bytes]  # None when the recording is empty
+    original_bytes: int
+    original_duration: float
+    speech_duration: float
+
+    @property
+    def is_empty(self) -> bool:
+        return self.wav_bytes is None
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - (len(self.wav_bytes) if self.wav_bytes else 0)
+
+
+def decode_wav(wav_bytes: bytes) -> tuple:
+    """
+    Decode a PCM WAV file into mono float32 samples in [-1, 1].
+
+    Returns:
+        Tuple of (samples, sample_rate)
+    """
+    with wave.open(io.BytesIO(wav_bytes), "rb") as wav_file:
+        channels = wav_file.getnchannels()
+        sample_width = wav_file.getsampwidth()
+        sample_rate = wav_file.getframerate()
+        frames = wav_file.readframes(wav_file.getnframes())
+
+    if sample_width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif sample_width == 2:
+        samples = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768.0
+    elif sample_width == 3:
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3)
+        ints = (raw[:, 0].astype(np.int32) | (raw[:, 1].astype(np.int32) << 8) | (raw[:, 2].astype(np.int32) << 16))
+        ints = np.where(ints >= 1 << 23, ints - (1 << 24), ints)
+        samples = ints.astype(np.float32) / float(1 << 23)
+    elif sample_width == 4:
+        samples = np.frombuffer(frames, dtype="<i4").astype(np.float32) / float(1 << 31)
+    else:
+        raise ValueError(f"Unsupported WAV sample width: {sample_width}")
+
+    if channels > 1:
+        samples = samples[:len(samples) // channels * channels].reshape(-1, channels).mean(axis=1)
+    return samples, sample_rate
+
+
+def resample(samples: np.ndarray, src_rate: int, dst_rate: int) -> np.ndarray:
+    """Band-limited FFT resampling (the spectrum above the new Nyquist is dropped)."""
+    if src_rate == dst_rate or len(samples) == 0:
+        return samples
+    n_out = int(round(len(samples) * dst_rate / src_rate))
+    spectrum = np.fft.rfft(samples)
+    return (np.fft.irfft(spectrum[:n_out // 2 + 1], n_out) * (n_out / len(samples))).astype(np.float32)
+
+
+def trim_silence(samples: np.ndarray, sample_rate: int) -> np.ndarray:
+    """
+    Cut leading and trailing silence, keeping PADDING_MS around the speech.
+    Returns an empty array if the recording has less than MIN_SPEECH_MS of speech.
+    """
+    as_int16 = (np.clip(samples, -1.0, 1.0) * 32767.0).astype(np.int16)
+    mask = speech_frames(as_int16, sample_rate, SILENCE_DB)
+    if mask.sum() * FRAME_MS < MIN_SPEECH_MS:
+        return samples[:0]
+    frame_len = max(1, sample_rate * FRAME_MS // 1000)
+    padding = sample_rate * PADDING_MS // 1000
+    voiced = np.flatnonzero(mask)
+    start = max(0, voiced[0] * frame_len - padding)
+    end = min(len(samples), (voiced[-1] + 1) * frame_len + padding)
+    return samples[start:end]
+
+
+def normalize_loudness(samples: np.ndarray) -> np.ndarray:
+    """Scale towards TARGET_RMS_DB without exceeding PEAK_CEILING_DB or MAX_GAIN_DB."""
+    rms = float(np.sqrt(np.mean(samples * samples)))
+    peak = float(np.max(np.abs(samples)))
+    if rms <= 0.0 or peak <= 0.0:
+        return samples
+    gain_db = min(
+        TARGET_RMS_DB - 20.0 * np.log10(rms),
+        PEAK_CEILING_DB - 20.0 * np.log10(peak),
+        MAX_GAIN_DB,
+    )
+    return samples * np.float32(10.0 ** (gain_db / 20.0))
+
+
+def preprocess_for_transcription(wav_bytes: bytes) -> PreprocessResult:
+    """
+    Trim, normalize and resample a WAV recording to 16 kHz mono PCM16.
+
+    Args:
+        wav_bytes: The recording as a WAV file
+
+    Returns:
+        PreprocessResult with the smaller WAV, or an empty result if no speech was found
+    """
+    samples, sample_rate = decode_wav(wav_bytes)
+    original_duration = len(samples) / sample_rate if sample_rate else 0.0
+
+    trimmed = trim_silence(samples, sample_rate)
+    if len(trimmed) == 0:
+        logger.info(f"No speech detected in {original_duration:.2f}s recording, skipping transcription")
+        return PreprocessResult(None, len(wav_bytes), original_duration, 0.0)
+
+    processed = normalize_loudness(resample(trimmed, sample_rate, TARGET_SAMPLE_RATE))
+    pcm = (np.clip(processed, -1.0, 1.0) * 32767.0).astype(np.int16)
+    result = PreprocessResult(
+        pcm16_to_wav(pcm, TARGET_SAMPLE_RATE),
+        len(wav_bytes),
+        original_duration,
+        len(pcm) / TARGET_SAMPLE_RATE,
+    )
+    logger.info(
+        f"Preprocessed audio: {original_duration:.2f}s -> {result.speech_duration:.2f}s, "
+        f"{result.original_bytes} -> {len(result.wav_bytes)} bytes ({result.bytes_saved} saved)"
+    )
+    return result
@@ -0,0 +1,187 @@
+"""
+Streaming audio uplink for /ws/conversation.
+
+The client streams raw PCM16 mono chunks while the participant is still
+speaking. Chunks are written into a preallocated ring buffer, split into
+segments on server-side silence detection and every finished segment is
+transcribed in the background. When the participant stops, only the short
+tail after the last pause is left to transcribe.
+"""
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+import numpy as np
+
+from backend.audio_processing.vad import (
+    DEFAULT_SILENCE_DB,
+    FRAME_MS,
+    frame_energies_db,
+    pcm16_from_bytes,
+    pcm16_to_wav,
+)
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_SAMPLE_RATES = (16000, 24000, 44100, 48000)
+DEFAULT_SAMPLE_RATE = 24000
+
+# Longest segment kept in the ring before a cut is forced
+MAX_SEGMENT_SECONDS = float(os.environ.get("UPLINK_MAX_SEGMENT_SECONDS", "30"))
+# Pause length that closes a segment
+MIN_SILENCE_MS = int(os.environ.get("UPLINK_MIN_SILENCE_MS", "600"))
+SILENCE_DB = float(os.environ.get("UPLINK_SILENCE_DB", str(DEFAULT_SILENCE_DB)))
+# Audio kept around speech so words are not clipped at segment edges
+PADDING_MS = 200
+# Background transcriptions allowed in flight per session
+MAX_PENDING_TRANSCRIPTIONS = 2
+
+
+class AudioRingBuffer:
+    """Fixed-size int16 ring addressed by absolute sample positions."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=np.int16)
+        self.written = 0  # absolute number of samples ever written
+
+    def write(self, samples: np.ndarray) -> None:
+        n = len(samples)
+        if n > self.capacity:
+            samples = samples[-self.capacity:]
+            self.written += n - self.capacity
+            n = self.capacity
+        pos = self.written % self.capacity
+        first = min(n, self.capacity - pos)
+        self._data[pos:pos + first] = samples[:first]
+        if first < n:
+            self._data[:n - first] = samples[first:]
+        self.written += n
+
+    def read(self, start: int, end: int) -> np.ndarray:
+        """Copy samples in the absolute range [start, end)."""
+        if end - start > self.capacity or start < self.written - self.capacity:
+            raise ValueError("Requested range is no longer in the ring buffer")
+        n = end - start
+        pos = start % self.capacity
+        first = min(n, self.capacity - pos)
+        out = np.empty(n, dtype=np.int16)
+        out[:first] = self._data[pos:pos + first]
+        if first < n:
+            out[first:] = self._data[:n - first]
+        return out
+
+
+class StreamingUplink:
+    """
+    Segments an incoming PCM16 stream and transcribes segments while recording.
+
+    Args:
+        transcribe: Coroutine function taking WAV bytes and returning the transcript
+        sample_rate: Sample rate of the incoming PCM16 mono stream
+    """
+
+    def __init__(self, transcribe: Callable[[bytes], Awaitable[str]], sample_rate: int = DEFAULT_SAMPLE_RATE):
+        if sample_rate not in SUPPORTED_SAMPLE_RATES:
+            raise ValueError(f"Unsupported sample rate: {sample_rate}")
+        self.sample_rate = sample_rate
+        self._transcribe = transcribe
+        self._ring = AudioRingBuffer(int(MAX_SEGMENT_SECONDS * sample_rate))
+        self._frame_len = sample_rate * FRAME_MS // 1000
+        self._padding = sample_rate * PADDING_MS // 1000
+        self._min_silence_frames = max(1, MIN_SILENCE_MS // FRAME_MS)
+        self._pending = b""  # odd trailing byte between chunks
+        self._analyzed = 0
+        self._segment_start = 0
+        self._last_speech_end: Optional[int] = None
+        self._silence_frames = 0
+        self._segments: List[np.ndarray] = []
+        self._tasks: List[asyncio.Task] = []
+        self._semaphore = asyncio.Semaphore(MAX_PENDING_TRANSCRIPTIONS)
+        self.received_bytes = 0
+
+    @property
+    def pending_transcriptions(self) -> int:
+        return sum(1 for task in self._tasks if not task.done())
+
+    @property
+    def buffered_bytes(self) -> int:
+        """Memory held by the ring buffer."""
+        return self._ring.capacity * 2
+
+    def feed(self, chunk: bytes) -> None:
+        """Append a chunk of PCM16 audio and cut any segment that has finished."""
+        self.received_bytes += len(chunk)
+        data = self._pending + chunk
+        self._pending = data[len(data) - len(data) % 2:]
+        samples = pcm16_from_bytes(data[:len(data) - len(self._pending)])
+        # Analyze in slices of at most one second, and never write past the point where the
+        # current segment has to be cut, so the ring never overwrites the segment start
+        i = 0
+        while i < len(samples):
+            room = self._segment_start + self._ring.capacity - self._frame_len - self._ring.written
+            n = min(self.sample_rate, len(samples) - i, room)
+            self._ring.write(samples[i:i + n])
+            i += n
+            self._analyze()
+
+    def _analyze(self) -> None:
+        end = self._analyzed + (self._ring.written - self._analyzed) // self._frame_len * self._frame_len
+        if end <= self._analyzed:
+            return
+        energies = frame_energies_db(self._ring.read(self._analyzed, end), self._frame_len)
+        for i, db in enumerate(energies):
+            frame_end = self._analyzed + (i + 1) * self._frame_len
+            if db > SILENCE_DB:
+                self._last_speech_end = frame_end
+                self._silence_frames = 0
+                continue
+            self._silence_frames += 1
+            if self._last_speech_end is None:
+                # Only silence so far: slide the segment start forward, keeping a little pre-roll
+                self._segment_start = max(self._segment_start, frame_end - self._padding)
+            elif self._silence_frames >= self._min_silence_frames:
+                self._cut(min(frame_end, self._last_speech_end + self._padding))
+        self._analyzed = end
+        if self._ring.written - self._segment_start >= self._ring.capacity - self._frame_len:
+            logger.info("Uplink segment reached %.0fs, forcing a cut", MAX_SEGMENT_SECONDS)
+            self._cut(self._analyzed)
+
+    def _cut(self, end: int) -> None:
+        if self._last_speech_end is not None and end > self._segment_start:
+            segment = self._ring.read(self._segment_start, end)
+            self._segments.append(segment)
+            self._tasks.append(asyncio.create_task(self._transcribe_segment(segment)))
+        self._segment_start = end
+        self._last_speech_end = None
+        self._silence_frames = 0
+
+    async def _transcribe_segment(self, segment: np.ndarray) -> str:
+        async with self._semaphore:
+            try:
+                return (await self._transcribe(pcm16_to_wav(segment, self.sample_rate))).strip()
+            except Exception as e:
+                logger.error(f"Segment transcription failed: {e}")
+                return ""
+
+    async def finish(self) -> Tuple[str, Optional[bytes]]:
+        """
+        Close the stream, transcribe the remaining tail and collect all segments.
+
+        Returns:
+            The full transcript and the speech audio as WAV bytes (None if no speech was detected)
+        """
+        self._analyze()
+        if self._last_speech_end is not None:
+            self._cut(min(self._ring.written, self._last_speech_end + self._padding))
+        texts = await asyncio.gather(*self._tasks)
+        transcript = " ".join(text for text in texts if text)
+        if not self._segments:
+            return transcript, None
+        return transcript, pcm16_to_wav(np.concatenate(self._segments), self.sample_rate)
+
+    def cancel(self) -> None:
+        """Drop any in-flight segment transcriptions."""
+        for task in self._tasks:
+            task.cancel()
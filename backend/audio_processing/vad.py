@@ -0,0 +1,56 @@
+"""
+Energy-based voice activity helpers shared by the audio processing stages.
+All functions operate on mono PCM16 samples held in NumPy int16 arrays.
+"""
+import io
+import wave
+
+import numpy as np
+
+# Frames quieter than this (in dBFS) are treated as silence
+DEFAULT_SILENCE_DB = -45.0
+# Length of a single analysis frame in milliseconds
+FRAME_MS = 20
+
+
+def pcm16_from_bytes(pcm_bytes: bytes) -> np.ndarray:
+    """Interpret raw little-endian PCM16 bytes as an int16 array (no copy)."""
+    if len(pcm_bytes) % 2:
+        pcm_bytes = pcm_bytes[:-1]
+    return np.frombuffer(pcm_bytes, dtype="<i2")
+
+
+def frame_energies_db(samples: np.ndarray, frame_len: int) -> np.ndarray:
+    """
+    Compute the RMS energy of consecutive frames in dBFS.
+
+    Args:
+        samples: Mono int16 samples
+        frame_len: Number of samples per frame; a trailing partial frame is ignored
+
+    Returns:
+        Array with one dBFS value per full frame
+    """
+    n_frames = len(samples) // frame_len
+    if n_frames == 0:
+        return np.empty(0, dtype=np.float32)
+    frames = samples[:n_frames * frame_len].astype(np.float32).reshape(n_frames, frame_len)
+    rms = np.sqrt(np.mean(frames * frames, axis=1)) / 32768.0
+    return 20.0 * np.log10(np.maximum(rms, 1e-10))
+
+
+def speech_frames(samples: np.ndarray, sample_rate: int, silence_db: float = DEFAULT_SILENCE_DB) -> np.ndarray:
+    """Return a boolean mask marking which FRAME_MS frames contain speech."""
+    frame_len = max(1, sample_rate * FRAME_MS // 1000)
+    return frame_energies_db(samples, frame_len) > silence_db
+
+
+def pcm16_to_wav(samples: np.ndarray, sample_rate: int, channels: int = 1) -> bytes:
+    """Wrap int16 samples in a WAV container."""
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(np.ascontiguousarray(samples, dtype="<i2").tobytes())
+    return buf.getvalue()
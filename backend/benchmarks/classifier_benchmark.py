@@ -0,0 +1,192 @@
+"""
+Regression benchmark for the conversation stall classifier.
+
+Classifies every labelled conversation of a dataset concurrently and reports
+accuracy, the confusion matrix, and latency and token usage percentiles.
+
+Dataset format (backend/conversation_evaluation/test_conversations.json):
+    {"conversations": [{"name": ..., "expected": 0 | 1, "messages": [{"role": ..., "content": ...}]}]}
+where expected is 1 for a stalled and 0 for an active conversation.
+
+Results are cached on disk by a hash of the model, the classifier prompt and
+the conversation, so re-runs only call the model for conversations, prompts or
+models that changed.
+
+Usage:
+    python -m backend.benchmarks.classifier_benchmark --concurrency 8
+    python -m backend.benchmarks.classifier_benchmark --model gpt-4o-mini --fail-under 0.9
+    python -m backend.benchmarks.classifier_benchmark --local   # local model first, LLM fallback
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from backend.conversation_evaluation.evaluator import (
+    CLASSIFIER_MODEL,
+    SYSTEM_MESSAGE,
+    aclassify_conversation,
+    format_conversation,
+    load_test_conversations,
+)
+from backend.conversation_evaluation.stall_model import local_verdict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATASET = pathlib.Path(__file__).resolve().parents[1] / "conversation_evaluation" / "test_conversations.json"
+DEFAULT_CACHE = pathlib.Path(os.environ.get(
+    "CLASSIFIER_BENCHMARK_CACHE", pathlib.Path.home() / ".cache" / "apollolytics" / "classifier_results.json"
+))
+LABELS = {0: "active", 1: "stalled"}
+
+
+def conversation_hash(model: str, messages: List[Dict[str, str]]) -> str:
+    """Cache key: changes whenever the model, the prompt or the conversation changes."""
+    payload = "\x00".join([model, SYSTEM_MESSAGE, format_conversation(messages)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load_cache(path: pathlib.Path) -> Dict[str, Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except json.JSONDecodeError:
+        logger.warning(f"Ignoring unreadable cache {path}")
+        return {}
+
+
+def save_cache(path: pathlib.Path, cache: Dict[str, Dict[str, Any]]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, path)
+
+
+async def classify_all(conversations: List[Dict], model: str, concurrency: int,
+                       cache: Dict[str, Dict[str, Any]], local: bool = False) -> List[Dict[str, Any]]:
+    """
+    Classify every conversation, at most `concurrency` calls at a time; cached results are reused.
+    With `local`, the local stall model answers the conversations it is confident about.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def classify(conversation: Dict) -> Dict[str, Any]:
+        key = conversation_hash(model, conversation["messages"])
+        result = {"name": conversation.get("name", "Unnamed conversation"), "expected": conversation.get("expected")}
+        if local:
+            start = time.perf_counter()
+            verdict = local_verdict(conversation["messages"])
+            if verdict is not None:
+                return {**result, "verdict": verdict, "latency": time.perf_counter() - start, "cached": False, "local": True}
+        if key in cache:
+            return {**result, **cache[key], "cached": True}
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                verdict, usage = await aclassify_conversation(conversation["messages"], model)
+            except Exception as e:
+                logger.error(f"Classification failed for {result['name']}: {e}")
+                return {**result, "verdict": None, "error": str(e), "cached": False}
+            latency = time.perf_counter() - start
+        cache[key] = {"verdict": verdict, "latency": latency, "usage": usage}
+        return {**result, **cache[key], "cached": False}
+
+    return await asyncio.gather(*(classify(c) for c in conversations))
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    return {f"p{p}": float(np.percentile(values, p)) if values else None for p in (50, 95, 99)}
+
+
+def summarize(results: List[Dict[str, Any]], model: str, wall_time: float) -> Dict[str, Any]:
+    labelled = [r for r in results if r["expected"] in LABELS and r["verdict"] in LABELS]
+    confusion = {LABELS[e]: {LABELS[p]: 0 for p in LABELS} for e in LABELS}
+    for r in labelled:
+        confusion[LABELS[r["expected"]]][LABELS[r["verdict"]]] += 1
+    correct = sum(r["expected"] == r["verdict"] for r in labelled)
+    true_stalled = confusion["stalled"]["stalled"]
+    predicted_stalled = true_stalled + confusion["active"]["stalled"]
+    actual_stalled = true_stalled + confusion["stalled"]["active"]
+    return {
+        "model": model,
+        "conversations": len(results),
+        "labelled": len(labelled),
+        "cached": sum(r["cached"] for r in results),
+        "local": sum(r.get("local", False) for r in results),
+        "errors": sum(1 for r in results if r.get("error")),
+        "wall_time_s": wall_time,
+        "accuracy": correct / len(labelled) if labelled else None,
+        "stalled_precision": true_stalled / predicted_stalled if predicted_stalled else None,
+        "stalled_recall": true_stalled / actual_stalled if actual_stalled else None,
+        "confusion_matrix": confusion,
+        "latency_s": percentiles([r["latency"] for r in results if "latency" in r]),
+        "total_tokens": percentiles([r["usage"]["total_tokens"] for r in results if r.get("usage")]),
+        "tokens_used": sum(r["usage"].get("total_tokens", 0) for r in results if r.get("usage") and not r["cached"]),
+        "misclassified": [r["name"] for r in labelled if r["expected"] != r["verdict"]],
+    }
+
+
+def print_report(summary: Dict[str, Any]) -> None:
+    def fmt(value: Optional[float], digits: int = 3) -> str:
+        return "n/a" if value is None else f"{value:.{digits}f}"
+
+    print(f"\n=== Stall classifier benchmark: {summary['model']}, {summary['conversations']} conversations ===")
+    print(f"Cached: {summary['cached']}  Local: {summary['local']}  Errors: {summary['errors']}  Wall time: {summary['wall_time_s']:.2f}s  "
+          f"Tokens used: {summary['tokens_used']}")
+    print(f"Accuracy: {fmt(summary['accuracy'])} ({summary['labelled']} labelled)  "
+          f"Stalled precision: {fmt(summary['stalled_precision'])}  recall: {fmt(summary['stalled_recall'])}")
+    print(f"{'expected / predicted':>22} {'active':>8} {'stalled':>8}")
+    for expected, row in summary["confusion_matrix"].items():
+        print(f"{expected:>22} {row['active']:>8} {row['stalled']:>8}")
+    for name, unit in (("latency_s", "s"), ("total_tokens", "")):
+        digits = 3 if unit else 0
+        print(f"{name:>22}: " + "  ".join(f"{k}={fmt(v, digits)}" for k, v in summary[name].items()))
+    for name in summary["misclassified"]:
+        print(f"  misclassified: {name}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", type=pathlib.Path, default=DEFAULT_DATASET)
+    parser.add_argument("--model", default=CLASSIFIER_MODEL)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--cache", type=pathlib.Path, default=DEFAULT_CACHE)
+    parser.add_argument("--no-cache", action="store_true", help="Ignore and do not update cached results")
+    parser.add_argument("--local", action="store_true", help="Use the local stall model first, as in production")
+    parser.add_argument("--fail-under", type=float, default=None, help="Exit with status 1 below this accuracy")
+    parser.add_argument("--json", dest="json_path", default=None, help="Also write the summary to this file")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    conversations = load_test_conversations(str(args.dataset))
+    if not conversations:
+        parser.error(f"No conversations found in {args.dataset}")
+    cache = {} if args.no_cache else load_cache(args.cache)
+
+    start = time.perf_counter()
+    results = asyncio.run(classify_all(conversations, args.model, args.concurrency, cache, args.local))
+    summary = summarize(results, args.model, time.perf_counter() - start)
+    if not args.no_cache:
+        save_cache(args.cache, cache)
+
+    print_report(summary)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({**summary, "results": results}, f, indent=2)
+    if args.fail_under is not None and (summary["accuracy"] or 0.0) < args.fail_under:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
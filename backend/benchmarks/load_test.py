@@ -0,0 +1,405 @@
+"""
+Load test for /ws/conversation with local stand-ins for every dependency.
+
+Starts backend.ws_speech:app under uvicorn with
+- the mock OpenAI / propaganda services from backend.benchmarks.mock_services
+- a moto DynamoDB server (or an existing DynamoDB Local via --dynamodb-endpoint)
+and drives N simulated participants through start -> several audio turns -> disconnect.
+
+Reports p50/p95/p99 time-to-first-delta, time-to-first-audio and turn latency,
+turn throughput and peak memory per uvicorn worker. --generation-mode pipelined
+runs the app with streamed text and per-sentence TTS instead of one audio call.
+
+Usage:
+    pip install -r requirements-dev.txt
+    python -m backend.benchmarks.load_test --participants 10 --turns 4 --workers 5
+
+The article route can be a known experiment subpage (cached analysis) or any
+other URL (propaganda detection against the fake websocket service).
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import logging
+import os
+import pathlib
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import websockets
+
+REPO_ROOT = pathlib.Path(__file__).resolve().parents[2]
+ARTICLE_PATH = REPO_ROOT / "demo_article" / "left_leaning" / "USAID_BBC.txt"
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 60.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Timed out waiting for port {port}")
+
+
+def child_pids(pid: int) -> List[int]:
+    """Direct children of a process (the uvicorn workers)."""
+    if psutil is not None:
+        return [child.pid for child in psutil.Process(pid).children()]
+    children = []
+    for entry in pathlib.Path("/proc").iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text()
+        except OSError:
+            continue
+        if int(stat.rsplit(")", 1)[1].split()[1]) == pid:
+            children.append(int(entry.name))
+    return children
+
+
+def rss_bytes(pid: int) -> int:
+    if psutil is not None:
+        return psutil.Process(pid).memory_info().rss
+    for line in pathlib.Path(f"/proc/{pid}/status").read_text().splitlines():
+        if line.startswith("VmRSS:"):
+            return int(line.split()[1]) * 1024
+    return 0
+
+
+class MemorySampler(threading.Thread):
+    """Samples the RSS of every uvicorn worker and keeps the peak per pid."""
+
+    def __init__(self, server_pid: int, interval: float = 0.5):
+        super().__init__(daemon=True)
+        self.server_pid = server_pid
+        self.interval = interval
+        self.peak: Dict[int, int] = {}
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            pids = child_pids(self.server_pid) or [self.server_pid]
+            for pid in pids:
+                try:
+                    self.peak[pid] = max(self.peak.get(pid, 0), rss_bytes(pid))
+                except (OSError, ValueError):
+                    pass
+            self.stopped.wait(self.interval)
+
+
+def make_user_audio(seconds: float, sample_rate: int = 24000) -> bytes:
+    """Speech-like PCM16: tone bursts separated by short pauses, with leading silence."""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    envelope = (np.sin(2 * np.pi * 0.8 * t) > -0.3).astype(np.float32)
+    samples = np.sin(2 * np.pi * 180 * t) * envelope * 6000
+    samples[: sample_rate // 2] = 0
+    return samples.astype(np.int16).tobytes()
+
+
+def to_wav(pcm: bytes, sample_rate: int = 24000) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm)
+    return buf.getvalue()
+
+
+def encode_upload(pcm: bytes, audio_format: str, sample_rate: int = 24000) -> bytes:
+    """The recording as uploaded by a client: WAV, or WebM/Opus like a browser's MediaRecorder (needs ffmpeg)."""
+    if audio_format == "wav":
+        return to_wav(pcm, sample_rate)
+    # Imported here, pydub warns at import without ffmpeg
+    from pydub import AudioSegment
+    buf = io.BytesIO()
+    AudioSegment(pcm, sample_width=2, frame_rate=sample_rate, channels=1).export(buf, format="webm", codec="libopus")
+    return buf.getvalue()
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    return float(np.percentile(values, p)) if values else None
+
+
+async def wait_for_final(ws, sent_at: float, record: Dict[str, Any]) -> str:
+    """Consume server messages until the assistant turn completes. Returns the terminal message type."""
+    first_delta = None
+    first_audio = None
+    while True:
+        message = json.loads(await ws.recv())
+        msg_type = message.get("type")
+        if msg_type == "assistant_delta":
+            if first_delta is None:
+                first_delta = time.perf_counter()
+                record["ttfd"].append(first_delta - sent_at)
+            if first_audio is None and "audio" in message.get("payload", {}):
+                first_audio = time.perf_counter()
+                record["ttfa"].append(first_audio - sent_at)
+        elif msg_type == "assistant_final":
+            record["turn_latency"].append(time.perf_counter() - sent_at)
+            return msg_type
+        elif msg_type == "conversation_end" or "error" in message:
+            record["errors"].append(message.get("error") or msg_type)
+            return msg_type or "error"
+
+
+async def run_participant(index: int, url: str, args, article: str, audio: bytes, upload: bytes,
+                          record: Dict[str, Any]) -> None:
+    await asyncio.sleep(index * args.ramp)
+    try:
+        async with websockets.connect(url, max_size=None) as ws:
+            sent_at = time.perf_counter()
+            await ws.send(json.dumps({
+                "type": "start",
+                "article": article,
+                "mode": "critical" if index % 2 == 0 else "supportive",
+                "origin_url": args.origin_url,
+                "prolific_id": f"loadtest-{index}",
+            }))
+            if await wait_for_final(ws, sent_at, record) != "assistant_final":
+                return
+            record["turns"] += 1
+
+            for _ in range(args.turns):
+                await asyncio.sleep(args.think_time)
+                timing = {"thinking_time": args.think_time, "recording_duration": args.audio_seconds,
+                          "total_response_time": args.think_time + args.audio_seconds}
+                if args.stream_uplink:
+                    await ws.send(json.dumps({"type": "audio_stream_start", "sample_rate": 24000}))
+                    chunk = 24000 * 2 // 10  # 100 ms
+                    for i in range(0, len(audio), chunk):
+                        await ws.send(audio[i:i + chunk])
+                    sent_at = time.perf_counter()
+                    await ws.send(json.dumps({"type": "audio_stream_stop", "timing": timing}))
+                else:
+                    sent_at = time.perf_counter()
+                    await ws.send(json.dumps({
+                        "type": "user",
+                        "content": [{"type": "input_audio", "input_audio": {
+                            "data": base64.b64encode(upload).decode("utf-8"), "format": args.audio_format}}],
+                        "timing": timing,
+                    }))
+                if await wait_for_final(ws, sent_at, record) != "assistant_final":
+                    return
+                record["turns"] += 1
+    except Exception as e:
+        record["errors"].append(f"{type(e).__name__}: {e}")
+
+
+def start_dynamodb(args):
+    """Return (endpoint_url, server) for the DynamoDB stand-in."""
+    if args.dynamodb_endpoint:
+        return args.dynamodb_endpoint, None
+    try:
+        from moto.server import ThreadedMotoServer
+    except ImportError:
+        sys.exit("moto is not installed: pip install 'moto[server]' or pass --dynamodb-endpoint")
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    port = free_port()
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=port)
+    server.start()
+    return f"http://127.0.0.1:{port}", server
+
+
+def print_report(record: Dict[str, Any], wall_time: float, peak: Dict[int, int], args) -> Dict[str, Any]:
+    summary = {
+        "participants": args.participants,
+        "workers": args.workers,
+        "turns_completed": record["turns"],
+        "errors": len(record["errors"]),
+        "wall_time_s": wall_time,
+        "throughput_turns_per_s": record["turns"] / wall_time if wall_time else 0.0,
+        "ttfd_s": {f"p{p}": percentile(record["ttfd"], p) for p in (50, 95, 99)},
+        "ttfa_s": {f"p{p}": percentile(record["ttfa"], p) for p in (50, 95, 99)},
+        "turn_latency_s": {f"p{p}": percentile(record["turn_latency"], p) for p in (50, 95, 99)},
+        "peak_rss_mb_per_worker": {str(pid): rss / 1e6 for pid, rss in sorted(peak.items())},
+    }
+    print(f"\n=== /ws/conversation load test: {args.participants} participants, {args.workers} workers, "
+          f"{args.generation_mode} generation ===")
+    print(f"Completed turns: {record['turns']}  Errors: {len(record['errors'])}  Wall time: {wall_time:.1f}s")
+    print(f"Throughput: {summary['throughput_turns_per_s']:.2f} turns/s")
+    for name in ("ttfd_s", "ttfa_s", "turn_latency_s"):
+        values = summary[name]
+        print(f"{name:>16}: " + "  ".join(f"{k}={v:.3f}" if v is not None else f"{k}=n/a" for k, v in values.items()))
+    for pid, mb in summary["peak_rss_mb_per_worker"].items():
+        print(f"  worker {pid}: peak RSS {mb:.1f} MB")
+    for error in record["errors"][:10]:
+        print(f"  error: {error}")
+    return summary
+
+
+def app_env(args, mock_port: int, dynamodb_endpoint: str, table: str) -> Dict[str, str]:
+    """Environment of the app and the mock services for --provider mock, fake or openai."""
+    env = dict(
+        os.environ,
+        PYTHONPATH=str(REPO_ROOT),
+        AWS_ENDPOINT_URL=dynamodb_endpoint,
+        AWS_ACCESS_KEY_ID="testing",
+        AWS_SECRET_ACCESS_KEY="testing",
+        AWS_REGION="eu-north-1",
+        DYNAMODB_TABLE=table,
+        GENERATION_MODE=args.generation_mode,
+    )
+    if args.provider == "openai":
+        # Real models: OPENAI_API_KEY and PROPAGANDA_WS_URL come from the environment
+        return env
+    env.update(
+        OPENAI_API_KEY="mock",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{mock_port}/v1",
+        OPENAI_API_BASE=f"http://127.0.0.1:{mock_port}/v1",
+        PROPAGANDA_WS_URL=f"ws://127.0.0.1:{mock_port}/ws/analyze_propaganda",
+    )
+    if args.provider == "fake":
+        env.update(
+            MODEL_PROVIDER="fake",
+            FAKE_LATENCY_CHAT_AUDIO=str(args.chat_latency),
+            FAKE_LATENCY_TRANSCRIPTION=str(args.transcription_latency),
+            FAKE_LATENCY_CLASSIFIER=str(args.classifier_latency),
+        )
+    return env
+
+
+def start_mock_services(args, env: Dict[str, str], port: int, workdir: str) -> subprocess.Popen:
+    return subprocess.Popen([
+        sys.executable, "-m", "backend.benchmarks.mock_services", "--port", str(port),
+        "--chat-latency", str(args.chat_latency),
+        "--transcription-latency", str(args.transcription_latency),
+        "--classifier-latency", str(args.classifier_latency),
+        "--error-rate", str(args.error_rate),
+    ], env=env, cwd=workdir)
+
+
+def start_server(args, env: Dict[str, str], port: int, workdir: str) -> subprocess.Popen:
+    """Start backend.ws_speech:app under uvicorn without waiting for it."""
+    return subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "backend.ws_speech:app", "--host", "127.0.0.1",
+        "--port", str(port), "--workers", str(args.workers), "--log-level", "warning",
+    ], env=env, cwd=workdir, stdout=subprocess.DEVNULL,
+        stderr=None if args.verbose else subprocess.DEVNULL)
+
+
+def start_app(args, dynamodb_endpoint: str, table: str):
+    """
+    Start the mock services (unless --provider openai) and the app under uvicorn.
+
+    Returns:
+        (websocket URL of /ws/conversation, uvicorn process, all started processes)
+    """
+    mock_port, app_port = free_port(), free_port()
+    env = app_env(args, mock_port, dynamodb_endpoint, table)
+    # Run the services from a scratch directory so their logs/ stay out of the repo
+    workdir = tempfile.mkdtemp(prefix="loadtest_")
+    processes = []
+    try:
+        if args.provider != "openai":
+            processes.append(start_mock_services(args, env, mock_port, workdir))
+            wait_for_port(mock_port)
+        server = start_server(args, env, app_port, workdir)
+        processes.append(server)
+        wait_for_port(app_port)
+    except BaseException:
+        stop_processes(processes)
+        raise
+    return f"ws://127.0.0.1:{app_port}/ws/conversation", server, processes
+
+
+def stop_processes(processes: List[subprocess.Popen]) -> None:
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def add_app_arguments(parser: argparse.ArgumentParser) -> None:
+    """Options of the app under test, shared with backend.benchmarks.replay."""
+    parser.add_argument("--workers", type=int, default=5, help="uvicorn workers for the app")
+    parser.add_argument("--generation-mode", choices=["audio", "pipelined"], default="audio",
+                        help="GENERATION_MODE of the app: one audio call or streamed text + per-sentence TTS")
+    parser.add_argument("--provider", choices=["mock", "fake", "openai"], default="mock",
+                        help="mock: OpenAI client against the mock HTTP services; fake: in-process FakeProvider; "
+                             "openai: the real models (OPENAI_API_KEY and PROPAGANDA_WS_URL from the environment)")
+    parser.add_argument("--chat-latency", type=float, default=2.0)
+    parser.add_argument("--transcription-latency", type=float, default=0.6)
+    parser.add_argument("--classifier-latency", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of mock model calls answered with 429")
+    parser.add_argument("--dynamodb-endpoint", default=None, help="Use an existing DynamoDB Local instead of moto")
+    parser.add_argument("--verbose", action="store_true", help="Show the app's log output")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--participants", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=4, help="User turns per participant")
+    parser.add_argument("--ramp", type=float, default=0.2, help="Seconds between participant arrivals")
+    parser.add_argument("--think-time", type=float, default=1.0)
+    parser.add_argument("--audio-seconds", type=float, default=5.0)
+    parser.add_argument("--audio-format", choices=["webm", "wav"], default="webm",
+                        help="Format of uploaded recordings (webm needs ffmpeg)")
+    parser.add_argument("--stream-uplink", action="store_true", help="Use the streaming audio uplink")
+    parser.add_argument("--origin-url", default="http://localhost:3000/dialogue/positive1",
+                        help="Known subpages use the cached analysis; other URLs call the fake detector")
+    add_app_arguments(parser)
+    parser.add_argument("--json", dest="json_path", default=None, help="Also write the summary to this file")
+    args = parser.parse_args()
+
+    dynamodb_endpoint, moto_server = start_dynamodb(args)
+    processes = []
+    try:
+        url, server, processes = start_app(args, dynamodb_endpoint, "apollolytics_dialogues_loadtest")
+
+        sampler = MemorySampler(server.pid)
+        sampler.start()
+        article = ARTICLE_PATH.read_text(encoding="utf-8")
+        audio = make_user_audio(args.audio_seconds)
+        upload = encode_upload(audio, args.audio_format)
+        record = {"ttfd": [], "ttfa": [], "turn_latency": [], "errors": [], "turns": 0}
+
+        async def run_all():
+            await asyncio.gather(*(
+                run_participant(i, url, args, article, audio, upload, record) for i in range(args.participants)
+            ))
+
+        started = time.perf_counter()
+        asyncio.run(run_all())
+        wall_time = time.perf_counter() - started
+        sampler.stopped.set()
+        sampler.join()
+
+        summary = print_report(record, wall_time, sampler.peak, args)
+        if args.json_path:
+            with open(args.json_path, "w") as f:
+                json.dump(summary, f, indent=2)
+    finally:
+        stop_processes(processes)
+        if moto_server is not None:
+            moto_server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Local stand-ins for the external services used by backend.ws_speech.
+
+A single FastAPI app serves:
+- /v1/chat/completions: gpt-4o-audio-preview style answers (transcript + WAV audio),
+  streamed text answers (stream=True) and plain text answers for the stall classifier
+- /v1/audio/speech: text-to-speech returning WAV
+- /v1/audio/transcriptions: Whisper style transcription
+- /ws/analyze_propaganda: the propaganda detection websocket, replaying a stored result
+
+Latencies are configurable so load runs resemble the real services.
+
+Usage:
+    python -m backend.benchmarks.mock_services --port 9100 --chat-latency 2.0
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import pathlib
+import random
+import time
+import uuid
+import wave
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request, WebSocket
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+MODEL_OUTPUT_DIR = pathlib.Path(__file__).resolve().parent.parent / "model_output"
+
+ASSISTANT_REPLY = (
+    "That is an interesting point. The article frames the decision as political foolishness, "
+    "but it offers little evidence for that claim. What do you think the authors leave out?"
+)
+
+# Latencies in seconds, overridden from the command line
+config = {
+    "chat_latency": 2.0,
+    "first_token_latency": 0.5,
+    "token_interval": 0.03,
+    "tts_latency": 0.4,
+    "classifier_latency": 0.5,
+    "transcription_latency": 0.6,
+    "propaganda_latency": 3.0,
+    "jitter": 0.2,
+    "audio_seconds": 6.0,
+    "error_rate": 0.0,  # fraction of model calls answered with 429
+}
+
+app = FastAPI()
+
+
+def _delay(base: float) -> float:
+    return max(0.0, base * (1.0 + random.uniform(-config["jitter"], config["jitter"])))
+
+
+def _rate_limited() -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        headers={"retry-after": "0.2"},
+        content={"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+    )
+
+
+def _silent_wav_bytes(seconds: float, sample_rate: int = 24000) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(np.zeros(int(seconds * sample_rate), dtype=np.int16).tobytes())
+    return buf.getvalue()
+
+
+def _silent_wav(seconds: float, sample_rate: int = 24000) -> str:
+    return base64.b64encode(_silent_wav_bytes(seconds, sample_rate)).decode("utf-8")
+
+
+async def _stream_reply(model: str):
+    """Server-sent events in the chat.completion.chunk format, one word per chunk."""
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    await asyncio.sleep(_delay(config["first_token_latency"]))
+    words = ASSISTANT_REPLY.split(" ")
+    for i, word in enumerate(words):
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "delta": {"content": word if i == len(words) - 1 else word + " "},
+                "finish_reason": None,
+            }],
+        }
+        yield f"data: {json.dumps(chunk)}\n\n"
+        await asyncio.sleep(_delay(config["token_interval"]))
+    yield "data: [DONE]\n\n"
+
+
+_AUDIO_CACHE = {}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    if random.random() < config["error_rate"]:
+        return _rate_limited()
+    model = body.get("model", "gpt-4o")
+    prompt_tokens = sum(len(json.dumps(m.get("content", ""))) for m in body.get("messages", [])) // 4
+    message = {"role": "assistant", "content": None}
+
+    if body.get("stream"):
+        return StreamingResponse(_stream_reply(model), media_type="text/event-stream")
+    if "audio" in body.get("modalities", []):
+        await asyncio.sleep(_delay(config["chat_latency"]))
+        seconds = config["audio_seconds"]
+        if seconds not in _AUDIO_CACHE:
+            _AUDIO_CACHE[seconds] = _silent_wav(seconds)
+        message["audio"] = {
+            "id": f"audio_{uuid.uuid4().hex}",
+            "data": _AUDIO_CACHE[seconds],
+            "expires_at": int(time.time()) + 3600,
+            "transcript": ASSISTANT_REPLY,
+        }
+        completion_tokens = 200
+    else:
+        # Stall classifier: always report an active conversation
+        await asyncio.sleep(_delay(config["classifier_latency"]))
+        message["content"] = "0"
+        completion_tokens = 1
+
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": message, "finish_reason": "stop", "logprobs": None}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+@app.post("/v1/audio/speech")
+async def speech(request: Request):
+    body = await request.json()
+    if random.random() < config["error_rate"]:
+        return _rate_limited()
+    await asyncio.sleep(_delay(config["tts_latency"]))
+    # Roughly 0.35 seconds of speech per word
+    seconds = round(0.35 * len(body.get("input", "").split()), 1)
+    return Response(content=_silent_wav_bytes(seconds), media_type="audio/wav")
+
+
+@app.post("/v1/audio/transcriptions")
+async def transcriptions(request: Request):
+    await request.body()
+    if random.random() < config["error_rate"]:
+        return _rate_limited()
+    await asyncio.sleep(_delay(config["transcription_latency"]))
+    return {"text": "I think the article exaggerates the risks, but some points seem fair."}
+
+
+@app.websocket("/ws/analyze_propaganda")
+async def analyze_propaganda(websocket: WebSocket):
+    await websocket.accept()
+    await websocket.receive_text()
+    await asyncio.sleep(_delay(config["propaganda_latency"]))
+    with open(MODEL_OUTPUT_DIR / "article1.json", "r", encoding="utf-8") as f:
+        await websocket.send_text(f.read())
+    await websocket.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    for key, value in config.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=float, default=value)
+    args = parser.parse_args()
+    for key in config:
+        config[key] = getattr(args, key)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+"""
+Replay recorded sessions against the live turn pipeline.
+
+Reconstructs the article, dialogue mode and user turns of recorded sessions
+and drives them through /ws/conversation: the opening turn, then every user
+turn after its recorded thinking time. The replayed run is compared with the
+recorded one:
+- latency: model generation time per turn (recorded with every assistant
+  message and sent with assistant_final), plus the client-side time to first
+  delta and turn latency of the replay
+- stall verdicts: whether, and after which user turn, the conversation was
+  ended as conversation_stalled
+
+Sessions come from
+- the dialogue table (--dynamodb, all sessions or --session ids), using the
+  AWS_* and DYNAMODB_TABLE environment of this process
+- a transcript log in the format of backend/logs/transcripts.log (--transcripts);
+  its article is truncated, pass --article
+- a JSONL file written by --export (--sessions), for replays without table access
+
+By default the app is started locally like in load_test.py (moto for DynamoDB,
+--provider mock, fake or openai); --url replays against a running deployment.
+User turns are sent as text, so the classifier sees the recorded words;
+--audio sends a synthetic recording of the recorded duration instead, which
+exercises preprocessing and transcription but changes the transcript.
+
+Usage:
+    python -m backend.benchmarks.replay --dynamodb --limit 50 --export sessions.jsonl
+    python -m backend.benchmarks.replay --sessions sessions.jsonl --provider fake --speed 0 --concurrency 20
+    python -m backend.benchmarks.replay --sessions sessions.jsonl --provider openai --fail-over 0.2
+"""
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import pathlib
+import re
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import websockets
+
+from backend.benchmarks.load_test import (
+    ARTICLE_PATH,
+    add_app_arguments,
+    make_user_audio,
+    percentile,
+    start_app,
+    start_dynamodb,
+    stop_processes,
+    to_wav,
+)
+
+logger = logging.getLogger(__name__)
+
+STALLED = "conversation_stalled"
+LOG_LINE = re.compile(r"^(\S+ \S+) - (.*)$")
+LOG_EVENT = re.compile(r"^(NEW SESSION|ARTICLE|USER[A-Z ]*|ASSISTANT RESPONSE|SESSION ENDED|SESSION ERROR)"
+                       r":? ?\[?([0-9a-f-]{36})\]?(?: \[[^\]]*\])?(?::| -)? ?(.*)$")
+
+
+def number(value: Any) -> Optional[float]:
+    return float(value) if value is not None else None
+
+
+def session_from_items(items: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    A recorded session from its DynamoDB items (see backend/db_utils/dialogue_db.py).
+
+    Returns:
+        {"session_id", "article", "mode", "origin_url", "opening_generation_time",
+         "turns": [{"text", "thinking_time", "recording_duration", "generation_time"}],
+         "end_reason", "stalled_after"} or None without a session_init
+    """
+    items = sorted(items, key=lambda item: (float(item["timestamp"]), item.get("created_at", "")))
+    init = next((item for item in items if item.get("event_type") == "session_init"), None)
+    if init is None or not init.get("article"):
+        return None
+    session = {
+        "session_id": init["session_id"],
+        "article": init["article"],
+        "mode": init.get("dialogue_mode", "critical"),
+        "origin_url": init.get("origin_url"),
+        "opening_generation_time": None,
+        "turns": [],
+        "end_reason": None,
+    }
+    for item in items:
+        role = item.get("role")
+        timing = item.get("timing_info") or {}
+        if role == "user":
+            session["turns"].append({
+                "text": str(item.get("content") or ""),
+                "thinking_time": number(timing.get("thinking_time")),
+                "recording_duration": number(timing.get("recording_duration")),
+                "generation_time": None,
+            })
+        elif role == "assistant":
+            generation_time = number(timing.get("model_generation_time"))
+            if session["turns"]:
+                session["turns"][-1]["generation_time"] = generation_time
+            else:
+                session["opening_generation_time"] = generation_time
+        elif item.get("event_type") == "session_end":
+            session["end_reason"] = item.get("reason")
+    session["turns"] = [turn for turn in session["turns"] if turn["text"]]
+    session["stalled_after"] = len(session["turns"]) if session["end_reason"] == STALLED else None
+    return session
+
+
+def sessions_from_dynamodb(session_ids: Optional[List[str]], limit: Optional[int]) -> List[Dict[str, Any]]:
+    from backend.db_utils.dialogue_db import get_session_data, scan_all_items
+
+    if session_ids:
+        grouped = {session_id: get_session_data(session_id) for session_id in session_ids}
+    else:
+        grouped = defaultdict(list)
+        for item in scan_all_items():
+            grouped[item["session_id"]].append(item)
+    sessions = [session for session in map(session_from_items, grouped.values()) if session and session["turns"]]
+    return sessions[:limit] if limit else sessions
+
+
+def sessions_from_transcript_log(path: pathlib.Path, article: str, mode: str) -> List[Dict[str, Any]]:
+    """
+    Sessions of a transcript log. The log has no model timings; thinking times
+    are the gaps between an answer and the next user message.
+    """
+    sessions: Dict[str, Dict[str, Any]] = {}
+    last_answer: Dict[str, datetime] = {}
+    for line in path.read_text(encoding="utf-8", errors="replace").splitlines():
+        match = LOG_LINE.match(line)
+        event = LOG_EVENT.match(match.group(2)) if match else None
+        if event is None:
+            continue
+        logged_at = datetime.strptime(match.group(1), "%Y-%m-%d %H:%M:%S,%f")
+        kind, session_id, text = event.groups()
+        session = sessions.setdefault(session_id, {
+            "session_id": session_id, "article": article, "mode": mode, "origin_url": None,
+            "opening_generation_time": None, "turns": [], "end_reason": None, "stalled_after": None,
+        })
+        if kind.startswith("USER"):
+            answered = last_answer.get(session_id)
+            session["turns"].append({
+                "text": text,
+                "thinking_time": (logged_at - answered).total_seconds() if answered else None,
+                "recording_duration": None,
+                "generation_time": None,
+            })
+        elif kind == "ASSISTANT RESPONSE":
+            last_answer[session_id] = logged_at
+        elif kind == "SESSION ERROR":
+            session["end_reason"] = "error"
+        elif kind == "SESSION ENDED" and session["end_reason"] is None:
+            session["end_reason"] = "normal"
+    return [session for session in sessions.values() if session["turns"]]
+
+
+def load_sessions(path: pathlib.Path) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def export_sessions(sessions: Iterable[Dict[str, Any]], path: pathlib.Path) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for session in sessions:
+            f.write(json.dumps(session, default=str) + "\n")
+
+
+async def next_answer(ws, sent_at: float, replayed: Dict[str, Any]) -> Optional[str]:
+    """
+    Consume server messages until the answer is complete. Returns None after an
+    assistant_final, otherwise why the conversation ended (the reason of
+    conversation_end, or "error").
+    """
+    while True:
+        message = json.loads(await ws.recv())
+        msg_type = message.get("type")
+        if msg_type == "assistant_delta":
+            if replayed["ttfd"] is None:
+                replayed["ttfd"] = time.perf_counter() - sent_at
+        elif msg_type == "assistant_final":
+            replayed["turn_latency"] = time.perf_counter() - sent_at
+            replayed["generation_time"] = number(message["payload"].get("timing", {}).get("model_generation_time"))
+            return None
+        elif msg_type in ("conversation_end", "server_restart"):
+            return message.get("payload", {}).get("reason") or msg_type
+        elif "error" in message:
+            replayed["error"] = message["error"]
+            return "error"
+
+
+def user_message(turn: Dict[str, Any], as_audio: bool) -> Dict[str, Any]:
+    timing = {key: turn[key] for key in ("thinking_time", "recording_duration") if turn.get(key) is not None}
+    if not as_audio:
+        return {"type": "user", "content": [{"type": "text", "text": turn["text"]}], "timing": timing}
+    # Roughly the recorded duration, ~2.5 words per second when it was not recorded
+    seconds = turn.get("recording_duration") or max(1.0, len(turn["text"].split()) / 2.5)
+    audio = base64.b64encode(to_wav(make_user_audio(seconds))).decode("utf-8")
+    return {"type": "user", "content": [{"type": "input_audio", "input_audio": {"data": audio, "format": "wav"}}],
+            "timing": timing}
+
+
+async def replay_session(url: str, recorded: Dict[str, Any], args, run: int) -> Dict[str, Any]:
+    """Replay one recorded session; returns the recorded and replayed turns side by side."""
+    result = {"session_id": recorded["session_id"], "run": run, "turns": [], "end_reason": None,
+              "stalled_after": None, "error": None}
+    turns = [{"generation_time": recorded.get("opening_generation_time")}] + recorded["turns"]
+    try:
+        async with websockets.connect(url, max_size=None) as ws:
+            for index, turn in enumerate(turns):
+                replayed = {"ttfd": None, "turn_latency": None, "generation_time": None}
+                result["turns"].append({"recorded": turn.get("generation_time"), "replayed": replayed})
+                if index == 0:
+                    message = {"type": "start", "article": recorded["article"], "mode": recorded["mode"],
+                               "origin_url": args.origin_url or recorded.get("origin_url"),
+                               "prolific_id": f"replay-{recorded['session_id']}"}
+                else:
+                    if args.speed > 0 and turn.get("thinking_time"):
+                        await asyncio.sleep(min(turn["thinking_time"], args.max_think_time) / args.speed)
+                    message = user_message(turn, args.audio)
+                sent_at = time.perf_counter()
+                await ws.send(json.dumps(message))
+                end_reason = await next_answer(ws, sent_at, replayed)
+                if end_reason is not None:
+                    result["end_reason"] = end_reason
+                    if end_reason == STALLED:
+                        result["stalled_after"] = index
+                    if end_reason == "error":
+                        result["error"] = replayed.get("error")
+                    break
+    except Exception as e:
+        result["end_reason"] = "error"
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+
+async def replay_all(url: str, sessions: List[Dict[str, Any]], args) -> List[Dict[str, Any]]:
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def bounded(recorded, run):
+        async with semaphore:
+            return await replay_session(url, recorded, args, run)
+
+    return await asyncio.gather(*(
+        bounded(recorded, run) for run in range(args.repeat) for recorded in sessions
+    ))
+
+
+def compare(sessions: List[Dict[str, Any]], results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Latency profiles and stall verdicts of the recorded and the replayed runs."""
+    recorded_by_id = {session["session_id"]: session for session in sessions}
+    recorded_times, replayed_times, ttfd, turn_latency = [], [], [], []
+    verdicts = {"agree": 0, "stalled_only_recorded": 0, "stalled_only_replayed": 0, "stalled_at_other_turn": 0}
+    disagreements = []
+    for result in results:
+        recorded = recorded_by_id[result["session_id"]]
+        for turn in result["turns"]:
+            replayed = turn["replayed"]
+            if replayed["generation_time"] is None:
+                continue
+            replayed_times.append(replayed["generation_time"])
+            if turn["recorded"] is not None:
+                recorded_times.append(turn["recorded"])
+            ttfd.extend([replayed["ttfd"]] if replayed["ttfd"] is not None else [])
+            turn_latency.append(replayed["turn_latency"])
+        if result["end_reason"] == "error":
+            continue
+        was, now = recorded.get("stalled_after"), result["stalled_after"]
+        if was == now:
+            verdicts["agree"] += 1
+            continue
+        if now is None:
+            verdicts["stalled_only_recorded"] += 1
+        elif was is None:
+            verdicts["stalled_only_replayed"] += 1
+        else:
+            verdicts["stalled_at_other_turn"] += 1
+        disagreements.append({"session_id": result["session_id"], "recorded": was, "replayed": now})
+    profile = lambda values: {f"p{p}": percentile(values, p) for p in (50, 95, 99)}
+    return {
+        "sessions": len(sessions),
+        "replays": len(results),
+        "errors": [result["error"] for result in results if result["end_reason"] == "error"],
+        "generation_time_s": {"recorded": profile(recorded_times), "replayed": profile(replayed_times)},
+        "replay_ttfd_s": profile(ttfd),
+        "replay_turn_latency_s": profile(turn_latency),
+        "verdicts": verdicts,
+        "verdict_disagreements": disagreements,
+    }
+
+
+def print_comparison(summary: Dict[str, Any]) -> None:
+    fmt = lambda values: "  ".join(f"{k}={v:.3f}" if v is not None else f"{k}=n/a" for k, v in values.items())
+    print(f"\n=== Replay of {summary['sessions']} recorded sessions ({summary['replays']} replays) ===")
+    print(f"  generation recorded: {fmt(summary['generation_time_s']['recorded'])}")
+    print(f"  generation replayed: {fmt(summary['generation_time_s']['replayed'])}")
+    print(f"   replay first delta: {fmt(summary['replay_ttfd_s'])}")
+    print(f"  replay turn latency: {fmt(summary['replay_turn_latency_s'])}")
+    verdicts = summary["verdicts"]
+    print("  stall verdicts: " + "  ".join(f"{k}={v}" for k, v in verdicts.items()))
+    for disagreement in summary["verdict_disagreements"][:10]:
+        print(f"    {disagreement['session_id']}: stalled after turn {disagreement['recorded']} recorded, "
+              f"{disagreement['replayed']} replayed")
+    print(f"  errors: {len(summary['errors'])}")
+    for error in summary["errors"][:10]:
+        print(f"    {error}")
+
+
+def regressed(summary: Dict[str, Any], fail_over: float) -> bool:
+    """Replayed p95 generation time more than `fail_over` (a fraction) above the recorded p95."""
+    recorded = summary["generation_time_s"]["recorded"]["p95"]
+    replayed = summary["generation_time_s"]["replayed"]["p95"]
+    return recorded is not None and replayed is not None and replayed > recorded * (1 + fail_over)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--dynamodb", action="store_true", help="Recorded sessions from the dialogue table")
+    source.add_argument("--transcripts", type=pathlib.Path, help="Recorded sessions from a transcript log")
+    source.add_argument("--sessions", type=pathlib.Path, help="Recorded sessions from a file written by --export")
+    parser.add_argument("--session", action="append", dest="session_ids", help="Only this session (repeatable)")
+    parser.add_argument("--limit", type=int, default=None, help="At most this many sessions")
+    parser.add_argument("--article", type=pathlib.Path, default=ARTICLE_PATH, help="Article of --transcripts sessions")
+    parser.add_argument("--mode", default="critical", help="Dialogue mode of --transcripts sessions")
+    parser.add_argument("--export", type=pathlib.Path, default=None, help="Write the recorded sessions as JSONL and exit")
+    parser.add_argument("--url", default=None, help="Replay against this /ws/conversation URL instead of a local app")
+    parser.add_argument("--origin-url", default=None, help="Override the recorded origin URL (cached analyses)")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Thinking times are divided by this factor, 0 sends every turn at once")
+    parser.add_argument("--max-think-time", type=float, default=60.0, help="Cap on a recorded thinking time (s)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Sessions replayed at the same time")
+    parser.add_argument("--repeat", type=int, default=1, help="Replay every session this many times")
+    parser.add_argument("--audio", action="store_true", help="Send synthetic recordings instead of the recorded text")
+    add_app_arguments(parser)
+    parser.add_argument("--fail-over", type=float, default=None,
+                        help="Exit with 1 if the replayed p95 generation time exceeds the recorded one by this fraction")
+    parser.add_argument("--json", dest="json_path", default=None, help="Also write the comparison to this file")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    if args.dynamodb:
+        sessions = sessions_from_dynamodb(args.session_ids, args.limit)
+    else:
+        if args.transcripts:
+            sessions = sessions_from_transcript_log(args.transcripts, args.article.read_text(encoding="utf-8"), args.mode)
+        else:
+            sessions = load_sessions(args.sessions)
+        if args.session_ids:
+            sessions = [session for session in sessions if session["session_id"] in args.session_ids]
+        sessions = sessions[:args.limit] if args.limit else sessions
+    if not sessions:
+        sys.exit("No recorded sessions with user turns found")
+    print(f"Loaded {len(sessions)} recorded sessions, {sum(len(s['turns']) for s in sessions)} user turns")
+    if args.export:
+        export_sessions(sessions, args.export)
+        print(f"Wrote {args.export}")
+        return
+
+    processes, moto_server = [], None
+    try:
+        url = args.url
+        if url is None:
+            dynamodb_endpoint, moto_server = start_dynamodb(args)
+            url, _, processes = start_app(args, dynamodb_endpoint, "apollolytics_dialogues_replay")
+        results = asyncio.run(replay_all(url, sessions, args))
+    finally:
+        stop_processes(processes)
+        if moto_server is not None:
+            moto_server.stop()
+
+    summary = compare(sessions, results)
+    print_comparison(summary)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"summary": summary, "results": results}, f, indent=2)
+    if args.fail_over is not None and regressed(summary, args.fail_over):
+        print(f"Replayed p95 generation time is more than {args.fail_over:.0%} above the recorded one")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
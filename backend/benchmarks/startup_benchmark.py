@@ -0,0 +1,127 @@
+"""
+Startup benchmark: how long a new worker takes until it serves a session.
+
+Measures, over several cold starts of backend.ws_speech:app under uvicorn
+(same local stand-ins as load_test.py: moto for DynamoDB, mock services or the
+fake provider for the models):
+- import: time to `import backend.ws_speech` in a fresh interpreter
+- accept: from process start to the first accepted /ws/conversation websocket
+- first delta: from process start to the first assistant_delta of a session
+  (the opening turn, so it includes the model latency set with --chat-latency)
+
+Run it before and after changes to imports, startup hooks or warm-up steps.
+
+Usage:
+    python -m backend.benchmarks.startup_benchmark --runs 5
+    python -m backend.benchmarks.startup_benchmark --workers 5 --provider mock --json startup.json
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import websockets
+
+from backend.benchmarks.load_test import (
+    ARTICLE_PATH,
+    add_app_arguments,
+    app_env,
+    free_port,
+    start_dynamodb,
+    start_mock_services,
+    start_server,
+    stop_processes,
+    wait_for_port,
+)
+
+
+def import_seconds(env: Dict[str, str], workdir: str) -> float:
+    """Time to import the app module in a fresh interpreter."""
+    code = "import time; t = time.perf_counter(); import backend.ws_speech; print(time.perf_counter() - t)"
+    output = subprocess.run([sys.executable, "-c", code], env=env, cwd=workdir, capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+async def first_session(url: str, started: float, article: str, timeout: float) -> Dict[str, float]:
+    """Connect as soon as the worker accepts, start a session and wait for its first delta."""
+    deadline = started + timeout
+    while True:
+        try:
+            ws = await websockets.connect(url, max_size=None, open_timeout=1)
+            break
+        except (OSError, asyncio.TimeoutError, websockets.exceptions.InvalidHandshake):
+            if time.perf_counter() > deadline:
+                raise RuntimeError(f"No websocket accepted within {timeout:.0f}s")
+            await asyncio.sleep(0.02)
+    accepted = time.perf_counter() - started
+    async with ws:
+        await ws.send(json.dumps({"type": "start", "article": article, "mode": "critical",
+                                  "origin_url": "http://localhost:3000/dialogue/positive1", "prolific_id": "startup"}))
+        while True:
+            message = json.loads(await asyncio.wait_for(ws.recv(), max(1.0, deadline - time.perf_counter())))
+            if message.get("type") == "assistant_delta":
+                return {"accept_s": accepted, "first_delta_s": time.perf_counter() - started}
+            if "error" in message or message.get("type") == "conversation_end":
+                raise RuntimeError(f"Session failed: {message}")
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"median": None, "min": None, "max": None}
+    return {"median": statistics.median(values), "min": min(values), "max": max(values)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="Cold starts to measure")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds a start may take")
+    add_app_arguments(parser)
+    parser.set_defaults(provider="fake", workers=1, chat_latency=0.2)
+    parser.add_argument("--json", dest="json_path", default=None, help="Also write the results to this file")
+    args = parser.parse_args()
+
+    dynamodb_endpoint, moto_server = start_dynamodb(args)
+    mock_port = free_port()
+    env = app_env(args, mock_port, dynamodb_endpoint, "apollolytics_dialogues_startup")
+    workdir = tempfile.mkdtemp(prefix="startup_")
+    article = ARTICLE_PATH.read_text(encoding="utf-8")
+    processes = []
+    results = {"import_s": [], "accept_s": [], "first_delta_s": []}
+    try:
+        if args.provider != "openai":
+            processes.append(start_mock_services(args, env, mock_port, workdir))
+            wait_for_port(mock_port)
+        for run in range(args.runs):
+            results["import_s"].append(import_seconds(env, workdir))
+            port = free_port()
+            started = time.perf_counter()
+            server = start_server(args, env, port, workdir)
+            try:
+                measured = asyncio.run(first_session(f"ws://127.0.0.1:{port}/ws/conversation", started, article, args.timeout))
+            finally:
+                stop_processes([server])
+            for key, value in measured.items():
+                results[key].append(value)
+            print(f"run {run + 1}: import {results['import_s'][-1]:.2f}s  accept {measured['accept_s']:.2f}s  "
+                  f"first delta {measured['first_delta_s']:.2f}s")
+    finally:
+        stop_processes(processes)
+        if moto_server is not None:
+            moto_server.stop()
+
+    summary = {name: summarize(values) for name, values in results.items()}
+    print(f"\n=== Worker startup: {args.runs} runs, {args.workers} workers, {args.provider} provider ===")
+    for name, values in summary.items():
+        print(f"{name:>14}: " + "  ".join(f"{k}={v:.3f}" if v is not None else f"{k}=n/a" for k, v in values.items()))
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"summary": summary, "runs": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Latency and accuracy benchmark for the transcription providers.
+
+Transcribes a set of recorded clips with every given provider, `--concurrency`
+requests at a time as concurrent sessions would, and reports the word error
+rate against the reference transcripts, latency percentiles, the real-time
+factor (latency / audio duration) and throughput.
+
+Clip set format: a directory with WAV/WebM/... recordings and a manifest.json
+    [{"file": "clip_000.wav", "text": "reference transcript"}, ...]
+
+Without recorded clips, --synthesize writes a clip set from the user turns of
+the labelled test conversations, spoken by the TTS model (clean speech, so
+WER is lower than on real participant recordings).
+
+Usage:
+    python -m backend.benchmarks.transcription_benchmark --clips clips/ --synthesize 40
+    python -m backend.benchmarks.transcription_benchmark --clips clips/ --providers openai local --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import logging
+import pathlib
+import re
+import time
+from typing import Any, Dict, List
+
+from backend.benchmarks.classifier_benchmark import percentiles
+from backend.conversation_evaluation.evaluator import load_test_conversations
+from backend.prompts.system_prompts import INITIAL_USER_MESSAGE
+from backend.providers.base import ModelProvider, wav_seconds
+from backend.providers.registry import get_provider
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATASET = pathlib.Path(__file__).resolve().parents[1] / "conversation_evaluation" / "test_conversations.json"
+
+
+def normalize(text: str) -> List[str]:
+    """Lowercase words without punctuation, as usual for WER."""
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+
+def word_errors(reference: str, hypothesis: str) -> int:
+    """Word-level edit distance (substitutions + deletions + insertions)."""
+    ref, hyp = normalize(reference), normalize(hypothesis)
+    row = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, start=1):
+        previous, row[0] = row[0], i
+        for j, hyp_word in enumerate(hyp, start=1):
+            previous, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, previous + (ref_word != hyp_word))
+    return row[-1]
+
+
+def load_clips(directory: pathlib.Path) -> List[Dict[str, Any]]:
+    with open(directory / "manifest.json", "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    return [{**entry, "audio": (directory / entry["file"]).read_bytes()} for entry in manifest]
+
+
+def synthesize_clips(directory: pathlib.Path, count: int, dataset: pathlib.Path) -> None:
+    """Speak user turns of the test conversations with the TTS model and store them as a clip set."""
+    provider = get_provider()
+    turns = [
+        message["content"]
+        for conversation in load_test_conversations(str(dataset))
+        for message in conversation["messages"]
+        if message["role"] == "user" and message["content"] != INITIAL_USER_MESSAGE
+        and len(message["content"].split()) >= 3
+    ]
+    directory.mkdir(parents=True, exist_ok=True)
+    manifest = []
+    for n, text in enumerate(turns[:count]):
+        filename = f"clip_{n:03d}.wav"
+        (directory / filename).write_bytes(provider.synthesize(text).audio)
+        manifest.append({"file": filename, "text": text})
+    with open(directory / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    logger.warning(f"Wrote {len(manifest)} synthesized clips to {directory}")
+
+
+async def transcribe_all(provider: ModelProvider, clips: List[Dict[str, Any]], concurrency: int) -> List[Dict[str, Any]]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def transcribe(clip: Dict[str, Any]) -> Dict[str, Any]:
+        result = {"file": clip["file"], "reference": clip["text"], "audio_seconds": wav_seconds(clip["audio"])}
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                transcription = await asyncio.to_thread(provider.transcribe, clip["audio"], clip["file"])
+            except Exception as e:
+                logger.error(f"Transcription of {clip['file']} failed: {e}")
+                return {**result, "error": str(e)}
+            latency = time.perf_counter() - start
+        audio_seconds = result["audio_seconds"] or transcription.usage.audio_seconds
+        return {
+            **result,
+            "hypothesis": transcription.text,
+            "latency": latency,
+            "audio_seconds": audio_seconds,
+            "errors": word_errors(clip["text"], transcription.text),
+            "reference_words": len(normalize(clip["text"])),
+        }
+
+    return await asyncio.gather(*(transcribe(c) for c in clips))
+
+
+def summarize(name: str, results: List[Dict[str, Any]], wall_time: float) -> Dict[str, Any]:
+    done = [r for r in results if "error" not in r]
+    reference_words = sum(r["reference_words"] for r in done)
+    return {
+        "provider": name,
+        "clips": len(results),
+        "failed": len(results) - len(done),
+        "wall_time_s": wall_time,
+        "throughput_clips_s": len(done) / wall_time if wall_time else None,
+        "wer": sum(r["errors"] for r in done) / reference_words if reference_words else None,
+        "latency_s": percentiles([r["latency"] for r in done]),
+        "real_time_factor": percentiles([r["latency"] / r["audio_seconds"] for r in done if r["audio_seconds"]]),
+    }
+
+
+def print_report(summaries: List[Dict[str, Any]], clips: int, concurrency: int) -> None:
+    def fmt(value, digits: int = 3) -> str:
+        return "n/a" if value is None else f"{value:.{digits}f}"
+
+    print(f"\n=== Transcription benchmark: {clips} clips, concurrency {concurrency} ===")
+    for summary in summaries:
+        print(f"{summary['provider']:>10}: WER {fmt(summary['wer'])}  failed {summary['failed']}  "
+              f"wall {summary['wall_time_s']:.2f}s  throughput {fmt(summary['throughput_clips_s'], 2)} clips/s")
+        for name in ("latency_s", "real_time_factor"):
+            print(f"{name:>22}: " + "  ".join(f"{k}={fmt(v)}" for k, v in summary[name].items()))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clips", type=pathlib.Path, required=True, help="Directory with manifest.json and recordings")
+    parser.add_argument("--providers", nargs="+", default=["openai", "local"], help="Providers to compare")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--synthesize", type=int, default=0, metavar="N",
+                        help="First write N clips from the test conversations with the TTS model")
+    parser.add_argument("--dataset", type=pathlib.Path, default=DEFAULT_DATASET)
+    parser.add_argument("--show-errors", action="store_true", help="Print every clip with word errors")
+    parser.add_argument("--json", dest="json_path", default=None, help="Also write the summaries to this file")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    if args.synthesize:
+        synthesize_clips(args.clips, args.synthesize, args.dataset)
+    clips = load_clips(args.clips)
+    if not clips:
+        parser.error(f"No clips listed in {args.clips / 'manifest.json'}")
+
+    summaries, all_results = [], {}
+    for name in args.providers:
+        provider = get_provider(name)
+        # Model loading is not part of the per-request latency
+        provider.warmup()
+        start = time.perf_counter()
+        results = asyncio.run(transcribe_all(provider, clips, args.concurrency))
+        summaries.append(summarize(name, results, time.perf_counter() - start))
+        all_results[name] = results
+        if args.show_errors:
+            for r in results:
+                if r.get("errors") or "error" in r:
+                    print(f"  [{name}] {r['file']}: {r.get('hypothesis', r.get('error'))!r} (expected {r['reference']!r})")
+
+    print_report(summaries, len(clips), args.concurrency)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"summaries": summaries, "results": all_results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,40 +1,19 @@
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain_core.output_parsers import StrOutputParser
+import asyncio
 import logging
-from typing import List, Dict
+from typing import List, Dict, Tuple
 import json
 import os
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+from backend.conversation_evaluation.stall_model import local_verdict
+from backend.providers.base import DEFAULT_MODELS
+from backend.providers.registry import get_provider
+
 logger = logging.getLogger(__name__)
 
-def evaluate_conversation(text_history: List[Dict[str, str]]) -> int:
-    """
-    Evaluate if a conversation is stalled.
-    Returns 1 if stalled, 0 if active.
-    
-    Args:
-        text_history: List of dictionaries containing 'role' and 'content' for each message
-        
-    Returns:
-        1 if conversation is stalled, 0 if active
-    """
-    if not text_history:
-        return 0
-    
-    # Format conversation for classification
-    conversation_text = "\n".join([
-        f"{msg['role'].upper()}: {msg['content']}"
-        for msg in text_history
-    ])
-    
-    # Define classification criteria
-    system_message = """You are a conversation analyst evaluating a discussion about propaganda in news media. Your task is to determine if the conversation is stalled (1) or active (0).
+CLASSIFIER_MODEL = DEFAULT_MODELS["classifier"]
+
+# Classification criteria
+SYSTEM_MESSAGE = """You are a conversation analyst evaluating a discussion about propaganda in news media. Your task is to determine if the conversation is stalled (1) or active (0).
 
 A conversation is considered STALLED (return 1) if:
 1. User repeatedly expresses disinterest or refuses to engage (e.g., multiple "I don't care" responses)
@@ -51,24 +30,78 @@ A conversation is considered ACTIVE (return 0) if ANY of these are true:
 
 Return ONLY 0 or 1 as your answer."""
 
-    # Create prompt template
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", system_message),
-        ("human", "Conversation to analyze:\n{conversation}")
+def format_conversation(text_history: List[Dict[str, str]]) -> str:
+    """Render the text history the way the classifier sees it."""
+    return "\n".join([
+        f"{msg['role'].upper()}: {msg['content']}"
+        for msg in text_history
     ])
 
-    # Initialize model and chain
-    model = ChatOpenAI(model="gpt-4o")
-    classification_chain = prompt | model | StrOutputParser()
+def classification_messages(text_history: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """The classifier prompt for a conversation."""
+    return [
+        {"role": "system", "content": SYSTEM_MESSAGE},
+        {"role": "user", "content": f"Conversation to analyze:\n{format_conversation(text_history)}"}
+    ]
+
+def evaluate_conversation(text_history: List[Dict[str, str]]) -> int:
+    """
+    Evaluate if a conversation is stalled.
+    Returns 1 if stalled, 0 if active.
+    
+    Args:
+        text_history: List of dictionaries containing 'role' and 'content' for each message
+        
+    Returns:
+        1 if conversation is stalled, 0 if active
+    """
+    if not text_history:
+        return 0
+    
+    # Confident cases are answered by the local CPU model without an API call
+    verdict = local_verdict(text_history)
+    if verdict is not None:
+        return verdict
+    return evaluate_conversation_llm(text_history)
+
+def evaluate_conversation_llm(text_history: List[Dict[str, str]]) -> int:
+    """
+    Evaluate if a conversation is stalled with the LLM classifier only.
+    Returns 1 if stalled, 0 if active.
+    """
+    if not text_history:
+        return 0
     
     # Get classification
     try:
-        result = classification_chain.invoke({"conversation": conversation_text})
-        return int(result.strip())
+        return classify_conversation(text_history)
     except Exception as e:
         logger.error(f"Classification failed: {e}")
         return 0  # Default to active if classification fails
 
+def classify_conversation(text_history: List[Dict[str, str]]) -> int:
+    """
+    One LLM classification; API errors are raised so the model scheduler can retry them.
+    Returns 1 if stalled, 0 if active.
+    """
+    result = get_provider().complete(classification_messages(text_history), role="classifier")
+    return int(result.text.strip())
+
+async def aclassify_conversation(text_history: List[Dict[str, str]], model_name: str = CLASSIFIER_MODEL) -> Tuple[int, Dict[str, int]]:
+    """
+    Async classification for batch evaluation. Unlike evaluate_conversation,
+    errors are raised instead of defaulting to active.
+    
+    Returns:
+        The verdict (1 stalled, 0 active) and the token usage of the call
+    """
+    if not text_history:
+        return 0, {}
+    result = await asyncio.to_thread(
+        get_provider().complete, classification_messages(text_history), "classifier", model_name
+    )
+    return int(result.text.strip()), result.usage.as_dict()
+
 def load_test_conversations(file_path: str = "test_conversations.json") -> List[Dict]:
     """
     Load test conversations from a JSON file.
@@ -91,7 +124,11 @@ def load_test_conversations(file_path: str = "test_conversations.json") -> List[
         return []
 
 def test_conversations():
-    """Test the evaluator with conversations loaded from JSON file."""
+    """
+    Test the evaluator with conversations loaded from JSON file.
+    For accuracy, latency and token usage against the labels, run
+    python -m backend.benchmarks.classifier_benchmark
+    """
     # Get the directory of the current file
     current_dir = os.path.dirname(os.path.abspath(__file__))
     test_file = os.path.join(current_dir, "test_conversations.json")
@@ -111,9 +148,15 @@ def test_conversations():
         logger.info(f"\nTesting conversation: {name}")
         result = evaluate_conversation(messages)
         logger.info(f"Status: {'STALLED' if result == 1 else 'ACTIVE'}")
+        if 'expected' in conversation:
+            logger.info(f"Expected: {'STALLED' if conversation['expected'] == 1 else 'ACTIVE'}")
 
 
 if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
     test_conversations()
 
 
@@ -0,0 +1,199 @@
+"""
+Local CPU stall classifier.
+
+A logistic regression over lexical and engagement features of the user's
+recent turns, trained offline with backend.conversation_evaluation.train_stall_model
+on recorded transcripts. It answers in well under a millisecond; when its
+probability is not confident enough (LOCAL_CLASSIFIER_CONFIDENCE) the caller
+falls back to the LLM classifier.
+
+The model is a small JSON file (STALL_MODEL_PATH) holding the feature
+normalisation, the weights and the training metrics.
+"""
+import json
+import logging
+import math
+import os
+import pathlib
+import re
+import zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from backend.prompts.system_prompts import INITIAL_USER_MESSAGE
+
+logger = logging.getLogger(__name__)
+
+MODEL_PATH = pathlib.Path(os.environ.get(
+    "STALL_MODEL_PATH", str(pathlib.Path(__file__).resolve().parent / "stall_model.json")
+))
+# Probability of the predicted class needed to answer without the LLM
+CONFIDENCE = float(os.environ.get("LOCAL_CLASSIFIER_CONFIDENCE", "0.9"))
+ENABLED = os.environ.get("LOCAL_CLASSIFIER", "1") != "0"
+
+HASH_BUCKETS = 256
+RECENT_TURNS = 3
+SHORT_REPLY_WORDS = 3
+
+_WORD = re.compile(r"[a-z']+")
+DISENGAGEMENT_PHRASES = (
+    "don't care", "dont care", "who cares", "whatever", "no idea", "dunno", "don't know", "idk",
+    "not interested", "boring", "stop", "i'm done", "im done", "leave me", "skip", "bye", "not really", "nothing",
+)
+ENGAGEMENT_WORDS = {
+    "because", "think", "agree", "disagree", "why", "how", "what", "propaganda", "evidence",
+    "article", "example", "believe", "maybe", "interesting", "true", "wrong", "right",
+}
+DENSE_FEATURES = (
+    "user_turns", "last_words", "recent_mean_words", "recent_short_fraction", "last_repeated",
+    "recent_repeated_fraction", "last_question", "length_trend", "recent_type_token_ratio",
+    "disengagement_hits", "engagement_hits", "assistant_overlap",
+)
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+def _normalise(text: str) -> str:
+    return " ".join(_words(text))
+
+
+def conversation_turns(text_history: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """User and assistant turns, without the system prompt and the automatic opening request."""
+    return [
+        msg for msg in text_history
+        if msg.get("role") in ("user", "assistant")
+        and not (msg["role"] == "user" and msg.get("content") == INITIAL_USER_MESSAGE)
+    ]
+
+
+def extract_features(text_history: List[Dict[str, str]]) -> np.ndarray:
+    """Dense engagement features followed by hashed word/bigram counts of the recent user turns."""
+    turns = conversation_turns(text_history)
+    user = [str(msg.get("content") or "") for msg in turns if msg["role"] == "user"]
+    assistant = [str(msg.get("content") or "") for msg in turns if msg["role"] == "assistant"]
+    recent = user[-RECENT_TURNS:]
+    recent_words = [_words(text) for text in recent]
+    last_words = recent_words[-1] if recent_words else []
+    earlier = [len(_words(text)) for text in user[:-1]]
+    normalised = [_normalise(text) for text in user]
+    recent_text = " ".join(text.lower() for text in recent)
+    flat = [w for words in recent_words for w in words]
+    last_assistant = set(_words(assistant[-1])) if assistant else set()
+
+    dense = [
+        math.log1p(len(user)),
+        math.log1p(len(last_words)),
+        math.log1p(np.mean([len(w) for w in recent_words])) if recent_words else 0.0,
+        np.mean([len(w) <= SHORT_REPLY_WORDS for w in recent_words]) if recent_words else 0.0,
+        float(bool(normalised) and normalised[-1] in normalised[:-1]),
+        np.mean([n in normalised[:i] for i, n in enumerate(normalised)][-RECENT_TURNS:]) if normalised else 0.0,
+        float(bool(recent) and "?" in recent[-1]),
+        math.log((len(last_words) + 1) / (np.mean(earlier) + 1)) if earlier else 0.0,
+        len(set(flat)) / len(flat) if flat else 0.0,
+        float(min(sum(recent_text.count(p) for p in DISENGAGEMENT_PHRASES), 5)),
+        float(min(sum(w in ENGAGEMENT_WORDS for w in flat), 10)),
+        len(set(last_words) & last_assistant) / len(set(last_words)) if last_words else 0.0,
+    ]
+
+    hashed = np.zeros(HASH_BUCKETS)
+    for words in recent_words[-2:]:
+        for token in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            # crc32 rather than hash(): stable across processes (PYTHONHASHSEED)
+            hashed[zlib.crc32(token.encode("utf-8")) % HASH_BUCKETS] = 1.0
+    return np.concatenate([np.asarray(dense, dtype=float), hashed])
+
+
+def sigmoid(z: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+
+class StallModel:
+    """Logistic regression on standardised features."""
+
+    def __init__(self, weights: np.ndarray, bias: float, mean: np.ndarray, scale: np.ndarray,
+                 metrics: Optional[Dict] = None):
+        self.weights = weights
+        self.bias = bias
+        self.mean = mean
+        self.scale = scale
+        self.metrics = metrics or {}
+
+    @classmethod
+    def fit(cls, X: np.ndarray, y: np.ndarray, l2: float = 1.0, iterations: int = 2000,
+            learning_rate: float = 0.1) -> "StallModel":
+        """Full-batch gradient descent with class weights, so rare stalled examples count as much."""
+        mean = X.mean(axis=0)
+        scale = X.std(axis=0)
+        scale[scale == 0] = 1.0
+        Xs = (X - mean) / scale
+        positives = max(y.sum(), 1)
+        negatives = max(len(y) - y.sum(), 1)
+        sample_weight = np.where(y == 1, len(y) / (2 * positives), len(y) / (2 * negatives))
+        weights = np.zeros(X.shape[1])
+        bias = 0.0
+        for _ in range(iterations):
+            error = (sigmoid(Xs @ weights + bias) - y) * sample_weight
+            weights -= learning_rate * (Xs.T @ error / len(y) + l2 * weights / len(y))
+            bias -= learning_rate * error.mean()
+        return cls(weights, bias, mean, scale)
+
+    def probabilities(self, X: np.ndarray) -> np.ndarray:
+        return sigmoid(((X - self.mean) / self.scale) @ self.weights + self.bias)
+
+    def stalled_probability(self, text_history: List[Dict[str, str]]) -> float:
+        return float(self.probabilities(extract_features(text_history)[None, :])[0])
+
+    def save(self, path: pathlib.Path) -> None:
+        model = {
+            "features": list(DENSE_FEATURES) + [f"hash_{i}" for i in range(HASH_BUCKETS)],
+            "weights": self.weights.tolist(),
+            "bias": self.bias,
+            "mean": self.mean.tolist(),
+            "scale": self.scale.tolist(),
+            "metrics": self.metrics,
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(model, f)
+
+    @classmethod
+    def load(cls, path: pathlib.Path) -> "StallModel":
+        with open(path, "r", encoding="utf-8") as f:
+            model = json.load(f)
+        if len(model["weights"]) != len(DENSE_FEATURES) + HASH_BUCKETS:
+            raise ValueError("Model was trained with a different feature set")
+        return cls(np.asarray(model["weights"]), model["bias"], np.asarray(model["mean"]),
+                   np.asarray(model["scale"]), model.get("metrics"))
+
+
+_model: Optional[StallModel] = None
+_loaded = False
+
+
+def get_model() -> Optional[StallModel]:
+    """The trained model, loaded once; None if disabled or not trained yet."""
+    global _model, _loaded
+    if not _loaded:
+        _loaded = True
+        if ENABLED and MODEL_PATH.is_file():
+            try:
+                _model = StallModel.load(MODEL_PATH)
+                logger.info(f"Loaded local stall classifier from {MODEL_PATH} (confidence threshold {CONFIDENCE})")
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"Failed to load local stall classifier {MODEL_PATH}: {e}")
+    return _model
+
+
+def local_verdict(text_history: List[Dict[str, str]]) -> Optional[int]:
+    """1 stalled / 0 active when the local model is confident, None to ask the LLM."""
+    model = get_model()
+    if model is None or not text_history:
+        return None
+    probability = model.stalled_probability(text_history)
+    if probability >= CONFIDENCE:
+        return 1
+    if probability <= 1.0 - CONFIDENCE:
+        return 0
+    return None
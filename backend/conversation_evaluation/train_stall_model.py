@@ -0,0 +1,157 @@
+"""
+Offline training of the local stall classifier (backend/conversation_evaluation/stall_model.py).
+
+Training examples are conversation prefixes ending with a user turn, i.e. the
+text history the classifier sees during a session:
+- test_conversations.json: the full conversation with its expected verdict;
+  prefixes of active conversations are active as well
+- the dialogue table (--dynamodb): sessions that ended with
+  "conversation_stalled" are stalled at their last user turn and active
+  before; all prefixes of other sessions are active. These labels are the
+  LLM classifier's own verdicts, so the local model learns to reproduce them.
+
+Grouped cross-validation reports accuracy and the share of turns the local
+model answers on its own at the configured confidence threshold. The model
+is then trained on all examples and written to STALL_MODEL_PATH.
+
+Usage:
+    python -m backend.conversation_evaluation.train_stall_model --dynamodb --export transcripts.jsonl
+    python -m backend.conversation_evaluation.train_stall_model --data transcripts.jsonl
+"""
+import argparse
+import json
+import logging
+import os
+import pathlib
+from collections import defaultdict
+from typing import Dict, List
+
+import numpy as np
+
+from backend.conversation_evaluation.evaluator import load_test_conversations
+from backend.conversation_evaluation.stall_model import (
+    CONFIDENCE,
+    MODEL_PATH,
+    StallModel,
+    extract_features,
+)
+
+logger = logging.getLogger(__name__)
+
+TEST_CONVERSATIONS = pathlib.Path(__file__).resolve().parent / "test_conversations.json"
+
+
+def user_prefixes(messages: List[Dict[str, str]]) -> List[List[Dict[str, str]]]:
+    """Every prefix that ends with a user turn (when the classifier runs)."""
+    return [messages[:i + 1] for i, msg in enumerate(messages) if msg.get("role") == "user"]
+
+
+def examples_from_test_conversations(path: pathlib.Path) -> List[Dict]:
+    examples = []
+    for conversation in load_test_conversations(str(path)):
+        if conversation.get("expected") not in (0, 1):
+            continue
+        name = conversation.get("name", "Unnamed conversation")
+        messages = conversation["messages"]
+        if conversation["expected"] == 0:
+            examples.extend({"group": name, "messages": prefix, "label": 0} for prefix in user_prefixes(messages))
+        else:
+            examples.append({"group": name, "messages": messages, "label": 1})
+    return examples
+
+
+def examples_from_dynamodb() -> List[Dict]:
+    """Label recorded sessions by how they ended."""
+    from backend.db_utils.dialogue_db import scan_all_items
+
+    sessions = defaultdict(list)
+    for item in scan_all_items():
+        sessions[item["session_id"]].append(item)
+
+    examples = []
+    for session_id, items in sessions.items():
+        items.sort(key=lambda item: (int(item["timestamp"]), item.get("created_at", "")))
+        messages = [
+            {"role": item["role"], "content": str(item.get("content") or "")}
+            for item in items if item.get("role") in ("user", "assistant")
+        ]
+        ends = [item.get("reason") for item in items if item.get("event_type") == "session_end"]
+        prefixes = user_prefixes(messages)
+        if not prefixes:
+            continue
+        stalled = "conversation_stalled" in ends
+        for i, prefix in enumerate(prefixes):
+            label = int(stalled and i == len(prefixes) - 1)
+            examples.append({"group": session_id, "messages": prefix, "label": label})
+    logger.info(f"Exported {len(examples)} examples from {len(sessions)} recorded sessions")
+    return examples
+
+
+def cross_validate(X: np.ndarray, y: np.ndarray, groups: List[str], folds: int, confidence: float) -> Dict:
+    """Grouped k-fold: all prefixes of a conversation stay in the same fold."""
+    unique = sorted(set(groups))
+    rng = np.random.default_rng(0)
+    fold_of = {g: i % folds for i, g in enumerate(rng.permutation(unique))}
+    probabilities = np.zeros(len(y))
+    for fold in range(folds):
+        test = np.array([fold_of[g] == fold for g in groups])
+        if not test.any() or test.all():
+            continue
+        model = StallModel.fit(X[~test], y[~test])
+        probabilities[test] = model.probabilities(X[test])
+    predictions = (probabilities >= 0.5).astype(int)
+    confident = (probabilities >= confidence) | (probabilities <= 1.0 - confidence)
+    return {
+        "examples": int(len(y)),
+        "stalled_examples": int(y.sum()),
+        "accuracy": float((predictions == y).mean()),
+        "local_coverage": float(confident.mean()),
+        "local_accuracy": float((predictions[confident] == y[confident]).mean()) if confident.any() else None,
+        "confidence": confidence,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dynamodb", action="store_true", help="Export labelled transcripts from the dialogue table")
+    parser.add_argument("--data", type=pathlib.Path, action="append", default=[],
+                        help="Previously exported examples (JSON lines), can be repeated")
+    parser.add_argument("--export", type=pathlib.Path, default=None, help="Write all examples to this JSON lines file")
+    parser.add_argument("--output", type=pathlib.Path, default=MODEL_PATH)
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--confidence", type=float, default=CONFIDENCE)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    examples = examples_from_test_conversations(TEST_CONVERSATIONS)
+    for path in args.data:
+        with open(path, "r", encoding="utf-8") as f:
+            examples.extend(json.loads(line) for line in f if line.strip())
+    if args.dynamodb:
+        examples.extend(examples_from_dynamodb())
+    if args.export:
+        with open(args.export, "w", encoding="utf-8") as f:
+            for example in examples:
+                f.write(json.dumps(example, ensure_ascii=False) + "\n")
+        logger.info(f"Wrote {len(examples)} examples to {args.export}")
+
+    y = np.array([example["label"] for example in examples])
+    if len(set(y.tolist())) < 2:
+        parser.error("Training needs both stalled and active examples")
+    X = np.stack([extract_features(example["messages"]) for example in examples])
+    groups = [example["group"] for example in examples]
+
+    metrics = cross_validate(X, y, groups, args.folds, args.confidence)
+    logger.info(f"Cross-validation: accuracy {metrics['accuracy']:.3f}, "
+                f"answered locally {metrics['local_coverage']:.1%} of turns "
+                f"(accuracy there {metrics['local_accuracy'] if metrics['local_accuracy'] is not None else float('nan'):.3f})")
+
+    model = StallModel.fit(X, y)
+    model.metrics = metrics
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    model.save(args.output)
+    logger.info(f"Model written to {args.output} ({os.path.getsize(args.output)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
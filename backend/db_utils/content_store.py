@@ -0,0 +1,257 @@
+"""
+Content-addressed storage of large session bodies (article texts, propaganda analyses).
+
+The same few experiment articles and their analyses repeat in thousands of
+sessions. Instead of storing them with every session, each body is stored
+once under the SHA-256 of its canonical JSON and sessions keep the reference
+('sha256:<hex>'):
+
+- the body is compressed with zstd (gzip when the zstandard package is not
+  installed; the codec is stored with the body, so both can be read)
+- compressed bodies up to CONTENT_INLINE_MAX_BYTES are stored in the dialogue
+  table itself, as the item session_id='content#<hex>', timestamp=0
+- larger bodies overflow to an object store (CONTENT_STORE_URL, s3://bucket/prefix)
+  and the table item keeps the object key; a local directory (file:///path)
+  is only used when set explicitly, for development. Without CONTENT_STORE_URL
+  larger bodies are refused (a warning is logged at startup)
+
+Writes are conditional (a body that exists is never written again) and every
+worker remembers the hashes it already stored, so a repeated article costs no
+write at all. Loaded bodies are cached in memory.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Optional, Set
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# DynamoDB items are limited to 400 KB, keep room for the other attributes
+CONTENT_INLINE_MAX_BYTES = int(os.environ.get('CONTENT_INLINE_MAX_BYTES', str(300 * 1024)))
+CONTENT_STORE_URL = os.environ.get('CONTENT_STORE_URL', '')
+CONTENT_CACHE_ITEMS = 64
+ZSTD_LEVEL = 10
+
+REF_PREFIX = 'sha256:'
+ITEM_PREFIX = 'content#'
+
+
+def encode_body(value: Any) -> bytes:
+    """Canonical bytes of a JSON-serializable value: equal values give equal hashes."""
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str).encode('utf-8')
+
+
+def compress(data: bytes) -> tuple:
+    """Returns (encoding, compressed bytes)."""
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return 'gzip', gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def decompress(encoding: str, data: bytes) -> bytes:
+    if encoding == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('Body is zstd-compressed, install the zstandard package to read it')
+        return zstandard.ZstdDecompressor().decompress(data)
+    if encoding == 'gzip':
+        return gzip.decompress(data)
+    if encoding == 'identity':
+        return data
+    raise ValueError(f'Unknown content encoding: {encoding}')
+
+
+class ObjectStoreNotConfigured(Exception):
+    """A body needs the object store, but CONTENT_STORE_URL is not set."""
+
+
+class ObjectStore(ABC):
+    """Blob storage for bodies too large for a table item."""
+
+    @abstractmethod
+    def put(self, key: str, data: bytes) -> None:
+        ...
+
+    @abstractmethod
+    def get(self, key: str) -> bytes:
+        ...
+
+
+class LocalObjectStore(ObjectStore):
+    """Objects as files below a directory, for development and tests."""
+
+    def __init__(self, root: str):
+        self.root = pathlib.Path(root)
+
+    def _path(self, key: str) -> pathlib.Path:
+        path = (self.root / key).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError(f'Object key outside the store: {key}')
+        return path
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        if path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so a reader never sees a partial object
+        tmp = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def get(self, key: str) -> bytes:
+        return self._path(key).read_bytes()
+
+
+class S3ObjectStore(ObjectStore):
+    def __init__(self, bucket: str, prefix: str = ''):
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        import boto3
+        endpoint_url = os.environ.get('AWS_ENDPOINT_URL')
+        self.client = boto3.client('s3', region_name=os.environ.get('AWS_REGION', 'eu-north-1'), endpoint_url=endpoint_url)
+
+    def _key(self, key: str) -> str:
+        return f'{self.prefix}/{key}' if self.prefix else key
+
+    def put(self, key: str, data: bytes) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=data)
+
+    def get(self, key: str) -> bytes:
+        return self.client.get_object(Bucket=self.bucket, Key=self._key(key))['Body'].read()
+
+
+def object_store_from_url(url: str) -> ObjectStore:
+    """s3://bucket/prefix or file:///path (file://relative/path is relative to the working directory)."""
+    if url.startswith('s3://'):
+        bucket, _, prefix = url[len('s3://'):].partition('/')
+        return S3ObjectStore(bucket, prefix)
+    if url.startswith('file://'):
+        return LocalObjectStore(url[len('file://'):])
+    raise ValueError(f'Unsupported CONTENT_STORE_URL: {url}')
+
+
+class ContentStore:
+    """
+    Stores bodies once in the dialogue table (or the object store) and resolves references.
+
+    Args:
+        table: Returns the DynamoDB table resource
+        objects: Object store for bodies above `inline_max_bytes`
+    """
+
+    def __init__(self, table: Callable[[], Any], objects: Optional[ObjectStore] = None,
+                 inline_max_bytes: int = CONTENT_INLINE_MAX_BYTES):
+        self._table = table
+        self._objects = objects
+        self.inline_max_bytes = inline_max_bytes
+        self._stored: Set[str] = set()
+        self._cache: 'OrderedDict[str, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def objects(self) -> ObjectStore:
+        if self._objects is None:
+            if not CONTENT_STORE_URL:
+                # Never fall back to the local disk: in a container it is lost while the table keeps the reference
+                raise ObjectStoreNotConfigured('Body exceeds CONTENT_INLINE_MAX_BYTES and CONTENT_STORE_URL is not set')
+            self._objects = object_store_from_url(CONTENT_STORE_URL)
+        return self._objects
+
+    def check_config(self) -> None:
+        """Warn when large bodies would be refused or written to the local disk."""
+        if self._objects is not None:
+            return
+        if not CONTENT_STORE_URL:
+            logger.warning(f'CONTENT_STORE_URL is not set: bodies above {self.inline_max_bytes} bytes will not be stored. '
+                           f'Set CONTENT_STORE_URL=s3://bucket/prefix (or file:///path for development)')
+        elif CONTENT_STORE_URL.startswith('file://'):
+            local = pathlib.Path(CONTENT_STORE_URL[len('file://'):]).resolve()
+            logger.warning(f'Content object store is the local directory {local}, which is only fit for development')
+
+    def put(self, value: Any, kind: str) -> str:
+        """
+        Store a JSON-serializable value unless it is stored already.
+
+        Args:
+            value: The body, e.g. an article text or an analysis result
+            kind: What the body is, kept with it for exports ('article', 'propaganda_result')
+
+        Returns:
+            The reference, 'sha256:<hex>'
+        """
+        data = encode_body(value)
+        digest = hashlib.sha256(data).hexdigest()
+        ref = f'{REF_PREFIX}{digest}'
+        if digest in self._stored:
+            return ref
+
+        encoding, body = compress(data)
+        item = {
+            'session_id': f'{ITEM_PREFIX}{digest}',
+            'timestamp': 0,
+            'event_type': 'content',
+            'content_kind': kind,
+            'encoding': encoding,
+            'size': len(data),
+            'stored_size': len(body),
+            'created_at': datetime.utcnow().isoformat()
+        }
+        if len(body) > self.inline_max_bytes:
+            # Object first: a table item never points to a missing object
+            item['object_key'] = f'{digest[:2]}/{digest}.{encoding}'
+            self.objects.put(item['object_key'], body)
+        else:
+            item['body'] = body
+
+        table = self._table()
+        try:
+            table.put_item(Item=item, ConditionExpression='attribute_not_exists(session_id)')
+            logger.info(f"Stored {kind} {digest[:12]}: {len(data)} bytes, {len(body)} {encoding}"
+                        f"{' in the object store' if 'object_key' in item else ''}")
+        except table.meta.client.exceptions.ConditionalCheckFailedException:
+            pass
+        self._stored.add(digest)
+        return ref
+
+    def get(self, ref: str) -> Any:
+        """The value behind a reference returned by `put`."""
+        with self._lock:
+            if ref in self._cache:
+                self._cache.move_to_end(ref)
+                return self._cache[ref]
+        if not ref.startswith(REF_PREFIX):
+            raise ValueError(f'Not a content reference: {ref}')
+        digest = ref[len(REF_PREFIX):]
+        item = self._table().get_item(Key={'session_id': f'{ITEM_PREFIX}{digest}', 'timestamp': 0}).get('Item')
+        if item is None:
+            raise KeyError(f'Content {ref} not found')
+        if 'object_key' in item:
+            body = self.objects.get(item['object_key'])
+        else:
+            body = item['body'].value
+        data = decompress(item['encoding'], body)
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f'Content {ref} is corrupt')
+        value = json.loads(data)
+        with self._lock:
+            self._cache[ref] = value
+            while len(self._cache) > CONTENT_CACHE_ITEMS:
+                self._cache.popitem(last=False)
+        self._stored.add(digest)
+        return value
+
+
+def is_content_item(item: dict) -> bool:
+    return str(item.get('session_id', '')).startswith(ITEM_PREFIX)
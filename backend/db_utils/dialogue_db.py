@@ -1,61 +1,107 @@
-import boto3
 import json
 import logging
 import os
+import threading
 import time
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 from decimal import Decimal
 
+from backend.db_utils.content_store import ContentStore, is_content_item
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# Initialize DynamoDB client with required configuration
+# DynamoDB client configuration
 aws_region = os.environ.get('AWS_REGION', 'eu-north-1')
 endpoint_url = os.environ.get('AWS_ENDPOINT_URL')
-logger.info(f"Using AWS region: {aws_region}")
-
-if endpoint_url:
-    logger.info(f"Using custom DynamoDB endpoint: {endpoint_url}")
-    dynamodb = boto3.resource('dynamodb', region_name=aws_region, endpoint_url=endpoint_url)
-else:
-    dynamodb = boto3.resource('dynamodb', region_name=aws_region)
 
 # Table name can be configured via environment variable
 DYNAMODB_TABLE = os.environ.get('DYNAMODB_TABLE', 'apollolytics_dialogues')
 
+# boto3 takes a noticeable part of a worker's start: it is imported and the
+# resource created on first use (the app does it in the background after startup)
+_dynamodb = None
+_table = None
+_dynamodb_lock = threading.Lock()
+
+def get_dynamodb():
+    """The shared DynamoDB resource, created on first use."""
+    global _dynamodb
+    with _dynamodb_lock:
+        if _dynamodb is None:
+            import boto3
+            logger.info(f"Using AWS region: {aws_region}")
+            if endpoint_url:
+                logger.info(f"Using custom DynamoDB endpoint: {endpoint_url}")
+                _dynamodb = boto3.resource('dynamodb', region_name=aws_region, endpoint_url=endpoint_url)
+            else:
+                _dynamodb = boto3.resource('dynamodb', region_name=aws_region)
+    return _dynamodb
+
+def get_table():
+    """The dialogue table."""
+    global _table
+    if _table is None:
+        _table = get_dynamodb().Table(DYNAMODB_TABLE)
+    return _table
+
+# Article texts and analyses are stored once and referenced by the sessions
+content_store = ContentStore(get_table)
+
+def to_dynamodb(value: Any) -> Any:
+    """Convert floats (also nested in dicts and lists) to Decimal, as DynamoDB requires."""
+    if isinstance(value, float):
+        return Decimal(str(value))
+    if isinstance(value, dict):
+        return {k: to_dynamodb(v) for k, v in value.items() if v is not None}
+    if isinstance(value, list):
+        return [to_dynamodb(v) for v in value]
+    return value
+
+def event_timestamp() -> Decimal:
+    """
+    Sort key of a new item: Unix time with microseconds. Whole seconds let
+    events of the same second (e.g. session_init and propaganda_analysis, which
+    are saved concurrently) overwrite each other.
+    """
+    return Decimal(f'{time.time():.6f}')
+
 def initialize_db():
     """
     Initialize the DynamoDB table if it doesn't exist.
     This function is idempotent and can be called on application startup.
     """
+    content_store.check_config()
     try:
-        # Check if table exists
-        existing_tables = [table.name for table in dynamodb.tables.all()]
-        logger.info(f"Available tables: {existing_tables}")
+        # One describe_table call instead of listing every table of the account
+        client = get_dynamodb().meta.client
+        try:
+            status = client.describe_table(TableName=DYNAMODB_TABLE)['Table']['TableStatus']
+            logger.info(f"DynamoDB table already exists: {DYNAMODB_TABLE} ({status})")
+            return
+        except client.exceptions.ResourceNotFoundException:
+            pass
         
-        if DYNAMODB_TABLE not in existing_tables:
-            logger.info(f"Creating DynamoDB table: {DYNAMODB_TABLE}")
-            
-            # Create the table
-            table = dynamodb.create_table(
-                TableName=DYNAMODB_TABLE,
-                KeySchema=[
-                    {'AttributeName': 'session_id', 'KeyType': 'HASH'},  # Partition key
-                    {'AttributeName': 'timestamp', 'KeyType': 'RANGE'}   # Sort key
-                ],
-                AttributeDefinitions=[
-                    {'AttributeName': 'session_id', 'AttributeType': 'S'},
-                    {'AttributeName': 'timestamp', 'AttributeType': 'N'}
-                ],
-                BillingMode='PAY_PER_REQUEST'
-            )
-            
-            # Wait for table to be created
-            table.meta.client.get_waiter('table_exists').wait(TableName=DYNAMODB_TABLE)
-            logger.info(f"DynamoDB table created: {DYNAMODB_TABLE}")
-        else:
-            logger.info(f"DynamoDB table already exists: {DYNAMODB_TABLE}")
+        logger.info(f"Creating DynamoDB table: {DYNAMODB_TABLE}")
+        
+        # Create the table
+        table = get_dynamodb().create_table(
+            TableName=DYNAMODB_TABLE,
+            KeySchema=[
+                {'AttributeName': 'session_id', 'KeyType': 'HASH'},  # Partition key
+                {'AttributeName': 'timestamp', 'KeyType': 'RANGE'}   # Sort key
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'session_id', 'AttributeType': 'S'},
+                {'AttributeName': 'timestamp', 'AttributeType': 'N'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        
+        # Wait for table to be created
+        table.meta.client.get_waiter('table_exists').wait(TableName=DYNAMODB_TABLE)
+        logger.info(f"DynamoDB table created: {DYNAMODB_TABLE}")
             
     except Exception as e:
         logger.error(f"Error initializing DynamoDB: {str(e)}")
@@ -82,14 +128,16 @@ def save_session_init(
         bool: True if save was successful, False otherwise
     """
     try:
-        table = dynamodb.Table(DYNAMODB_TABLE)
-        timestamp = int(time.time())
+        table = get_table()
+        timestamp = event_timestamp()
+        article_ref = content_store.put(article, 'article')
         
         item = {
             'session_id': session_id,
             'timestamp': timestamp,
             'event_type': 'session_init',
-            'article': article,
+            'article_ref': article_ref,
+            'article_chars': len(article),
             'dialogue_mode': dialogue_mode,
             'origin_url': origin_url or 'unknown',
             'prolific_id': prolific_id or 'XXX',
@@ -119,17 +167,17 @@ def save_propaganda_analysis(
         bool: True if save was successful, False otherwise
     """
     try:
-        table = dynamodb.Table(DYNAMODB_TABLE)
-        timestamp = int(time.time())
+        table = get_table()
+        timestamp = event_timestamp()
         
-        # Convert any non-serializable objects to strings
-        serialized_result = json.loads(json.dumps(propaganda_result, default=str))
+        # Non-serializable objects are stored as strings
+        propaganda_ref = content_store.put(propaganda_result, 'propaganda_result')
         
         item = {
             'session_id': session_id,
             'timestamp': timestamp,
             'event_type': 'propaganda_analysis',
-            'propaganda_result': serialized_result,
+            'propaganda_ref': propaganda_ref,
             'created_at': datetime.utcnow().isoformat()
         }
         
@@ -141,7 +189,15 @@ def save_propaganda_analysis(
         logger.error(f"Error saving propaganda analysis to DynamoDB: {str(e)}")
         return False
 
-def save_message(session_id: str, role: str, content: Any, message_id: str, timing_info: Dict[str, float] = None) -> None:
+def save_message(
+    session_id: str,
+    role: str,
+    content: Any,
+    message_id: str,
+    timing_info: Dict[str, float] = None,
+    audio_info: Dict[str, float] = None,
+    usage_info: Dict[str, Dict[str, float]] = None
+) -> None:
     """
     Save a message to DynamoDB with timing information.
     
@@ -158,10 +214,14 @@ def save_message(session_id: str, role: str, content: Any, message_id: str, timi
             - thinking_time: Time from assistant response to starting recording
             - recording_duration: Duration of recording
             - total_response_time: Total time from assistant response to end of recording
+        audio_info: Optional preprocessing statistics for user audio
+            (original_bytes, sent_bytes, bytes_saved, original_duration, speech_duration)
+        usage_info: Optional model usage of the turn per model kind (tokens,
+            audio seconds, cost), see backend/observability/usage_ledger.py
     """
     try:
-        table = dynamodb.Table(DYNAMODB_TABLE)
-        timestamp = int(time.time())  # Use Unix timestamp as number
+        table = get_table()
+        timestamp = event_timestamp()
         
         # Convert timing_info float values to Decimal, handling None values
         timing_info_decimal = None
@@ -174,6 +234,11 @@ def save_message(session_id: str, role: str, content: Any, message_id: str, timi
                     except (ValueError, TypeError):
                         logger.warning(f"Could not convert timing value {k}: {v} to Decimal")
         
+        # Same conversion for the audio preprocessing statistics
+        audio_info_decimal = {
+            k: Decimal(str(v)) for k, v in (audio_info or {}).items() if v is not None
+        }
+        
         # For user messages, handle different content types and filter out audio
         if role == "user":
             if isinstance(content, list):
@@ -195,13 +260,15 @@ def save_message(session_id: str, role: str, content: Any, message_id: str, timi
             'content': content,  # This will be the transcript text only
             'timestamp': timestamp,
             'timing_info': timing_info_decimal or {},
+            'audio_info': audio_info_decimal,
+            'usage_info': to_dynamodb(usage_info or {}),
             'created_at': datetime.utcnow().isoformat()
         }
         
         # Log the data being pushed to DynamoDB (excluding audio)
-        logger.info(f"Pushing to DynamoDB - Session: {session_id}, Role: {role}")
-        logger.info(f"Message content: {content}")
-        logger.info(f"Timing info: {timing_info_decimal}")
+        logger.info(f"Pushing to DynamoDB - Session: {session_id}, Role: {role}, Content: {len(str(content))} chars")
+        logger.debug(f"Message content: {content}")
+        logger.debug(f"Timing info: {timing_info_decimal}")
         
         table.put_item(Item=message_data)
         logger.info(f"Successfully saved {role} message to DynamoDB: {message_id}")
@@ -210,9 +277,51 @@ def save_message(session_id: str, role: str, content: Any, message_id: str, timi
         logger.error(f"Failed message data: {json.dumps(message_data, default=str) if 'message_data' in locals() else 'No message data'}")
         raise
 
+def save_interruption(
+    session_id: str,
+    message_id: str,
+    played_content: str,
+    played_duration: float
+) -> bool:
+    """
+    Record that the user interrupted the playback of an assistant message that
+    was already saved in full.
+    
+    Args:
+        session_id: The session ID
+        message_id: ID of the interrupted assistant message
+        played_content: The part of the message the user heard
+        played_duration: Seconds of audio played before the interrupt
+        
+    Returns:
+        bool: True if save was successful, False otherwise
+    """
+    try:
+        table = get_table()
+        timestamp = event_timestamp()
+        
+        item = {
+            'session_id': session_id,
+            'timestamp': timestamp,
+            'event_type': 'assistant_interrupted',
+            'message_id': message_id,
+            'played_content': played_content,
+            'played_duration': Decimal(str(played_duration)),
+            'created_at': datetime.utcnow().isoformat()
+        }
+        
+        table.put_item(Item=item)
+        logger.info(f"Saved interruption of {message_id} for {session_id}")
+        return True
+        
+    except Exception as e:
+        logger.error(f"Error saving interruption to DynamoDB: {str(e)}")
+        return False
+
 def save_session_end(
     session_id: str,
-    reason: str = "normal"
+    reason: str = "normal",
+    usage: Optional[Dict[str, Any]] = None
 ) -> bool:
     """
     Mark a session as ended.
@@ -220,13 +329,15 @@ def save_session_end(
     Args:
         session_id: Unique identifier for the session
         reason: The reason the session ended (e.g., "normal", "error", "timeout")
+        usage: Optional usage summary of the session (condition, totals and
+            per-kind usage and cost)
         
     Returns:
         bool: True if save was successful, False otherwise
     """
     try:
-        table = dynamodb.Table(DYNAMODB_TABLE)
-        timestamp = int(time.time())
+        table = get_table()
+        timestamp = event_timestamp()
         
         item = {
             'session_id': session_id,
@@ -235,6 +346,8 @@ def save_session_end(
             'reason': reason,
             'created_at': datetime.utcnow().isoformat()
         }
+        if usage:
+            item['usage'] = to_dynamodb(usage)
         
         table.put_item(Item=item)
         logger.info(f"Saved session end for {session_id}")
@@ -244,6 +357,20 @@ def save_session_end(
         logger.error(f"Error saving session end to DynamoDB: {str(e)}")
         return False
 
+def expand_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Load the stored bodies an item references ('article_ref', 'propaganda_ref')
+    into 'article' and 'propaganda_result', as they were stored before
+    content-addressed storage. Items that store them inline are returned as is.
+    """
+    for ref_key, key in (('article_ref', 'article'), ('propaganda_ref', 'propaganda_result')):
+        if ref_key in item and key not in item:
+            try:
+                item[key] = content_store.get(item[ref_key])
+            except Exception as e:
+                logger.error(f"Error loading {key} {item[ref_key]} of {item.get('session_id')}: {str(e)}")
+    return item
+
 def get_session_data(session_id: str) -> List[Dict[str, Any]]:
     """
     Retrieve all data for a specific session.
@@ -255,11 +382,12 @@ def get_session_data(session_id: str) -> List[Dict[str, Any]]:
         List of items associated with the session
     """
     try:
-        table = dynamodb.Table(DYNAMODB_TABLE)
+        table = get_table()
+        from boto3.dynamodb.conditions import Key
         response = table.query(
-            KeyConditionExpression=boto3.dynamodb.conditions.Key('session_id').eq(session_id)
+            KeyConditionExpression=Key('session_id').eq(session_id)
         )
-        return response.get('Items', [])
+        return [expand_item(item) for item in response.get('Items', [])]
     except Exception as e:
         logger.error(f"Error retrieving session data from DynamoDB: {str(e)}")
         return []
@@ -274,7 +402,7 @@ def list_sessions() -> List[str]:
     # This is a scan operation, which can be expensive for large tables
     # In production, you might want to use a secondary index or other approach
     try:
-        table = dynamodb.Table(DYNAMODB_TABLE)
+        table = get_table()
         response = table.scan(
             ProjectionExpression="session_id",
             Select="SPECIFIC_ATTRIBUTES"
@@ -283,7 +411,8 @@ def list_sessions() -> List[str]:
         # Extract unique session IDs
         session_ids = set()
         for item in response.get('Items', []):
-            session_ids.add(item['session_id'])
+            if not is_content_item(item):
+                session_ids.add(item['session_id'])
             
         # Handle pagination if there are more results
         while 'LastEvaluatedKey' in response:
@@ -293,9 +422,28 @@ def list_sessions() -> List[str]:
                 ExclusiveStartKey=response['LastEvaluatedKey']
             )
             for item in response.get('Items', []):
-                session_ids.add(item['session_id'])
+                if not is_content_item(item):
+                    session_ids.add(item['session_id'])
                 
         return list(session_ids)
     except Exception as e:
         logger.error(f"Error listing sessions from DynamoDB: {str(e)}")
-        return []
\ No newline at end of file
+        return []
+
+def scan_all_items() -> List[Dict[str, Any]]:
+    """
+    Retrieve every session item in the table, e.g. for offline exports.
+    
+    Returns:
+        List of all items (session inits, messages, analyses and session ends),
+        with their article and analysis loaded (see expand_item); the stored
+        bodies themselves are not listed
+    """
+    # Full table scan with pagination; run offline, never from a request handler
+    table = get_table()
+    response = table.scan()
+    items = response.get('Items', [])
+    while 'LastEvaluatedKey' in response:
+        response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
+        items.extend(response.get('Items', []))
+    return [expand_item(item) for item in items if not is_content_item(item)]
@@ -0,0 +1,78 @@
+"""
+Barge-in support: the participant may start answering while the assistant is
+still talking.
+
+The client then sends {"type": "interrupt", "played_seconds": s} with the
+audio it actually played. The server cancels the running generation, stops
+sending deltas and keeps only the part of the answer that was heard, so the
+model context and the stored transcript match what the participant heard.
+"""
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, List, Optional
+
+
+@dataclass
+class SpokenSegment:
+    """One audio delta sent to the client and the text it speaks."""
+    text: str
+    duration: Optional[float]
+
+
+def played_transcript(segments: List[SpokenSegment], played_seconds: float) -> str:
+    """
+    The text heard after `played_seconds` of back-to-back playback. A segment
+    that was cut off keeps its words proportionally to the time it played.
+    """
+    heard = []
+    remaining = max(0.0, played_seconds)
+    for segment in segments:
+        if remaining <= 0:
+            break
+        if segment.duration is None or remaining >= segment.duration:
+            heard.append(segment.text.strip())
+            remaining -= segment.duration or 0.0
+            continue
+        words = segment.text.split()
+        heard.append(" ".join(words[:round(len(words) * remaining / segment.duration)]))
+        break
+    return " ".join(text for text in heard if text)
+
+
+class ClientInbox:
+    """
+    Receives client messages in the background, so a running answer can watch
+    for an interrupt. Messages that arrive meanwhile but are not handled right
+    away are kept, in order, for the conversation loop.
+    """
+
+    def __init__(self, receive: Callable[[], Awaitable[Any]]):
+        self._receive = receive
+        self._task: Optional[asyncio.Task] = None
+        self._held: Deque[Any] = deque()
+
+    def incoming(self) -> asyncio.Task:
+        """Task resolving to the next message from the client."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._receive())
+        return self._task
+
+    def take(self) -> Any:
+        """Result of the finished `incoming()` task; re-raises a disconnect."""
+        task, self._task = self._task, None
+        return task.result()
+
+    def hold(self, message: Any) -> None:
+        self._held.append(message)
+
+    async def receive(self) -> Any:
+        if self._held:
+            return self._held.popleft()
+        await asyncio.wait({self.incoming()})
+        return self.take()
+
+    def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
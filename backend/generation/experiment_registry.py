@@ -0,0 +1,240 @@
+"""
+Experiment registry: which article, dialogue mode and propaganda analysis an
+experiment subpage uses, read from a declarative file instead of code.
+
+EXPERIMENT_REGISTRY_PATH (default backend/experiments.json) maps routes (the end
+of the client's origin_url) to conditions:
+
+    {
+      "articles": "../frontend/app/utils/articles.js",
+      "prompts": {"critical": "prompts/critical_v2.txt"},
+      "conditions": {
+        "/dialogue/positive1": {"article": "article1", "mode": "critical", "analysis": "model_output/article1.json"}
+      }
+    }
+
+Paths are relative to the registry file. "article" names an article in the
+articles file (a condition may give "article_file" with the text instead);
+"prompts" optionally replaces the system prompt template of a mode
+(placeholders {article} and {propaganda_info}), the others stay those of
+backend/prompts/system_prompts.py.
+
+Loading precomputes one immutable bundle per condition: the article text, the
+analysis and its compacted form for the prompt, the rendered system prompt and
+the matching pre-generated opening turns. Sessions look up their bundle once
+and use it for the whole bootstrap. Every worker checks the registry file and
+all files it references every EXPERIMENT_REGISTRY_POLL seconds and reloads
+when one changed; the new bundles replace the old ones in one assignment, so a
+session sees either the old or the new set. A registry that fails to load
+(invalid JSON, missing article or analysis, broken template) is logged and the
+previous bundles stay in use.
+"""
+import asyncio
+import json
+import logging
+import os
+import pathlib
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.generation.opening_cache import ARTICLES_JS, BACKEND_DIR, OpeningTurn, load_articles, opening_cache
+from backend.prompts.system_prompts import dialogue_prompts, format_propaganda_info
+
+logger = logging.getLogger(__name__)
+
+EXPERIMENT_REGISTRY_PATH = pathlib.Path(os.environ.get("EXPERIMENT_REGISTRY_PATH", str(BACKEND_DIR / "experiments.json")))
+# Seconds between checks for changed registry files, 0 disables reloading
+EXPERIMENT_REGISTRY_POLL = float(os.environ.get("EXPERIMENT_REGISTRY_POLL", "5"))
+
+
+class RegistryError(Exception):
+    """The registry file or one of the files it references is invalid."""
+
+
+@dataclass(frozen=True)
+class Condition:
+    """Everything a session on one experiment route needs, computed once per load; callers must not modify it."""
+    route: str
+    article: str
+    mode: str
+    analysis_file: str
+    article_text: str
+    analysis: Dict[str, Any]
+    propaganda_info: Dict[str, Any]
+    system_prompt: str
+    opening: Optional[dict]
+
+    def prompt_for(self, registry: "ExperimentRegistry", mode: str, article_text: str) -> str:
+        """The precomputed system prompt, rendered anew if the client sent another mode or article text."""
+        if mode == self.mode and article_text == self.article_text:
+            return self.system_prompt
+        logger.info(f"Session on {self.route} differs from the registered condition, rendering its prompt")
+        return registry.render(mode, article_text, self.propaganda_info)
+
+    def pick_opening(self, mode: str, system_prompt: str) -> Optional[OpeningTurn]:
+        if system_prompt is self.system_prompt:
+            return opening_cache.serve(self.opening) if self.opening is not None else None
+        return opening_cache.pick(self.article, mode, system_prompt)
+
+
+class ExperimentRegistry:
+    """The conditions of the current registry file, reloaded when it or its sources change."""
+
+    def __init__(self, path: pathlib.Path = EXPERIMENT_REGISTRY_PATH, poll_interval: float = EXPERIMENT_REGISTRY_POLL):
+        self.path = pathlib.Path(path)
+        self.poll_interval = poll_interval
+        self._conditions: Dict[str, Condition] = {}
+        self._prompts: Dict[str, str] = dict(dialogue_prompts)
+        self._sources: List[pathlib.Path] = [self.path]
+        self._fingerprint: Optional[Tuple] = None
+        self._lock = threading.Lock()
+
+    @property
+    def conditions(self) -> Dict[str, Condition]:
+        return self._conditions
+
+    def match(self, origin_url: Optional[str]) -> Optional[Condition]:
+        """The condition of a known experiment route, None for other origins."""
+        if origin_url:
+            for route, condition in self._conditions.items():
+                if origin_url.endswith(route):
+                    return condition
+        return None
+
+    def render(self, mode: str, article: str, propaganda_info: Any = "") -> str:
+        """The system prompt of a dialogue mode (critical if unknown) with the registry's templates."""
+        prompts = self._prompts
+        return prompts.get(mode, prompts["critical"]).format(article=article, propaganda_info=propaganda_info)
+
+    def load(self) -> bool:
+        """Build the bundles of all conditions and swap them in; keeps the current ones if the registry is invalid."""
+        with self._lock:
+            start = time.perf_counter()
+            sources: List[pathlib.Path] = [self.path]
+            try:
+                conditions, prompts = self._build(sources)
+            except RegistryError as e:
+                logger.error(f"Invalid experiment registry {self.path}, keeping the {len(self._conditions)} loaded conditions: {e}")
+                return False
+            finally:
+                # Watch everything this attempt read, so fixing a broken source triggers the next load
+                self._sources = sources
+                self._fingerprint = self.fingerprint()
+            # One assignment each: a session sees the old or the new conditions, never a mix
+            self._prompts = prompts
+            self._conditions = conditions
+            openings = sum(1 for c in conditions.values() if c.opening is not None)
+            logger.info(f"Loaded experiment registry {self.path}: {len(conditions)} conditions, "
+                        f"{openings} with pre-generated openings, in {time.perf_counter() - start:.3f}s")
+            return True
+
+    def _build(self, sources: List[pathlib.Path]) -> Tuple[Dict[str, Condition], Dict[str, str]]:
+        spec = self._read_json(self.path)
+        base = self.path.parent
+        if not isinstance(spec.get("conditions"), dict) or not spec["conditions"]:
+            raise RegistryError("no conditions")
+        if not isinstance(spec.get("prompts", {}), dict):
+            raise RegistryError("prompts must map modes to template files")
+
+        prompts = dict(dialogue_prompts)
+        for mode, template_file in spec.get("prompts", {}).items():
+            template_path = base / template_file
+            sources.append(template_path)
+            try:
+                prompts[mode] = template_path.read_text(encoding="utf-8")
+                prompts[mode].format(article="", propaganda_info="")
+            except (OSError, KeyError, IndexError, ValueError) as e:
+                raise RegistryError(f"prompt template {template_path}: {e!r}")
+
+        articles_path = base / spec["articles"] if "articles" in spec else ARTICLES_JS
+        articles: Optional[Dict[str, str]] = None
+        analyses: Dict[pathlib.Path, Dict[str, Any]] = {}
+        opening_cache.load()
+
+        conditions = {}
+        for route, entry in spec["conditions"].items():
+            try:
+                mode, analysis_file = entry["mode"], entry["analysis"]
+            except (TypeError, KeyError) as e:
+                raise RegistryError(f"condition {route} lacks {e}")
+            if mode not in prompts:
+                raise RegistryError(f"condition {route}: unknown mode {mode}")
+            if "article_file" in entry:
+                article_path = base / entry["article_file"]
+                sources.append(article_path)
+                article = entry.get("article", article_path.stem)
+                try:
+                    article_text = article_path.read_text(encoding="utf-8")
+                except OSError as e:
+                    raise RegistryError(f"condition {route}: {e}")
+            else:
+                if articles is None:
+                    sources.append(articles_path)
+                    try:
+                        articles = load_articles(articles_path)
+                    except OSError as e:
+                        raise RegistryError(f"articles: {e}")
+                article = entry.get("article")
+                if article not in articles:
+                    raise RegistryError(f"condition {route}: article {article} not in {articles_path}")
+                article_text = articles[article]
+
+            analysis_path = base / analysis_file
+            if analysis_path not in analyses:
+                sources.append(analysis_path)
+                analyses[analysis_path] = self._read_json(analysis_path)
+            analysis = analyses[analysis_path]
+            propaganda_info = format_propaganda_info(analysis)
+            system_prompt = prompts[mode].format(article=article_text, propaganda_info=propaganda_info)
+            conditions[route] = Condition(
+                route=route,
+                article=article,
+                mode=mode,
+                analysis_file=analysis_file,
+                article_text=article_text,
+                analysis=analysis,
+                propaganda_info=propaganda_info,
+                system_prompt=system_prompt,
+                opening=opening_cache.match(article, mode, system_prompt)
+            )
+        return conditions, prompts
+
+    @staticmethod
+    def _read_json(path: pathlib.Path) -> Dict[str, Any]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+        except (OSError, ValueError) as e:
+            raise RegistryError(f"{path}: {e}")
+        if not isinstance(value, dict):
+            raise RegistryError(f"{path}: expected a JSON object")
+        return value
+
+    def fingerprint(self) -> Tuple:
+        """Modification times of the registry, its sources and the opening turn manifests."""
+        stamps = []
+        for path in self._sources + opening_cache.manifest_paths():
+            try:
+                stat = path.stat()
+                stamps.append((str(path), stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                stamps.append((str(path), None, None))
+        return tuple(stamps)
+
+    async def watch(self) -> None:
+        """Reload whenever a source changed, until cancelled."""
+        if self.poll_interval <= 0:
+            return
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                if await asyncio.to_thread(self.fingerprint) != self._fingerprint:
+                    logger.info(f"Experiment registry sources changed, reloading {self.path}")
+                    await asyncio.to_thread(self.load)
+            except Exception as e:
+                logger.error(f"Experiment registry check failed: {e}")
+
+
+experiment_registry = ExperimentRegistry()
@@ -0,0 +1,247 @@
+"""
+Pre-generated opening turns for the fixed experiment articles.
+
+Sessions on a known experiment subpage always start with the same system prompt
+(per article and dialogue mode) followed by "Please start the conversation.", so
+the first assistant turn does not need a live gpt-4o-audio-preview call. At
+deploy time
+
+    python -m backend.generation.opening_cache --variants 5
+
+generates several variants of that turn for every (article, mode) of the
+experiment registry (backend/generation/experiment_registry.py) and stores
+their transcripts and WAV audio under OPENING_CACHE_DIR. At runtime
+OpeningCache.pick() serves one of them at random. Every entry records a hash of
+the system prompt it was generated for, so an edited article, propaganda result
+or prompt falls back to live generation instead of serving a stale opening.
+
+Layout: <OPENING_CACHE_DIR>/<article>_<mode>/manifest.json and
+variant_<n>_<audio hash>.wav. A new run writes new audio files next to the
+served ones and replaces the manifest last, so a running worker never pairs new
+audio with an old transcript; files of the generation before the previous one
+are removed.
+"""
+import argparse
+import base64
+import hashlib
+import io
+import json
+import logging
+import os
+import pathlib
+import random
+import re
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from backend.prompts.system_prompts import INITIAL_USER_MESSAGE
+from backend.providers.base import VOICE, ModelProvider
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = pathlib.Path(__file__).resolve().parents[1]
+CACHE_DIR = pathlib.Path(os.environ.get("OPENING_CACHE_DIR", str(BACKEND_DIR / "model_output" / "opening_turns")))
+ARTICLES_JS = BACKEND_DIR.parent / "frontend" / "app" / "utils" / "articles.js"
+
+
+def prompt_hash(system_prompt: str) -> str:
+    return hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class OpeningTurn:
+    transcript: str
+    audio: str  # base64 encoded WAV
+    audio_duration: Optional[float]
+    variant: int
+
+
+class OpeningCache:
+    """
+    Index of the pre-generated opening turns. Only the manifests are kept in
+    memory; the audio of the chosen variant is read from disk when it is served.
+    """
+
+    def __init__(self, directory: pathlib.Path = CACHE_DIR):
+        self.directory = pathlib.Path(directory)
+        self._manifests: Dict[Tuple[str, str], dict] = {}
+
+    def load(self) -> int:
+        """Read all manifests and return the number of usable variants."""
+        if not self.directory.is_dir():
+            logger.info(f"No opening turn cache at {self.directory}, opening turns are generated live")
+            self._manifests = {}
+            return 0
+        manifests = {}
+        for manifest_path in sorted(self.directory.glob("*/manifest.json")):
+            try:
+                with open(manifest_path, "r", encoding="utf-8") as f:
+                    manifest = json.load(f)
+                key = (manifest["article"], manifest["mode"])
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"Skipping invalid opening turn manifest {manifest_path}: {e}")
+                continue
+            manifest["variants"] = [
+                v for v in manifest.get("variants", []) if (manifest_path.parent / v["file"]).is_file()
+            ]
+            if manifest["variants"]:
+                manifest["path"] = manifest_path.parent
+                manifests[key] = manifest
+        # Replaced as a whole, sessions picking meanwhile see the old or the new index
+        self._manifests = manifests
+        count = sum(len(m["variants"]) for m in manifests.values())
+        logger.info(f"Loaded {count} pre-generated opening turns for {len(manifests)} article/mode pairs")
+        return count
+
+    def manifest_paths(self) -> List[pathlib.Path]:
+        return sorted(self.directory.glob("*/manifest.json")) if self.directory.is_dir() else []
+
+    def match(self, article: str, mode: str, system_prompt: str) -> Optional[dict]:
+        """The manifest of this article and mode if it was generated for this system prompt."""
+        manifest = self._manifests.get((article, mode))
+        if manifest is None:
+            return None
+        if manifest["prompt_sha256"] != prompt_hash(system_prompt):
+            logger.warning(f"Opening turn cache for {article}/{mode} was generated for a different system prompt, generating live")
+            return None
+        return manifest
+
+    def pick(self, article: str, mode: str, system_prompt: str) -> Optional[OpeningTurn]:
+        """
+        Return a random pre-generated opening for this article and mode, or None
+        when there is none or it was generated for a different system prompt.
+        """
+        manifest = self.match(article, mode, system_prompt)
+        return self.serve(manifest) if manifest is not None else None
+
+    @staticmethod
+    def serve(manifest: dict) -> Optional[OpeningTurn]:
+        """A random variant of a manifest returned by `match`, with its audio read from disk."""
+        index = random.randrange(len(manifest["variants"]))
+        variant = manifest["variants"][index]
+        try:
+            audio_bytes = (manifest["path"] / variant["file"]).read_bytes()
+        except OSError as e:
+            logger.error(f"Failed to read cached opening turn {variant['file']}: {e}")
+            return None
+        return OpeningTurn(
+            transcript=variant["transcript"],
+            audio=base64.b64encode(audio_bytes).decode("utf-8"),
+            audio_duration=variant.get("audio_duration"),
+            variant=index
+        )
+
+
+opening_cache = OpeningCache()
+
+
+def load_articles(path: pathlib.Path = ARTICLES_JS) -> Dict[str, str]:
+    """Read the experiment articles (template literals) from the frontend's articles.js."""
+    source = path.read_text(encoding="utf-8")
+    return {
+        key: text.replace("\\`", "`").replace("\\\\", "\\")
+        for key, text in re.findall(r"^\s*(\w+):\s*`((?:[^`\\]|\\.)*)`", source, re.MULTILINE | re.DOTALL)
+    }
+
+
+def generate_variant(provider: ModelProvider, system_prompt: str) -> dict:
+    """One live opening turn, generated exactly like the first turn of a session."""
+    from pydub import AudioSegment
+
+    start = time.time()
+    audio = provider.chat_audio([
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": [{"type": "text", "text": INITIAL_USER_MESSAGE}]}
+    ])
+    audio_bytes = base64.b64decode(audio.audio)
+    with io.BytesIO(audio_bytes) as audio_file:
+        audio_duration = len(AudioSegment.from_file(audio_file, format="wav")) / 1000.0
+    return {
+        "transcript": audio.transcript,
+        "audio_bytes": audio_bytes,
+        "audio_duration": audio_duration,
+        "generation_time": time.time() - start
+    }
+
+
+def manifest_files(manifest_path: pathlib.Path) -> List[str]:
+    """Audio files referenced by a manifest, none if it is missing or invalid."""
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return [v["file"] for v in json.load(f).get("variants", [])]
+    except (OSError, ValueError, KeyError, TypeError):
+        return []
+
+
+def pregenerate(provider: ModelProvider, article: str, mode: str, system_prompt: str, variants: int, output: pathlib.Path) -> None:
+    target = output / f"{article}_{mode}"
+    target.mkdir(parents=True, exist_ok=True)
+    # Workers may still serve the current manifest until they reload, keep its files
+    served = set(manifest_files(target / "manifest.json"))
+
+    entries = []
+    for n in range(variants):
+        generated = generate_variant(provider, system_prompt)
+        audio_bytes = generated.pop("audio_bytes")
+        # New names, so files referenced by the current manifest are never overwritten
+        filename = f"variant_{n}_{hashlib.sha256(audio_bytes).hexdigest()[:16]}.wav"
+        tmp_path = target / f"{filename}.tmp"
+        tmp_path.write_bytes(audio_bytes)
+        os.replace(tmp_path, target / filename)
+        entries.append({"file": filename, **generated})
+        logger.info(f"{article}/{mode} variant {n}: {generated['audio_duration']:.1f}s audio, "
+                    f"generated in {generated['generation_time']:.1f}s")
+
+    manifest = {
+        "article": article,
+        "mode": mode,
+        "prompt_sha256": prompt_hash(system_prompt),
+        "model": provider.models["chat_audio"],
+        "voice": VOICE,
+        "created": int(time.time()),
+        "variants": entries
+    }
+    # Replace the manifest atomically so a running server never reads a partial file
+    tmp_path = target / "manifest.json.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, target / "manifest.json")
+
+    keep = served | {entry["file"] for entry in entries}
+    for old in target.glob("variant_*.wav"):
+        if old.name not in keep:
+            old.unlink(missing_ok=True)
+
+
+def main() -> None:
+    from backend.generation.experiment_registry import EXPERIMENT_REGISTRY_PATH, ExperimentRegistry
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variants", type=int, default=5, help="Openings generated per article and mode")
+    parser.add_argument("--registry", type=pathlib.Path, default=EXPERIMENT_REGISTRY_PATH, help="Experiment registry file")
+    parser.add_argument("--modes", nargs="+", default=None, help="Only conditions with these dialogue modes")
+    parser.add_argument("--output", type=pathlib.Path, default=CACHE_DIR)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    registry = ExperimentRegistry(args.registry)
+    if not registry.load():
+        parser.error(f"Invalid experiment registry {args.registry}")
+    # Routes sharing an article and mode share their openings
+    prompts = {
+        (c.article, c.mode): c.system_prompt for c in registry.conditions.values()
+        if args.modes is None or c.mode in args.modes
+    }
+    if not prompts:
+        parser.error(f"No conditions in {args.registry} for modes {args.modes}")
+
+    from backend.providers.registry import get_provider
+    provider = get_provider()
+    for (article, mode), system_prompt in prompts.items():
+        pregenerate(provider, article, mode, system_prompt, args.variants, args.output)
+    logger.info(f"Opening turns written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Outbound side of a conversation websocket: one writer per connection.
+
+A streamed answer produces many small {"text": chunk} deltas. Sending each as
+its own frame costs a JSON encoding, a send and a re-render in the browser,
+so the ClientOutbox coalesces them:
+
+- the first text delta of an answer is sent at once, and so is every delta
+  that arrives more than OUTBOUND_COALESCE_MS after the previous text frame;
+  slow (paced) answers are never delayed
+- deltas arriving faster are appended to the text frame that is still waiting
+  and go out together, at most one text frame per OUTBOUND_COALESCE_MS, or as
+  soon as the waiting frame holds OUTBOUND_COALESCE_BYTES
+- any other event (audio deltas, the final answer, transcripts, errors) first
+  flushes the waiting text, so the order of events never changes
+
+With GENERATION_MODE=audio the text chunks are paced 100 ms apart, more than
+the default window, so nothing is merged there; coalescing pays off for the
+streamed text of GENERATION_MODE=pipelined and for slow readers.
+
+Callers of `send` wait until a non-text event was sent, as with a direct
+websocket send. Text deltas are only queued; when a slow client lets more than
+OUTBOUND_MAX_BUFFERED_BYTES of text pile up, `send` waits, so a stalled
+reader holds back the answer instead of growing the queue. While the client
+reads slowly, more deltas merge into each frame.
+
+Frames are compressed with permessage-deflate when the client offers it
+(uvicorn's default, --ws-per-message-deflate), which larger coalesced frames
+benefit from.
+"""
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from backend.observability.telemetry import observe, record_frames
+
+OUTBOUND_COALESCE_MS = float(os.environ.get("OUTBOUND_COALESCE_MS", "40"))
+OUTBOUND_COALESCE_BYTES = int(os.environ.get("OUTBOUND_COALESCE_BYTES", "1024"))
+OUTBOUND_MAX_BUFFERED_BYTES = int(os.environ.get("OUTBOUND_MAX_BUFFERED_BYTES", "65536"))
+
+
+class _Frame:
+    __slots__ = ("payload", "parts", "size", "due", "sent")
+
+    def __init__(self, payload: Optional[Dict[str, Any]], parts: Optional[List[str]], due: float,
+                 sent: Optional[asyncio.Future] = None):
+        # Either an event or the text parts of coalesced deltas
+        self.payload = payload
+        self.parts = parts
+        self.size = sum(len(part.encode("utf-8")) for part in parts) if parts else 0
+        self.due = due
+        self.sent = sent
+
+    def encode(self) -> str:
+        if self.parts is None:
+            return json.dumps(self.payload)
+        return json.dumps({"type": "assistant_delta", "payload": {"text": "".join(self.parts)}})
+
+
+def text_delta(payload: Dict[str, Any]) -> Optional[str]:
+    """The text of an assistant_delta that carries nothing else, else None."""
+    if payload.get("type") != "assistant_delta":
+        return None
+    delta = payload.get("payload")
+    if isinstance(delta, dict) and len(delta) == 1 and isinstance(delta.get("text"), str):
+        return delta["text"]
+    return None
+
+
+class ClientOutbox:
+    """
+    Sends the events of one connection in order from a background task,
+    coalescing text deltas.
+
+    Args:
+        send: Sends one text frame, e.g. WebSocket.send_text
+    """
+
+    def __init__(self, send: Callable[[str], Awaitable[None]], window_ms: float = OUTBOUND_COALESCE_MS,
+                 max_frame_bytes: int = OUTBOUND_COALESCE_BYTES, max_buffered_bytes: int = OUTBOUND_MAX_BUFFERED_BYTES):
+        self._send = send
+        self.window = window_ms / 1000.0
+        self.max_frame_bytes = max_frame_bytes
+        self.max_buffered_bytes = max_buffered_bytes
+        self._frames: Deque[_Frame] = deque()
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Event()
+        self._space.set()
+        self._task: Optional[asyncio.Task] = None
+        self._error: Optional[BaseException] = None
+        self._buffered = 0
+        self._in_answer = False
+        self._last_text = float("-inf")
+
+    async def send(self, payload: Dict[str, Any]) -> None:
+        """Queue an event; returns once it was sent, or right away for a text delta."""
+        if self._error is not None:
+            raise self._error
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        loop = asyncio.get_running_loop()
+        text = text_delta(payload)
+        if text is not None:
+            self._queue_text(text, loop.time())
+            # A slow reader holds back the answer instead of growing the queue
+            while self._buffered > self.max_buffered_bytes and self._error is None:
+                self._space.clear()
+                await self._space.wait()
+            if self._error is not None:
+                raise self._error
+            return
+
+        self._in_answer = payload.get("type") == "assistant_delta"
+        for frame in self._frames:
+            frame.due = 0.0
+        frame = _Frame(payload, None, 0.0, loop.create_future())
+        self._frames.append(frame)
+        self._wakeup.set()
+        await frame.sent
+
+    def _queue_text(self, text: str, now: float) -> None:
+        tail = self._frames[-1] if self._frames else None
+        if self._in_answer and tail is not None and tail.parts is not None:
+            size = len(text.encode("utf-8"))
+            tail.parts.append(text)
+            tail.size += size
+            self._buffered += size
+            if tail.size >= self.max_frame_bytes:
+                tail.due = 0.0
+                self._wakeup.set()
+            return
+        # The first delta of an answer is never held back
+        due = self._last_text + self.window if self._in_answer else 0.0
+        frame = _Frame(None, [text], due if due > now else 0.0)
+        self._frames.append(frame)
+        self._buffered += frame.size
+        self._in_answer = True
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        frame = None
+        try:
+            while True:
+                if not self._frames:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                frame = self._frames[0]
+                delay = frame.due - loop.time()
+                if delay > 0:
+                    # Until the frame is due, or flushed by a later event
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                self._frames.popleft()
+                if frame.sent is not None and frame.sent.cancelled():
+                    # The caller gave up (e.g. its stage timed out): like an aborted send
+                    continue
+                data = frame.encode()
+                start = time.perf_counter()
+                await self._send(data)
+                observe("ws.send", time.perf_counter() - start)
+                if frame.parts is not None:
+                    self._last_text = loop.time()
+                    self._buffered -= frame.size
+                    self._space.set()
+                    record_frames(1, len(frame.parts) - 1)
+                else:
+                    record_frames(1)
+                if frame.sent is not None and not frame.sent.done():
+                    frame.sent.set_result(None)
+                frame = None
+        except Exception as e:
+            # The connection is gone: fail the waiting senders and every later send
+            self._error = e
+            for waiting in ([frame] if frame is not None else []) + list(self._frames):
+                if waiting.sent is not None and not waiting.sent.done():
+                    waiting.sent.set_exception(e)
+            self._frames.clear()
+            self._space.set()
+
+    def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for frame in self._frames:
+            if frame.sent is not None and not frame.sent.done():
+                frame.sent.cancel()
+        self._frames.clear()
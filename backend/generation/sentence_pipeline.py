@@ -0,0 +1,135 @@
+"""
+Sentence-pipelined speech generation.
+
+Instead of one call that returns the whole answer as text and audio, the text
+is streamed token by token, cut at sentence boundaries and every finished
+sentence is sent to text-to-speech while the model is still writing the next
+one. Synthesis runs with bounded parallelism and the audio segments are
+delivered strictly in order, so the time to first audio is roughly the time
+for the first sentence instead of the whole answer.
+"""
+import asyncio
+import base64
+import io
+import logging
+import os
+import re
+import wave
+from collections import deque
+from typing import AsyncGenerator, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Sentences shorter than this are merged with the next one (avoids tiny TTS calls)
+MIN_SENTENCE_CHARS = int(os.environ.get("PIPELINE_MIN_SENTENCE_CHARS", "40"))
+# Concurrent TTS calls per answer
+TTS_MAX_PARALLEL = int(os.environ.get("PIPELINE_TTS_MAX_PARALLEL", "3"))
+
+_BOUNDARY = re.compile(r"[.!?]+[\"')\]]*\s+|\n\s*\n")
+_ABBREVIATION = re.compile(r"\b(?:e\.g|i\.e|etc|vs|Dr|Mr|Mrs|Ms|St|No)\.$", re.IGNORECASE)
+
+
+class SentenceSplitter:
+    """Accumulates streamed text and returns complete sentences as soon as they end."""
+
+    def __init__(self, min_chars: int = MIN_SENTENCE_CHARS):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        self._buffer += text
+        sentences = []
+        start = 0
+        for match in _BOUNDARY.finditer(self._buffer):
+            if _ABBREVIATION.search(self._buffer, 0, match.start() + 1):
+                continue
+            if match.end() - start >= self.min_chars:
+                sentences.append(self._buffer[start:match.end()].strip())
+                start = match.end()
+        self._buffer = self._buffer[start:]
+        return [s for s in sentences if s]
+
+    def flush(self) -> Optional[str]:
+        """The text after the last boundary, once the stream has ended."""
+        rest, self._buffer = self._buffer.strip(), ""
+        return rest or None
+
+
+def wav_duration(wav_bytes: bytes) -> Optional[float]:
+    """Duration of a PCM WAV. Streamed WAVs carry placeholder sizes, so the byte count is used."""
+    try:
+        with wave.open(io.BytesIO(wav_bytes), "rb") as wav_file:
+            bytes_per_second = wav_file.getframerate() * wav_file.getnchannels() * wav_file.getsampwidth()
+    except (EOFError, wave.Error):
+        return None
+    return max(0, len(wav_bytes) - 44) / bytes_per_second
+
+
+async def pipelined_speech(
+    tokens: AsyncIterator[str],
+    synthesize: Callable[[str], Awaitable[bytes]],
+    max_parallel: int = TTS_MAX_PARALLEL
+) -> AsyncGenerator[Dict, None]:
+    """
+    Interleave streamed text with synthesized audio.
+
+    Args:
+        tokens: Text deltas from the model
+        synthesize: Coroutine function returning WAV bytes for a sentence
+
+    Yields:
+        {"text": delta} for every text delta, and
+        {"audio": base64 WAV, "audio_id": None, "segment": n, "transcript": sentence,
+        "duration": seconds} for every sentence, in sentence order
+    """
+    splitter = SentenceSplitter()
+    semaphore = asyncio.Semaphore(max_parallel)
+    pending: Deque[Tuple[str, asyncio.Task]] = deque()
+
+    async def speak(sentence: str) -> bytes:
+        async with semaphore:
+            return await synthesize(sentence)
+
+    def start(sentences: List[str]) -> None:
+        for sentence in sentences:
+            pending.append((sentence, asyncio.create_task(speak(sentence))))
+
+    iterator = tokens.__aiter__()
+    next_token: Optional[asyncio.Future] = asyncio.ensure_future(iterator.__anext__())
+    segment = 0
+    try:
+        while next_token is not None or pending:
+            waiting = {next_token} if next_token is not None else set()
+            if pending:
+                waiting.add(pending[0][1])
+            await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+
+            # Deliver finished segments, but never overtake an earlier sentence
+            while pending and pending[0][1].done():
+                sentence, task = pending.popleft()
+                wav_bytes = task.result()
+                yield {
+                    "audio": base64.b64encode(wav_bytes).decode("utf-8"),
+                    "audio_id": None,
+                    "segment": segment,
+                    "transcript": sentence,
+                    "duration": wav_duration(wav_bytes)
+                }
+                segment += 1
+
+            if next_token is not None and next_token.done():
+                try:
+                    text = next_token.result()
+                except StopAsyncIteration:
+                    next_token = None
+                    rest = splitter.flush()
+                    start([rest] if rest else [])
+                    continue
+                yield {"text": text}
+                start(splitter.feed(text))
+                next_token = asyncio.ensure_future(iterator.__anext__())
+    finally:
+        if next_token is not None:
+            next_token.cancel()
+        for _, task in pending:
+            task.cancel()
@@ -0,0 +1,186 @@
+"""
+A conversation turn as a pipeline of stages:
+
+    ingest -> transcribe -> classify -> generate -> persist -> emit
+
+- ingest: validate the client message, preprocess or convert its audio and start the transcription
+- transcribe: wait for the participant's transcript
+- classify: decide whether the conversation stalled or exceeded its budget
+- generate: relay the assistant's answer to the client, watching for barge-in
+- persist: store the messages in DynamoDB (in the background, off the event loop)
+- emit: send the transcript and final answer events
+
+The opening turn enters at generate. Stages that do not depend on each other
+overlap: the user message is stored and its transcript sent while the
+conversation is classified, and the answer is stored while its final event is
+sent. Every stage is timed (turn.<stage> unless the caller names the metric)
+and bounded by TURN_TIMEOUT_<STAGE> seconds, 0 disables a timeout. A stage
+that times out raises StageTimeout and is counted in
+apollolytics_stage_timeouts_total.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Deque, Dict, List, Optional, Set, Tuple, TypeVar
+
+from backend.generation.barge_in import ClientInbox
+from backend.observability.telemetry import record_stage_timeout, stage
+from backend.scheduling.session_memory import MB, SESSION_MEMORY_LIMIT_MB, content_bytes
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+STAGES = ("ingest", "transcribe", "classify", "generate", "persist", "emit")
+DEFAULT_TIMEOUTS = {"ingest": 30.0, "transcribe": 30.0, "classify": 15.0, "generate": 120.0, "persist": 10.0, "emit": 10.0}
+STAGE_TIMEOUTS: Dict[str, float] = {
+    name: float(os.environ.get(f"TURN_TIMEOUT_{name.upper()}", str(DEFAULT_TIMEOUTS[name]))) for name in STAGES
+}
+
+
+class StageTimeout(Exception):
+    def __init__(self, stage_name: str, timeout: float):
+        super().__init__(f"Stage {stage_name} timed out after {timeout:.1f}s")
+        self.stage = stage_name
+        self.timeout = timeout
+
+
+async def run_stage(name: str, awaitable: Awaitable[T], metric: Optional[str] = None, **attributes) -> T:
+    """
+    Run one pipeline stage with its timeout, as a span and histogram observation.
+
+    Args:
+        name: Pipeline stage, one of STAGES
+        awaitable: The stage's work; cancelled when the timeout expires
+        metric: Stage name in the traces and metrics, default turn.<name>
+        **attributes: Span attributes such as session_id
+    """
+    timeout = STAGE_TIMEOUTS[name] or None
+    with stage(metric or f"turn.{name}", **attributes):
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            record_stage_timeout(name)
+            raise StageTimeout(name, timeout) from None
+
+
+class Session:
+    """
+    State of one conversation, shared by the stages of all its turns. Its
+    memory is accounted as messages are added (see backend/scheduling/session_memory.py).
+    """
+    __slots__ = (
+        "id", "inbox", "messages", "text_history", "uplink", "last_answer", "last_response_time",
+        "last_model_generation_time", "last_model_audio_duration", "last_total_response_time", "_background",
+        "task", "busy", "started", "last_activity", "end_reason", "context_bytes", "_audio_turns",
+    )
+
+    def __init__(self, session_id: str, inbox: ClientInbox):
+        self.id = session_id
+        self.inbox = inbox
+        # Model context (including audio) and the text-only history used for classification
+        self.messages: List[Dict[str, Any]] = []
+        self.text_history: List[Dict[str, str]] = []
+        self.uplink = None
+        self.last_answer: Optional[Dict[str, Any]] = None
+        self.last_response_time: Optional[float] = None
+        self.last_model_generation_time: Optional[float] = None
+        self.last_model_audio_duration: Optional[float] = None
+        self.last_total_response_time: Optional[float] = None
+        self._background: Set[asyncio.Task] = set()
+        # Handler task, cancelled by `expire`; busy while a turn runs
+        self.task: Optional[asyncio.Task] = None
+        self.busy = False
+        self.started = self.last_activity = time.monotonic()
+        self.end_reason: Optional[str] = None
+        self.context_bytes = 0
+        # User messages with audio and their transcripts, oldest first
+        self._audio_turns: Deque[Tuple[Dict[str, Any], Optional[str]]] = deque()
+
+    def add_message(self, role: str, content: Any, text: Optional[str] = None) -> None:
+        """Append a message to the model context and, if it has text, to the text history."""
+        message = {"role": role, "content": content}
+        self.messages.append(message)
+        self.context_bytes += content_bytes(content)
+        if text:
+            self.text_history.append({"role": role, "content": text})
+            self.context_bytes += len(text)
+        if role == "user" and isinstance(content, list) and any(item.get("type") == "input_audio" for item in content):
+            self._audio_turns.append((message, text))
+            self._bound_memory()
+
+    def add_text(self, role: str, text: str) -> None:
+        """Append a message to the text history only; assistant turns are not sent back to the model."""
+        self.text_history.append({"role": role, "content": text})
+        self.context_bytes += len(text)
+
+    def _bound_memory(self) -> None:
+        """Replace the audio of the oldest user turns by their transcripts while over SESSION_MEMORY_LIMIT_MB."""
+        limit = SESSION_MEMORY_LIMIT_MB * MB
+        # The latest recording is always kept
+        while limit and self.context_bytes > limit and len(self._audio_turns) > 1:
+            message, text = self._audio_turns.popleft()
+            self.context_bytes -= content_bytes(message["content"])
+            message["content"] = [{"type": "text", "text": text or "(inaudible)"}]
+            self.context_bytes += content_bytes(message["content"])
+            logger.info(f"Session {self.id} above {SESSION_MEMORY_LIMIT_MB:.0f} MB, replaced the audio of an earlier turn by its transcript")
+
+    def memory(self) -> int:
+        """Approximate bytes held by the session."""
+        return self.context_bytes + (self.uplink.buffered_bytes if self.uplink is not None else 0)
+
+    def touch(self) -> None:
+        """The client sent something: the session is not idle."""
+        self.last_activity = time.monotonic()
+
+    def expire(self, reason: str) -> None:
+        """End the session from outside its handler (e.g. the idle reaper): its task is cancelled."""
+        self.end_reason = reason
+        if self.task is not None:
+            self.task.cancel()
+
+    def timing(self) -> Dict[str, Optional[float]]:
+        """Timing of the last answer, as stored with the assistant message."""
+        return {
+            "model_generation_time": self.last_model_generation_time,
+            "model_audio_duration": self.last_model_audio_duration,
+            "total_response_time": self.last_total_response_time,
+        }
+
+    def spawn(self, awaitable: Awaitable[Any]) -> asyncio.Task:
+        """Run a stage in the background; `settle` waits for it."""
+        task = asyncio.ensure_future(awaitable)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    async def settle(self) -> None:
+        """Wait for the background stages (e.g. DB writes) of all turns."""
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+
+
+class UserTurn:
+    """A participant message on its way through the pipeline."""
+    __slots__ = ("message_id", "content", "timing", "audio_stats", "transcript", "transcription")
+
+    def __init__(self, message_id: str, content: Any, timing: Dict[str, float], audio_stats: Dict[str, float]):
+        self.message_id = message_id
+        # Kept in the model context as is (audio converted for the chat model)
+        self.content = content
+        self.timing = timing
+        self.audio_stats = audio_stats
+        self.transcript: Optional[str] = None
+        self.transcription: Optional[asyncio.Task] = None
+
+    def text(self) -> Optional[str]:
+        """The transcript, or the text part of a message without audio."""
+        if self.transcript:
+            return self.transcript
+        if isinstance(self.content, list):
+            for item in self.content:
+                if item.get("type") == "text":
+                    return item.get("text")
+        return None
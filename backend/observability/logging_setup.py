@@ -0,0 +1,193 @@
+"""
+Non-blocking, structured logging for the dialogue backend.
+
+Log calls on the event loop only enqueue the record; a background
+QueueListener thread formats and writes it. File output is JSON (one object
+per line, keyed by session_id) with size-based rotation and gzip compression
+of rotated files. Large fields are truncated and audio payloads redacted.
+
+Configuration (environment variables):
+    LOG_LEVEL        root level (default INFO)
+    LOG_LEVELS       per-module levels, e.g. "backend.db_utils=WARNING,websockets=WARNING"
+    LOG_FILE         log file path, "{pid}" is replaced by the worker's pid (default logs/app.log)
+    LOG_MAX_BYTES    rotate after this many bytes (default 10 MB)
+    LOG_BACKUP_COUNT rotated files to keep (default 5)
+    LOG_MAX_FIELD_CHARS  truncate string fields beyond this length (default 2000)
+    LOG_CONSOLE_FORMAT   "text" (default) or "json"
+"""
+import atexit
+import contextvars
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import shutil
+from datetime import datetime, timezone
+from typing import Optional
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.environ.get("LOG_LEVELS", "websockets=WARNING,httpx=WARNING,botocore=WARNING,urllib3=WARNING")
+LOG_FILE = os.environ.get("LOG_FILE", "logs/app.log")
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.environ.get("LOG_BACKUP_COUNT", "5"))
+MAX_FIELD_CHARS = int(os.environ.get("LOG_MAX_FIELD_CHARS", "2000"))
+CONSOLE_FORMAT = os.environ.get("LOG_CONSOLE_FORMAT", "text")
+# Records are dropped (and counted) rather than blocking when the queue is full
+QUEUE_SIZE = 10000
+
+session_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("session_id", default=None)
+
+# Long base64 runs are audio or images, never useful in a log line
+_BASE64_RUN = re.compile(r"[A-Za-z0-9+/]{256,}={0,2}")
+_API_KEY = re.compile(r"sk-[A-Za-z0-9_\-]{16,}")
+# Attributes every LogRecord has; anything else was passed via `extra=`
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "session_id", "taskName"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue: Optional[queue.Queue] = None
+
+
+def bind_session(session_id: Optional[str]) -> None:
+    """Attach a session_id to every record logged from the current task (and threads it spawns)."""
+    session_id_var.set(session_id)
+
+
+def sanitize(value: str, limit: int = MAX_FIELD_CHARS) -> str:
+    """Redact audio payloads and API keys, then truncate to `limit` characters."""
+    value = _BASE64_RUN.sub(lambda m: f"<redacted {len(m.group(0))} chars>", value)
+    value = _API_KEY.sub("sk-<redacted>", value)
+    if len(value) > limit:
+        value = f"{value[:limit]}... <truncated {len(value) - limit} chars>"
+    return value
+
+
+class SessionContextFilter(logging.Filter):
+    """Copies the current session_id onto the record in the caller's context."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.session_id = session_id_var.get()
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks the caller; overflow is counted instead."""
+
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record with sanitized fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "session_id": getattr(record, "session_id", None),
+            "message": sanitize(record.getMessage()),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = sanitize(value) if isinstance(value, str) else value
+        if record.exc_info:
+            entry["exception"] = sanitize(self.formatException(record.exc_info), limit=MAX_FIELD_CHARS * 4)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """The classic console format, with the session prefix and sanitized message."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        record.message = sanitize(record.getMessage())
+        session = getattr(record, "session_id", None)
+        line = f"{self.formatTime(record)} - {record.levelname} - {record.name} - "
+        line += f"[{session[:8]}] {record.message}" if session else record.message
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class CompressingRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Size-based rotation that gzips the rotated files (app.log.1.gz, ...)."""
+
+    def __init__(self, filename: str, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.namer = lambda name: f"{name}.gz"
+        self.rotator = self._compress
+
+    @staticmethod
+    def _compress(source: str, dest: str) -> None:
+        with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(source)
+
+
+def _prepare(record: logging.LogRecord) -> logging.LogRecord:
+    # Only merge the arguments on the caller's thread (so later mutation of them cannot
+    # change the message); sanitizing and formatting happen on the writer thread.
+    record.msg = record.getMessage()
+    record.args = None
+    return record
+
+
+def _apply_module_levels(spec: str) -> None:
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = item.partition("=")
+        if level:
+            logging.getLogger(name.strip()).setLevel(level.strip().upper())
+
+
+def setup_logging() -> None:
+    """
+    Route all logging through a bounded queue to a background writer thread.
+    Idempotent: later calls only re-apply the module levels.
+    """
+    global _listener, _queue
+    _apply_module_levels(LOG_LEVELS)
+    if _listener is not None:
+        return
+
+    log_file = LOG_FILE.replace("{pid}", str(os.getpid()))
+    os.makedirs(os.path.dirname(log_file) or ".", exist_ok=True)
+    file_handler = CompressingRotatingFileHandler(
+        log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+    )
+    file_handler.setFormatter(JsonFormatter())
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(JsonFormatter() if CONSOLE_FORMAT == "json" else TextFormatter())
+
+    _queue = queue.Queue(QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(_queue)
+    queue_handler.prepare = _prepare
+    queue_handler.addFilter(SessionContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(_queue, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def queue_depth() -> int:
+    return _queue.qsize() if _queue is not None else 0
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,312 @@
+"""
+Latency tracing and Prometheus metrics for the dialogue backend.
+
+Every stage of a conversation turn is wrapped in `stage(name)`, which
+- opens an OpenTelemetry span when tracing is configured
+  (OTEL_EXPORTER_OTLP_ENDPOINT or OTEL_TRACES_EXPORTER=console)
+- observes the stage duration in a Prometheus histogram unless METRICS_ENABLED=0
+
+With both disabled `stage()` returns a shared no-op context manager.
+"""
+import asyncio
+import contextlib
+import logging
+import os
+import time
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+TRACING_ENABLED = bool(os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT") or os.environ.get("OTEL_TRACES_EXPORTER"))
+SERVICE_NAME = os.environ.get("OTEL_SERVICE_NAME", "apollolytics-dialogue")
+
+# Buckets cover websocket sends (ms) up to full generations (tens of seconds)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0)
+
+_tracer = None
+_queue_depths: Dict[str, Callable[[], int]] = {}
+_NOOP = contextlib.nullcontext()
+
+if METRICS_ENABLED:
+    from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+
+    # With several uvicorn workers, set PROMETHEUS_MULTIPROC_DIR so a scrape aggregates all of them
+    _multiprocess = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+    STAGE_SECONDS = Histogram(
+        "apollolytics_stage_duration_seconds",
+        "Duration of each conversation pipeline stage",
+        ["stage"],
+        buckets=LATENCY_BUCKETS,
+    )
+    TURN_SECONDS = Histogram(
+        "apollolytics_turn_duration_seconds",
+        "Server-side duration of a conversation turn",
+        ["kind"],
+        buckets=LATENCY_BUCKETS,
+    )
+    ACTIVE_SESSIONS = Gauge(
+        "apollolytics_active_sessions",
+        "Conversation sessions currently open",
+        multiprocess_mode="livesum",
+    )
+    MODEL_RETRIES = Counter(
+        "apollolytics_model_retries_total",
+        "Model calls retried after a 429, 5xx or transport error",
+        ["kind", "error"],
+    )
+    MODEL_USAGE = Counter(
+        "apollolytics_model_usage_total",
+        "Usage reported by the model providers (tokens, audio seconds, characters, requests)",
+        ["provider", "kind", "unit"],
+    )
+    MODEL_COST = Counter(
+        "apollolytics_model_cost_usd_total",
+        "Estimated model cost per experiment condition (see backend/observability/usage_ledger.py)",
+        ["kind", "dialogue_mode", "article"],
+    )
+    STAGE_TIMEOUTS = Counter(
+        "apollolytics_stage_timeouts_total",
+        "Turn pipeline stages cancelled after their timeout (see backend/generation/turn_pipeline.py)",
+        ["stage"],
+    )
+    MODEL_HEDGES = Counter(
+        "apollolytics_model_hedges_total",
+        "Backup requests for slow model calls (sent, won = backup answered first, denied = over budget or no free slot)",
+        ["kind", "outcome"],
+    )
+    MODEL_DEADLINES = Counter(
+        "apollolytics_model_deadline_exceeded_total",
+        "Model calls abandoned at their deadline",
+        ["kind"],
+    )
+    SESSION_MEMORY = Gauge(
+        "apollolytics_session_memory_bytes",
+        "Bytes held in the context and history of the open sessions",
+        multiprocess_mode="livesum",
+    )
+    WORKER_MEMORY = Gauge(
+        "apollolytics_worker_memory_bytes",
+        "Resident memory of the worker process",
+        multiprocess_mode="livesum",
+    )
+    SESSIONS_EVICTED = Counter(
+        "apollolytics_sessions_evicted_total",
+        "Sessions closed or refused by the server (idle_timeout, max_age, memory_limit)",
+        ["reason"],
+    )
+    WS_FRAMES = Counter(
+        "apollolytics_ws_frames_total",
+        "Events sent to clients: sent = websocket frames, coalesced = text deltas merged into an earlier frame",
+        ["outcome"],
+    )
+    QUEUE_DEPTH = Gauge(
+        "apollolytics_queue_depth",
+        "Items waiting in each internal queue",
+        ["queue"],
+        multiprocess_mode="livesum",
+    )
+
+
+def setup_tracing() -> None:
+    """Install an OpenTelemetry tracer provider if tracing is configured."""
+    global _tracer
+    if not TRACING_ENABLED or _tracer is not None:
+        return
+    try:
+        from opentelemetry import trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    except ImportError:
+        logger.warning("Tracing requested but opentelemetry-sdk is not installed")
+        return
+
+    provider = TracerProvider(resource=Resource.create({"service.name": SERVICE_NAME}))
+    if os.environ.get("OTEL_TRACES_EXPORTER") == "console":
+        exporter = ConsoleSpanExporter()
+    else:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        exporter = OTLPSpanExporter()
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer("backend.ws_speech")
+    logger.info(f"Tracing enabled for service {SERVICE_NAME}")
+
+
+class _Stage:
+    __slots__ = ("name", "attributes", "_span", "_start")
+
+    def __init__(self, name: str, attributes: Dict[str, object]):
+        self.name = name
+        self.attributes = attributes
+        self._span = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        if _tracer is not None:
+            self._span = _tracer.start_as_current_span(self.name, attributes=self.attributes)
+            self._span.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if METRICS_ENABLED:
+            STAGE_SECONDS.labels(self.name).observe(time.perf_counter() - self._start)
+        if self._span is not None:
+            return self._span.__exit__(exc_type, exc, tb)
+        return False
+
+
+class _Turn:
+    """A conversation turn: parent span of its stages plus a turn-duration observation."""
+    __slots__ = ("kind", "_span", "_start", "_done")
+
+    def __init__(self, kind: str, attributes: Dict[str, object]):
+        self.kind = kind
+        self._span = None
+        self._done = False
+        self._start = time.perf_counter()
+        if _tracer is not None:
+            self._span = _tracer.start_as_current_span("conversation.turn", attributes=dict(attributes, kind=kind))
+            self._span.__enter__()
+
+    def finish(self) -> None:
+        """End the turn; safe to call more than once."""
+        if self._done:
+            return
+        self._done = True
+        if METRICS_ENABLED:
+            TURN_SECONDS.labels(self.kind).observe(time.perf_counter() - self._start)
+        if self._span is not None:
+            self._span.__exit__(None, None, None)
+
+
+def begin_turn(kind: str, **attributes) -> _Turn:
+    """
+    Start timing a conversation turn; stages entered afterwards become its children.
+
+    Args:
+        kind: "initial" for the opening turn, "user" for turns answering the participant
+        **attributes: Span attributes such as session_id
+    """
+    return _Turn(kind, attributes)
+
+
+def stage(name: str, **attributes):
+    """
+    Time a pipeline stage as a span and a histogram observation.
+
+    Args:
+        name: Stage name, e.g. "transcription" or "db.save_message"
+        **attributes: Span attributes such as session_id
+    """
+    if _tracer is None and not METRICS_ENABLED:
+        return _NOOP
+    return _Stage(name, attributes)
+
+
+def observe(name: str, seconds: float) -> None:
+    """Record a stage duration that was measured by the caller (no span)."""
+    if METRICS_ENABLED:
+        STAGE_SECONDS.labels(name).observe(seconds)
+
+
+def session_opened() -> None:
+    if METRICS_ENABLED:
+        ACTIVE_SESSIONS.inc()
+
+
+def session_closed() -> None:
+    if METRICS_ENABLED:
+        ACTIVE_SESSIONS.dec()
+
+
+def record_retry(kind: str, error: str) -> None:
+    if METRICS_ENABLED:
+        MODEL_RETRIES.labels(kind, error).inc()
+
+
+def record_stage_timeout(stage_name: str) -> None:
+    if METRICS_ENABLED:
+        STAGE_TIMEOUTS.labels(stage_name).inc()
+
+
+def record_memory(session_bytes: int, worker_bytes: int) -> None:
+    if METRICS_ENABLED:
+        SESSION_MEMORY.set(session_bytes)
+        WORKER_MEMORY.set(worker_bytes)
+
+
+def record_evicted(reason: str) -> None:
+    if METRICS_ENABLED:
+        SESSIONS_EVICTED.labels(reason).inc()
+
+
+def record_hedge(kind: str, outcome: str) -> None:
+    if METRICS_ENABLED:
+        MODEL_HEDGES.labels(kind, outcome).inc()
+
+
+def record_deadline_exceeded(kind: str) -> None:
+    if METRICS_ENABLED:
+        MODEL_DEADLINES.labels(kind).inc()
+
+
+def record_frames(sent: int, coalesced: int = 0) -> None:
+    if METRICS_ENABLED:
+        if sent:
+            WS_FRAMES.labels("sent").inc(sent)
+        if coalesced:
+            WS_FRAMES.labels("coalesced").inc(coalesced)
+
+
+def record_usage(provider: str, kind: str, usage: Dict[str, float]) -> None:
+    if METRICS_ENABLED:
+        for unit, amount in usage.items():
+            if amount:
+                MODEL_USAGE.labels(provider, kind, unit).inc(amount)
+
+
+def record_cost(kind: str, dialogue_mode: str, article: str, usd: float) -> None:
+    if METRICS_ENABLED and usd:
+        MODEL_COST.labels(kind, dialogue_mode, article).inc(usd)
+
+
+def register_queue(name: str, depth: Callable[[], int]) -> None:
+    """Report the current depth of an internal queue on every scrape."""
+    _queue_depths[name] = depth
+
+
+def _update_queue_depths() -> None:
+    for name, depth in _queue_depths.items():
+        try:
+            QUEUE_DEPTH.labels(name).set(depth())
+        except Exception as e:
+            logger.debug(f"Queue depth for {name} unavailable: {e}")
+
+
+async def refresh_queue_depths(interval: float = 1.0) -> None:
+    """Keep queue gauges current between scrapes (needed in multiprocess mode)."""
+    if not METRICS_ENABLED:
+        return
+    while True:
+        _update_queue_depths()
+        await asyncio.sleep(interval)
+
+
+def render_metrics() -> Optional[tuple]:
+    """
+    Render all metrics in the Prometheus text format.
+
+    Returns:
+        Tuple of (body, content_type), or None if metrics are disabled
+    """
+    if not METRICS_ENABLED:
+        return None
+    _update_queue_depths()
+    if _multiprocess:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
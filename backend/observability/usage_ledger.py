@@ -0,0 +1,201 @@
+"""
+Per-session usage and cost accounting for model calls.
+
+Every provider call reports its usage (prompt, cached, completion and audio
+tokens, transcribed seconds, TTS characters) here. The ledger attributes it to
+the session bound to the calling task (logging_setup.bind_session) and keeps
+running totals per model kind, so that
+- each assistant message is saved with the usage of its turn (`take_turn`)
+- the session_end event carries the session totals and estimated cost (`summary`)
+- apollolytics_model_cost_usd_total aggregates cost per dialogue mode and article
+- optional per-session budgets end runaway conversations (`over_budget`)
+
+Costs are estimates from PRICES (USD per 1M tokens, per transcribed second and
+per TTS character); MODEL_PRICES_FILE points to a JSON file with overrides in
+the same format. Budgets: SESSION_TOKEN_BUDGET, SESSION_AUDIO_SECONDS_BUDGET
+and SESSION_COST_BUDGET (USD); 0 disables a budget.
+
+Aggregate the persisted usage per condition, article or participant with
+    python -m backend.observability.usage_ledger --by dialogue_mode
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Optional
+
+from backend.observability.logging_setup import session_id_var
+from backend.observability.telemetry import record_cost
+
+logger = logging.getLogger(__name__)
+
+SESSION_TOKEN_BUDGET = int(os.environ.get("SESSION_TOKEN_BUDGET", "0"))
+SESSION_AUDIO_SECONDS_BUDGET = float(os.environ.get("SESSION_AUDIO_SECONDS_BUDGET", "0"))
+SESSION_COST_BUDGET = float(os.environ.get("SESSION_COST_BUDGET", "0"))
+
+# USD per 1M tokens; audio_second and character are per unit
+PRICES: Dict[str, Dict[str, float]] = {
+    "gpt-4o-audio-preview": {"input": 2.50, "cached_input": 1.25, "output": 10.0, "input_audio": 40.0, "output_audio": 80.0},
+    "gpt-4o": {"input": 2.50, "cached_input": 1.25, "output": 10.0},
+    "gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.60},
+    "whisper-1": {"audio_second": 0.0001},
+    "gpt-4o-mini-tts": {"character": 0.000015},
+}
+if os.environ.get("MODEL_PRICES_FILE"):
+    with open(os.environ["MODEL_PRICES_FILE"], "r", encoding="utf-8") as f:
+        for _model, _prices in json.load(f).items():
+            PRICES.setdefault(_model, {}).update(_prices)
+
+# Usage fields summed per kind; total_tokens is derived
+FIELDS = ("input_tokens", "cached_tokens", "input_audio_tokens", "output_tokens", "output_audio_tokens",
+          "audio_seconds", "characters", "requests")
+
+
+def estimate_cost(model: str, usage: Dict[str, float]) -> Dict[str, float]:
+    """
+    Estimated cost of one call and what prompt caching saved. input_tokens and
+    output_tokens include the cached and audio tokens, as reported by the API.
+    """
+    prices = PRICES.get(model, {})
+    per_token = 1e-6
+    input_price = prices.get("input", 0.0)
+    cached = usage.get("cached_tokens", 0)
+    input_audio = usage.get("input_audio_tokens", 0)
+    output_audio = usage.get("output_audio_tokens", 0)
+    text_input = max(0, usage.get("input_tokens", 0) - cached - input_audio)
+    text_output = max(0, usage.get("output_tokens", 0) - output_audio)
+    cost = per_token * (
+        text_input * input_price
+        + cached * prices.get("cached_input", input_price)
+        + input_audio * prices.get("input_audio", input_price)
+        + text_output * prices.get("output", 0.0)
+        + output_audio * prices.get("output_audio", prices.get("output", 0.0))
+    )
+    cost += usage.get("audio_seconds", 0) * prices.get("audio_second", 0.0)
+    cost += usage.get("characters", 0) * prices.get("character", 0.0)
+    savings = per_token * cached * (input_price - prices.get("cached_input", input_price))
+    return {"cost_usd": cost, "cache_savings_usd": savings}
+
+
+class SessionUsage:
+    """Running usage totals of one session, per model kind."""
+
+    def __init__(self, condition: Dict[str, str]):
+        self.condition = condition
+        self.kinds: Dict[str, Dict[str, float]] = defaultdict(lambda: dict.fromkeys(FIELDS + ("cost_usd", "cache_savings_usd"), 0))
+        self.turn: Dict[str, Dict[str, float]] = defaultdict(lambda: dict.fromkeys(FIELDS + ("cost_usd",), 0))
+
+    def add(self, kind: str, usage: Dict[str, float], cost: Dict[str, float]) -> None:
+        for totals in (self.kinds[kind], self.turn[kind]):
+            for name in totals:
+                totals[name] += usage.get(name, cost.get(name, 0))
+
+    def totals(self) -> Dict[str, float]:
+        totals = dict.fromkeys(FIELDS + ("cost_usd", "cache_savings_usd"), 0)
+        for kind in self.kinds.values():
+            for name, value in kind.items():
+                totals[name] += value
+        totals["total_tokens"] = totals["input_tokens"] + totals["output_tokens"]
+        return totals
+
+
+class UsageLedger:
+    def __init__(self):
+        self._sessions: Dict[str, SessionUsage] = {}
+        # Providers report from worker threads
+        self._lock = threading.Lock()
+
+    def start(self, session_id: str, **condition: str) -> None:
+        """Open the session's account; condition keys label the cost metric (dialogue_mode, article)."""
+        with self._lock:
+            self._sessions[session_id] = SessionUsage(condition)
+
+    def record(self, kind: str, model: str, usage: Dict[str, float], session_id: Optional[str] = None) -> None:
+        """Book one call on the session of the calling task (calls outside a session only reach the metrics)."""
+        session_id = session_id or session_id_var.get()
+        cost = estimate_cost(model, usage)
+        with self._lock:
+            session = self._sessions.get(session_id) if session_id else None
+            if session is not None:
+                session.add(kind, usage, cost)
+                condition = session.condition
+            else:
+                condition = {}
+        record_cost(kind, condition.get("dialogue_mode", "none"), condition.get("article", "none"), cost["cost_usd"])
+
+    def take_turn(self, session_id: str) -> Dict[str, Dict[str, float]]:
+        """Usage per kind since the previous call, for the turn's message record."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return {}
+            turn = {kind: dict(totals) for kind, totals in session.turn.items()}
+            session.turn.clear()
+        return turn
+
+    def summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            return {
+                "condition": dict(session.condition),
+                "totals": session.totals(),
+                "kinds": {kind: dict(totals) for kind, totals in session.kinds.items()},
+            }
+
+    def over_budget(self, session_id: str) -> Optional[str]:
+        """Name of the exceeded budget, or None."""
+        summary = self.summary(session_id)
+        if summary is None:
+            return None
+        totals = summary["totals"]
+        if SESSION_TOKEN_BUDGET and totals["total_tokens"] > SESSION_TOKEN_BUDGET:
+            return "token_budget"
+        if SESSION_AUDIO_SECONDS_BUDGET and totals["audio_seconds"] > SESSION_AUDIO_SECONDS_BUDGET:
+            return "audio_budget"
+        if SESSION_COST_BUDGET and totals["cost_usd"] > SESSION_COST_BUDGET:
+            return "cost_budget"
+        return None
+
+    def finish(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Close the session's account and return its summary."""
+        summary = self.summary(session_id)
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        return summary
+
+
+usage_ledger = UsageLedger()
+
+
+def main() -> None:
+    from backend.db_utils.dialogue_db import scan_all_items
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--by", default="dialogue_mode", choices=["dialogue_mode", "article", "prolific_id"])
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    groups: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    for item in scan_all_items():
+        usage = item.get("usage")
+        if item.get("event_type") != "session_end" or not usage:
+            continue
+        group = groups[str(usage.get("condition", {}).get(args.by, "unknown"))]
+        group["sessions"] += 1
+        for name, value in usage.get("totals", {}).items():
+            group[name] += float(value)
+
+    columns = ("total_tokens", "cached_tokens", "input_audio_tokens", "output_audio_tokens",
+               "audio_seconds", "cost_usd", "cache_savings_usd")
+    print(f"{args.by:>16} {'sessions':>8} " + " ".join(f"{c:>19}" for c in columns) + "  (per session)")
+    for name, group in sorted(groups.items(), key=lambda g: -g[1]["cost_usd"]):
+        sessions = group["sessions"]
+        print(f"{name:>16} {int(sessions):>8} " + " ".join(f"{group[c] / sessions:>19.4f}" for c in columns))
+
+
+if __name__ == "__main__":
+    main()
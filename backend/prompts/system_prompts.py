@@ -3,6 +3,9 @@ System prompts for different dialogue modes in the Apollolytics application.
 These prompts are used to guide the LLM in generating responses with different stances.
 """
 
+# User turn that asks the model for the opening of every conversation (not saved to the database)
+INITIAL_USER_MESSAGE = "Please start the conversation."
+
 # Dictionary mapping dialogue modes to their corresponding system prompts
 dialogue_prompts = {
     "critical": """**PERSONA**: Socratic Dialogue about Propaganda critical of Article
@@ -64,4 +67,22 @@ def get_prompt(mode, article, propaganda_info=""):
     return dialogue_prompts[mode].format(
         article=article,
         propaganda_info=propaganda_info
-    )
\ No newline at end of file
+    )
+
+def format_propaganda_info(propaganda_result):
+    """
+    Reduce a propaganda detection result to the fields used in the system prompt.
+    
+    Args:
+        propaganda_result (dict): Result of the propaganda detection service
+        
+    Returns:
+        dict: Category -> list of instances with explanation, location and context
+    """
+    return {
+        cat: [
+            {k: entry[k] for k in ['explanation', 'location', 'contextualize'] if k in entry}
+            for entry in entries
+        ]
+        for cat, entries in propaganda_result.get('data', {}).items()
+    }
@@ -0,0 +1,134 @@
+"""
+Model providers: one interface for every model call the backend makes.
+
+A provider implements the five model roles used by the dialogue backend:
+- chat_audio: an answer as transcript + WAV audio (gpt-4o-audio-preview)
+- chat_text: a streamed text answer (sentence-pipelined generation)
+- transcription: speech to text for user recordings (whisper-1)
+- tts: text to speech for single sentences
+- classifier: short text completions such as the stall check
+
+Methods are blocking; callers run them in a thread through the model
+scheduler. Every call reports its usage (tokens, audio seconds, characters)
+to the metrics and the session's usage ledger and returns it with the result.
+
+The provider is selected with MODEL_PROVIDER (see backend.providers.registry),
+the model per role with CHAT_AUDIO_MODEL, CHAT_TEXT_MODEL, TRANSCRIPTION_MODEL,
+TTS_MODEL and CLASSIFIER_MODEL.
+"""
+import io
+import logging
+import os
+import wave
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterator, List, Optional
+
+from backend.observability.telemetry import record_usage
+from backend.observability.usage_ledger import usage_ledger
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODELS = {
+    "chat_audio": os.environ.get("CHAT_AUDIO_MODEL", "gpt-4o-audio-preview"),
+    "chat_text": os.environ.get("CHAT_TEXT_MODEL", "gpt-4o-audio-preview"),
+    "transcription": os.environ.get("TRANSCRIPTION_MODEL", "whisper-1"),
+    "tts": os.environ.get("TTS_MODEL", "gpt-4o-mini-tts"),
+    "classifier": os.environ.get("CLASSIFIER_MODEL", "gpt-4o"),
+}
+VOICE = os.environ.get("TTS_VOICE", "alloy")
+
+
+@dataclass
+class Usage:
+    # input_tokens and output_tokens include the cached and audio tokens
+    input_tokens: int = 0
+    cached_tokens: int = 0
+    input_audio_tokens: int = 0
+    output_tokens: int = 0
+    output_audio_tokens: int = 0
+    audio_seconds: float = 0.0
+    characters: int = 0
+    requests: int = 1
+
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+    def as_dict(self) -> Dict[str, float]:
+        return {**asdict(self), "total_tokens": self.total_tokens}
+
+
+@dataclass
+class AudioReply:
+    transcript: str
+    audio: str  # base64 encoded WAV
+    audio_id: Optional[str]
+    usage: Usage = field(default_factory=Usage)
+
+
+@dataclass
+class Transcription:
+    text: str
+    usage: Usage = field(default_factory=Usage)
+
+
+@dataclass
+class Speech:
+    audio: bytes  # WAV
+    usage: Usage = field(default_factory=Usage)
+
+
+@dataclass
+class Completion:
+    text: str
+    usage: Usage = field(default_factory=Usage)
+
+
+def wav_seconds(audio_bytes: bytes) -> float:
+    """Duration of a WAV recording, 0 for other containers (pass their decoded duration instead)."""
+    try:
+        with wave.open(io.BytesIO(audio_bytes), "rb") as wav_file:
+            return wav_file.getnframes() / float(wav_file.getframerate())
+    except (EOFError, wave.Error):
+        return 0.0
+
+
+class ModelProvider:
+    """Base class; subclasses implement the model roles they support."""
+
+    name = "base"
+
+    def __init__(self, models: Optional[Dict[str, str]] = None):
+        self.models = {**DEFAULT_MODELS, **(models or {})}
+
+    def warmup(self) -> None:
+        """Load local models or create API clients before the first request; runs in the background after startup."""
+
+    def preconnect(self) -> None:
+        """Open the connection to the API ahead of a session's first call; never raises."""
+
+    def chat_audio(self, messages: List[dict], voice: str = VOICE) -> AudioReply:
+        raise NotImplementedError(f"{self.name} does not support chat_audio")
+
+    def stream_text(self, messages: List[dict]) -> Iterator[str]:
+        raise NotImplementedError(f"{self.name} does not support chat_text")
+
+    def transcribe(self, audio_bytes: bytes, filename: str = "audio.wav", language: str = "en",
+                   duration: Optional[float] = None) -> Transcription:
+        """
+        Transcribe a recording. `duration` (seconds) is booked as its usage; it
+        is read from the bytes when not given, which only works for WAV.
+        """
+        raise NotImplementedError(f"{self.name} does not support transcription")
+
+    def synthesize(self, text: str, voice: str = VOICE) -> Speech:
+        raise NotImplementedError(f"{self.name} does not support tts")
+
+    def complete(self, messages: List[dict], role: str = "classifier", model: Optional[str] = None) -> Completion:
+        raise NotImplementedError(f"{self.name} does not support text completions")
+
+    def report(self, kind: str, usage: Usage, model: Optional[str] = None) -> Usage:
+        """Publish the usage of one call; returns it for the caller."""
+        record_usage(self.name, kind, asdict(usage))
+        usage_ledger.record(kind, model or self.models.get(kind, ""), usage.as_dict())
+        return usage
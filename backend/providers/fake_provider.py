@@ -0,0 +1,142 @@
+"""
+Deterministic in-process stand-in for the model APIs.
+
+For tests, offline development and load runs without network or API cost.
+Answers, transcripts and latencies depend only on the request and FAKE_SEED,
+so the same run is reproducible. Latency per role is configured with
+FAKE_LATENCY_CHAT_AUDIO, FAKE_LATENCY_CHAT_TEXT (time to first token),
+FAKE_LATENCY_TRANSCRIPTION, FAKE_LATENCY_TTS and FAKE_LATENCY_CLASSIFIER
+(seconds), plus FAKE_TOKEN_INTERVAL and FAKE_JITTER (relative, e.g. 0.2 = +-20%).
+"""
+import base64
+import hashlib
+import io
+import json
+import os
+import random
+import time
+import uuid
+import wave
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from backend.providers.base import (
+    VOICE,
+    AudioReply,
+    Completion,
+    ModelProvider,
+    Speech,
+    Transcription,
+    Usage,
+    wav_seconds,
+)
+
+DEFAULT_LATENCY = {
+    "chat_audio": 2.0,
+    "chat_text": 0.5,
+    "transcription": 0.6,
+    "tts": 0.4,
+    "classifier": 0.5,
+}
+SAMPLE_RATE = 24000
+SECONDS_PER_WORD = 0.35
+
+REPLIES = (
+    "That is an interesting point. The article frames the decision as political foolishness, "
+    "but it offers little evidence for that claim. What do you think the authors leave out?",
+    "Let's look at the wording first. Phrases like 'reeks of provocation' appeal to emotion rather "
+    "than to facts. Which sentence of the article stood out to you the most?",
+    "Many readers share that impression. Still, the article leaves out who benefits from the policy "
+    "it criticises. How would the story change if that was mentioned?",
+)
+TRANSCRIPTS = (
+    "I think the article exaggerates the risks, but some points seem fair.",
+    "I'm not sure, the author seems to have a clear agenda.",
+    "That makes sense, I hadn't thought about who benefits from it.",
+)
+
+
+def _estimate_tokens(value) -> int:
+    return len(json.dumps(value, default=str)) // 4
+
+
+class FakeProvider(ModelProvider):
+    name = "fake"
+
+    def __init__(self, models=None, latency: Optional[Dict[str, float]] = None,
+                 jitter: Optional[float] = None, seed: Optional[int] = None):
+        super().__init__(models)
+        self.latency = {
+            role: float(os.environ.get(f"FAKE_LATENCY_{role.upper()}", default))
+            for role, default in DEFAULT_LATENCY.items()
+        }
+        self.latency.update(latency or {})
+        self.jitter = float(os.environ.get("FAKE_JITTER", "0.2")) if jitter is None else jitter
+        self.token_interval = float(os.environ.get("FAKE_TOKEN_INTERVAL", "0.03"))
+        self.seed = int(os.environ.get("FAKE_SEED", "0")) if seed is None else seed
+
+    def _rng(self, role: str, request) -> random.Random:
+        """Random source that only depends on the seed, the role and the request."""
+        digest = hashlib.sha256(f"{self.seed}:{role}:{json.dumps(request, default=str)}".encode("utf-8")).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    def _wait(self, role: str, rng: random.Random) -> None:
+        time.sleep(max(0.0, self.latency[role] * (1.0 + rng.uniform(-self.jitter, self.jitter))))
+
+    @staticmethod
+    def _wav(seconds: float) -> bytes:
+        buf = io.BytesIO()
+        with wave.open(buf, "wb") as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(SAMPLE_RATE)
+            wav_file.writeframes(np.zeros(int(seconds * SAMPLE_RATE), dtype=np.int16).tobytes())
+        return buf.getvalue()
+
+    def chat_audio(self, messages: List[dict], voice: str = VOICE) -> AudioReply:
+        rng = self._rng("chat_audio", messages)
+        self._wait("chat_audio", rng)
+        reply = rng.choice(REPLIES)
+        audio = self._wav(SECONDS_PER_WORD * len(reply.split()))
+        # Audio output is billed at about 10 tokens per second
+        audio_tokens = int(10 * wav_seconds(audio))
+        usage = Usage(input_tokens=_estimate_tokens(messages), output_tokens=len(reply) // 4 + audio_tokens,
+                      output_audio_tokens=audio_tokens)
+        return AudioReply(
+            transcript=reply,
+            audio=base64.b64encode(audio).decode("utf-8"),
+            audio_id=f"audio_{uuid.UUID(int=rng.getrandbits(128)).hex}",
+            usage=self.report("chat_audio", usage)
+        )
+
+    def stream_text(self, messages: List[dict]) -> Iterator[str]:
+        rng = self._rng("chat_text", messages)
+        self._wait("chat_text", rng)
+        reply = rng.choice(REPLIES)
+        words = reply.split(" ")
+        for i, word in enumerate(words):
+            yield word if i == len(words) - 1 else word + " "
+            time.sleep(self.token_interval)
+        self.report("chat_text", Usage(input_tokens=_estimate_tokens(messages), output_tokens=len(reply) // 4))
+
+    def transcribe(self, audio_bytes: bytes, filename: str = "audio.wav", language: str = "en",
+                   duration: Optional[float] = None) -> Transcription:
+        rng = self._rng("transcription", hashlib.sha256(audio_bytes).hexdigest())
+        self._wait("transcription", rng)
+        usage = Usage(audio_seconds=duration if duration is not None else wav_seconds(audio_bytes))
+        return Transcription(rng.choice(TRANSCRIPTS), self.report("transcription", usage))
+
+    def synthesize(self, text: str, voice: str = VOICE) -> Speech:
+        rng = self._rng("tts", text)
+        self._wait("tts", rng)
+        audio = self._wav(SECONDS_PER_WORD * len(text.split()))
+        return Speech(audio, self.report("tts", Usage(characters=len(text))))
+
+    def complete(self, messages: List[dict], role: str = "classifier", model: Optional[str] = None) -> Completion:
+        rng = self._rng(role, messages)
+        self._wait(role if role in self.latency else "classifier", rng)
+        # The stall classifier always sees an active conversation
+        text = "0" if role == "classifier" else rng.choice(REPLIES)
+        usage = Usage(input_tokens=_estimate_tokens(messages), output_tokens=max(1, len(text) // 4))
+        return Completion(text, self.report(role, usage, model))
@@ -0,0 +1,211 @@
+"""
+On-box speech to text with a quantized Whisper model (faster-whisper, CPU).
+
+Only implements the transcription role; enable it with
+TRANSCRIPTION_PROVIDER=local while MODEL_PROVIDER keeps serving the other roles.
+Requires `pip install faster-whisper`.
+
+Every worker process loads one shared model. Requests from all sessions are
+queued and decoded in batches: while all LOCAL_STT_WORKERS decode threads are
+busy, new clips accumulate and are encoded and decoded together by the next
+free thread (at most LOCAL_STT_MAX_BATCH clips, waiting at most
+LOCAL_STT_BATCH_WINDOW_MS for more once a thread is free). Clips longer than
+the model's 30 s window are transcribed on their own.
+
+Configuration: LOCAL_STT_MODEL (model size, HF id or path of a CTranslate2
+model, default small.en), LOCAL_STT_COMPUTE_TYPE (default int8),
+LOCAL_STT_CPU_THREADS (per decode thread, 0 = CTranslate2 default) and
+LOCAL_STT_BEAM_SIZE.
+"""
+import io
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import groupby
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from backend.providers.base import ModelProvider, Transcription, Usage
+
+logger = logging.getLogger(__name__)
+
+LOCAL_STT_MODEL = os.environ.get("LOCAL_STT_MODEL", "small.en")
+LOCAL_STT_COMPUTE_TYPE = os.environ.get("LOCAL_STT_COMPUTE_TYPE", "int8")
+LOCAL_STT_CPU_THREADS = int(os.environ.get("LOCAL_STT_CPU_THREADS", "0"))
+LOCAL_STT_WORKERS = int(os.environ.get("LOCAL_STT_WORKERS", "2"))
+LOCAL_STT_MAX_BATCH = int(os.environ.get("LOCAL_STT_MAX_BATCH", "8"))
+LOCAL_STT_BATCH_WINDOW_MS = float(os.environ.get("LOCAL_STT_BATCH_WINDOW_MS", "20"))
+LOCAL_STT_BEAM_SIZE = int(os.environ.get("LOCAL_STT_BEAM_SIZE", "1"))
+
+SAMPLE_RATE = 16000
+# Same silence rule as faster-whisper's transcribe()
+NO_SPEECH_THRESHOLD = 0.6
+LOG_PROB_THRESHOLD = -1.0
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_model():
+    """The worker's shared WhisperModel, loaded on first use."""
+    global _model
+    with _model_lock:
+        if _model is None:
+            try:
+                from faster_whisper import WhisperModel
+            except ImportError as e:
+                raise RuntimeError("TRANSCRIPTION_PROVIDER=local requires the faster-whisper package") from e
+            start = time.perf_counter()
+            _model = WhisperModel(
+                LOCAL_STT_MODEL,
+                device="cpu",
+                compute_type=LOCAL_STT_COMPUTE_TYPE,
+                cpu_threads=LOCAL_STT_CPU_THREADS,
+                # One CTranslate2 replica per decode thread so batches run in parallel
+                num_workers=LOCAL_STT_WORKERS,
+            )
+            logger.info(f"Loaded local Whisper model {LOCAL_STT_MODEL} ({LOCAL_STT_COMPUTE_TYPE}) "
+                        f"in {time.perf_counter() - start:.1f}s")
+        return _model
+
+
+def decode_audio(audio_bytes: bytes) -> np.ndarray:
+    """Any ffmpeg-readable upload as 16 kHz mono float32 samples."""
+    from faster_whisper import decode_audio as fw_decode_audio
+
+    return fw_decode_audio(io.BytesIO(audio_bytes), sampling_rate=SAMPLE_RATE)
+
+
+class TranscriptionBatcher:
+    """
+    Collects transcription requests from all sessions and decodes them in
+    batches on a fixed pool of threads.
+    """
+
+    def __init__(self, workers: int = LOCAL_STT_WORKERS, max_batch: int = LOCAL_STT_MAX_BATCH,
+                 batch_window: float = LOCAL_STT_BATCH_WINDOW_MS / 1000.0, beam_size: int = LOCAL_STT_BEAM_SIZE):
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.beam_size = beam_size
+        self._requests: "queue.Queue[Tuple[np.ndarray, str, Future]]" = queue.Queue()
+        self._free_workers = threading.BoundedSemaphore(workers)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="local-stt")
+        self._collector = threading.Thread(target=self._collect, name="local-stt-batcher", daemon=True)
+        self._collector.start()
+
+    @property
+    def pending(self) -> int:
+        return self._requests.qsize()
+
+    def submit(self, samples: np.ndarray, language: str = "en") -> Future:
+        future: Future = Future()
+        self._requests.put((samples, language, future))
+        return future
+
+    def _collect(self) -> None:
+        while True:
+            batch = [self._requests.get()]
+            # Wait for a free decode thread first: requests arriving meanwhile join this batch
+            self._free_workers.acquire()
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._requests.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            self._pool.submit(self._run, batch)
+
+    def _run(self, batch: List[Tuple[np.ndarray, str, Future]]) -> None:
+        try:
+            model = get_model()
+            max_samples = model.feature_extractor.n_samples
+            short = [r for r in batch if len(r[0]) <= max_samples]
+            for samples, language, future in batch:
+                if len(samples) > max_samples:
+                    self._resolve(future, lambda: self._transcribe_long(model, samples, language))
+            short.sort(key=lambda r: r[1])
+            for language, group in groupby(short, key=lambda r: r[1]):
+                group = list(group)
+                try:
+                    texts = self._transcribe_batch(model, [samples for samples, _, _ in group], language)
+                except Exception as e:
+                    for _, _, future in group:
+                        future.set_exception(e)
+                    continue
+                for (_, _, future), text in zip(group, texts):
+                    future.set_result(text)
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._free_workers.release()
+
+    @staticmethod
+    def _resolve(future: Future, fn) -> None:
+        try:
+            future.set_result(fn())
+        except Exception as e:
+            future.set_exception(e)
+
+    def _transcribe_batch(self, model, clips: List[np.ndarray], language: str) -> List[str]:
+        """One encoder and one decoder pass for up to 30 s clips, without timestamps."""
+        from faster_whisper.audio import pad_or_trim
+        from faster_whisper.tokenizer import Tokenizer
+        from faster_whisper.transcribe import get_suppressed_tokens
+
+        tokenizer = Tokenizer(model.hf_tokenizer, model.model.is_multilingual, task="transcribe", language=language)
+        features = np.stack([
+            pad_or_trim(model.feature_extractor(samples), model.feature_extractor.nb_max_frames) for samples in clips
+        ])
+        prompt = model.get_prompt(tokenizer, [], without_timestamps=True)
+        results = model.model.generate(
+            model.encode(features),
+            [list(prompt) for _ in clips],
+            beam_size=self.beam_size,
+            max_length=model.max_length,
+            suppress_blank=True,
+            suppress_tokens=get_suppressed_tokens(tokenizer, [-1]),
+            return_scores=True,
+            return_no_speech_prob=True,
+        )
+        texts = []
+        for result in results:
+            tokens = result.sequences_ids[0]
+            avg_logprob = result.scores[0] * len(tokens) / (len(tokens) + 1)
+            if result.no_speech_prob > NO_SPEECH_THRESHOLD and avg_logprob < LOG_PROB_THRESHOLD:
+                texts.append("")
+            else:
+                texts.append(tokenizer.decode(tokens).strip())
+        return texts
+
+    def _transcribe_long(self, model, samples: np.ndarray, language: str) -> str:
+        segments, _ = model.transcribe(
+            samples, language=language, beam_size=self.beam_size,
+            condition_on_previous_text=False, without_timestamps=True
+        )
+        return " ".join(segment.text.strip() for segment in segments)
+
+
+class LocalWhisperProvider(ModelProvider):
+    name = "local"
+
+    def __init__(self, models=None, batcher: Optional[TranscriptionBatcher] = None):
+        super().__init__({"transcription": LOCAL_STT_MODEL, **(models or {})})
+        self.batcher = batcher or TranscriptionBatcher()
+
+    def warmup(self) -> None:
+        start = time.perf_counter()
+        self.batcher.submit(np.zeros(SAMPLE_RATE, dtype=np.float32)).result()
+        logger.info(f"Local Whisper warm-up took {time.perf_counter() - start:.1f}s")
+
+    def transcribe(self, audio_bytes: bytes, filename: str = "audio.wav", language: str = "en",
+                   duration: Optional[float] = None) -> Transcription:
+        samples = decode_audio(audio_bytes)
+        text = self.batcher.submit(samples, language).result()
+        usage = Usage(audio_seconds=len(samples) / SAMPLE_RATE)
+        return Transcription(text, self.report("transcription", usage))
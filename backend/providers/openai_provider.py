@@ -0,0 +1,170 @@
+"""
+OpenAI and Azure OpenAI providers.
+
+Both use the official client with its own retries disabled: 429/5xx retries
+are handled by the model scheduler. The Azure provider addresses deployments
+instead of models; deployment names default to the model names and are set
+per role with AZURE_DEPLOYMENT_CHAT_AUDIO, AZURE_DEPLOYMENT_TRANSCRIPTION, ...
+"""
+import io
+import logging
+import os
+import threading
+from typing import Iterator, List, Optional
+
+from backend.providers.base import (
+    DEFAULT_MODELS,
+    VOICE,
+    AudioReply,
+    Completion,
+    ModelProvider,
+    Speech,
+    Transcription,
+    Usage,
+    wav_seconds,
+)
+
+logger = logging.getLogger(__name__)
+
+# HTTP timeout per request; the scheduler's deadlines stop waiting earlier, this ends abandoned requests
+OPENAI_TIMEOUT = float(os.environ.get("OPENAI_TIMEOUT", "60"))
+
+
+def _token_usage(usage) -> Usage:
+    if usage is None:
+        return Usage()
+    prompt_details = getattr(usage, "prompt_tokens_details", None)
+    completion_details = getattr(usage, "completion_tokens_details", None)
+    return Usage(
+        input_tokens=usage.prompt_tokens or 0,
+        cached_tokens=getattr(prompt_details, "cached_tokens", None) or 0,
+        input_audio_tokens=getattr(prompt_details, "audio_tokens", None) or 0,
+        output_tokens=usage.completion_tokens or 0,
+        output_audio_tokens=getattr(completion_details, "audio_tokens", None) or 0,
+    )
+
+
+class OpenAIProvider(ModelProvider):
+    """
+    The client (and the openai package, slow to import) is created on first
+    use or by `warmup`, which the app runs in the background after startup.
+    """
+    name = "openai"
+
+    def __init__(self, client=None, models=None):
+        super().__init__(models)
+        self._client = client
+        self._client_lock = threading.Lock()
+
+    def _create_client(self):
+        from openai import OpenAI
+        return OpenAI(max_retries=0, timeout=OPENAI_TIMEOUT)
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._create_client()
+        return self._client
+
+    def warmup(self) -> None:
+        self.client
+
+    def preconnect(self) -> None:
+        # Any cheap request establishes the TCP/TLS connection the first model call then reuses
+        try:
+            self.client.with_options(timeout=5.0).models.retrieve(self.models["chat_audio"])
+        except Exception as e:
+            logger.debug(f"Provider warm-up request failed: {e}")
+
+    def chat_audio(self, messages: List[dict], voice: str = VOICE) -> AudioReply:
+        completion = self.client.chat.completions.create(
+            model=self.models["chat_audio"],
+            modalities=["text", "audio"],
+            audio={"voice": voice, "format": "wav"},
+            messages=messages
+        )
+        audio = completion.choices[0].message.audio
+        return AudioReply(
+            transcript=audio.transcript,
+            audio=audio.data,
+            audio_id=audio.id,
+            usage=self.report("chat_audio", _token_usage(completion.usage))
+        )
+
+    def stream_text(self, messages: List[dict]) -> Iterator[str]:
+        stream = self.client.chat.completions.create(
+            model=self.models["chat_text"],
+            modalities=["text"],
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        usage = Usage()
+        try:
+            for chunk in stream:
+                if chunk.usage is not None:
+                    usage = _token_usage(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Closing early (an interrupted answer) drops the connection and stops generation
+            stream.close()
+        self.report("chat_text", usage)
+
+    def transcribe(self, audio_bytes: bytes, filename: str = "audio.wav", language: str = "en",
+                   duration: Optional[float] = None) -> Transcription:
+        audio_file = io.BytesIO(audio_bytes)
+        audio_file.name = filename
+        transcript = self.client.audio.transcriptions.create(
+            model=self.models["transcription"],
+            file=audio_file,
+            language=language
+        )
+        usage = Usage(audio_seconds=duration if duration is not None else wav_seconds(audio_bytes))
+        return Transcription(transcript.text or "", self.report("transcription", usage))
+
+    def synthesize(self, text: str, voice: str = VOICE) -> Speech:
+        response = self.client.audio.speech.create(
+            model=self.models["tts"],
+            voice=voice,
+            input=text,
+            response_format="wav"
+        )
+        return Speech(response.content, self.report("tts", Usage(characters=len(text))))
+
+    def complete(self, messages: List[dict], role: str = "classifier", model: Optional[str] = None) -> Completion:
+        completion = self.client.chat.completions.create(
+            model=model or self.models[role],
+            messages=messages
+        )
+        return Completion(
+            completion.choices[0].message.content or "",
+            self.report(role, _token_usage(completion.usage), model or self.models[role])
+        )
+
+
+class AzureOpenAIProvider(OpenAIProvider):
+    """
+    Azure OpenAI deployments. Configured with AZURE_OPENAI_ENDPOINT,
+    AZURE_OPENAI_API_KEY and OPENAI_API_VERSION.
+    """
+    name = "azure"
+
+    def __init__(self, client=None, models=None):
+        deployments = {
+            role: os.environ.get(f"AZURE_DEPLOYMENT_{role.upper()}", model)
+            for role, model in DEFAULT_MODELS.items()
+        }
+        super().__init__(client, {**deployments, **(models or {})})
+
+    def _create_client(self):
+        from openai import AzureOpenAI
+        return AzureOpenAI(
+            azure_endpoint=os.environ.get("AZURE_OPENAI_ENDPOINT"),
+            api_key=os.environ.get("AZURE_OPENAI_API_KEY"),
+            api_version=os.environ.get("OPENAI_API_VERSION", "2025-01-01-preview"),
+            max_retries=0,
+            timeout=OPENAI_TIMEOUT
+        )
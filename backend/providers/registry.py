@@ -0,0 +1,42 @@
+"""
+Provider selection. MODEL_PROVIDER picks the implementation for the worker:
+"openai" (default), "azure" or "fake" (deterministic, in-process).
+TRANSCRIPTION_PROVIDER overrides it for speech to text, e.g. "local" for the
+on-box Whisper model.
+"""
+import importlib
+import logging
+import os
+from functools import lru_cache
+
+from backend.providers.base import ModelProvider
+
+logger = logging.getLogger(__name__)
+
+PROVIDERS = {
+    "openai": "backend.providers.openai_provider:OpenAIProvider",
+    "azure": "backend.providers.openai_provider:AzureOpenAIProvider",
+    "fake": "backend.providers.fake_provider:FakeProvider",
+    "local": "backend.providers.local_whisper:LocalWhisperProvider",
+}
+
+
+def get_provider(name: str = "") -> ModelProvider:
+    """The shared provider instance, created on first use."""
+    return _create_provider(name or os.environ.get("MODEL_PROVIDER", "openai"))
+
+
+@lru_cache(maxsize=None)
+def _create_provider(name: str) -> ModelProvider:
+    # Cached on the resolved name: the default and an explicit name share one instance
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown MODEL_PROVIDER '{name}', expected one of {', '.join(PROVIDERS)}")
+    module_name, class_name = PROVIDERS[name].split(":")
+    provider = getattr(importlib.import_module(module_name), class_name)()
+    logger.info(f"Using model provider {name} ({', '.join(f'{k}={v}' for k, v in provider.models.items())})")
+    return provider
+
+
+def get_transcription_provider() -> ModelProvider:
+    """Provider for the transcription role; the main provider unless TRANSCRIPTION_PROVIDER is set."""
+    return get_provider(os.environ.get("TRANSCRIPTION_PROVIDER", ""))
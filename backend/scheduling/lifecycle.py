@@ -0,0 +1,89 @@
+"""
+Graceful drain of a worker on SIGTERM (docker stop, rolling deploys).
+
+uvicorn closes every open websocket as soon as it receives SIGTERM, which cuts
+participants off mid-answer and loses their session_end records. The
+WorkerLifecycle takes over SIGTERM in each worker instead:
+
+1. the worker stops taking new sessions (`draining`; /health returns 503 so
+   the load balancer moves traffic away, and new connections get a reconnect hint)
+2. the drain callback lets running turns finish, at most DRAIN_TIMEOUT seconds,
+   then ends the sessions (their pending DB writes are flushed and session_end is
+   stored with reason server_shutdown)
+3. uvicorn's own SIGTERM handling runs and the worker exits
+
+A second SIGTERM skips the drain. The container's stop timeout (docker stop -t,
+stop_grace_period) must be longer than DRAIN_TIMEOUT.
+"""
+import asyncio
+import logging
+import os
+import signal
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+DRAIN_TIMEOUT = float(os.environ.get("DRAIN_TIMEOUT", "25"))
+# Sent to clients with the reconnect hint: seconds to wait before opening a new session
+RECONNECT_AFTER = float(os.environ.get("RECONNECT_AFTER", "3"))
+
+
+class WorkerLifecycle:
+    def __init__(self, drain_timeout: float = DRAIN_TIMEOUT):
+        self.drain_timeout = drain_timeout
+        self.draining = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._previous = None
+        self._on_drain: Optional[Callable[[float], Awaitable[None]]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def install(self, on_drain: Callable[[float], Awaitable[None]]) -> None:
+        """
+        Take over SIGTERM for this worker; call from the app's startup, after
+        uvicorn installed its handlers.
+
+        Args:
+            on_drain: Coroutine function called with the drain deadline (loop time)
+        """
+        self._loop = asyncio.get_running_loop()
+        self._on_drain = on_drain
+        self._previous = signal.getsignal(signal.SIGTERM)
+        try:
+            signal.signal(signal.SIGTERM, self._handle_sigterm)
+        except ValueError:
+            # Not the main thread (e.g. under a test client): keep the default handling
+            logger.warning("Graceful drain unavailable, SIGTERM handler not installed")
+
+    def _handle_sigterm(self, signum, frame) -> None:
+        if self.draining:
+            logger.warning("Second SIGTERM, shutting down without waiting for sessions")
+            self._exit(signum, frame)
+            return
+        self._loop.call_soon_threadsafe(self._start_drain, signum, frame)
+
+    def _start_drain(self, signum, frame) -> None:
+        if self.draining:
+            return
+        self.draining = True
+        logger.warning(f"SIGTERM received, draining sessions for up to {self.drain_timeout:.0f}s")
+        self._task = self._loop.create_task(self._drain(signum, frame))
+
+    async def _drain(self, signum, frame) -> None:
+        try:
+            await self._on_drain(self._loop.time() + self.drain_timeout)
+        except Exception as e:
+            logger.error(f"Drain failed: {e}")
+        finally:
+            logger.warning("Drain finished, shutting down")
+            self._exit(signum, frame)
+
+    def _exit(self, signum, frame) -> None:
+        """Hand the signal to the handler uvicorn installed."""
+        if callable(self._previous):
+            self._previous(signum, frame)
+        else:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.raise_signal(signal.SIGTERM)
+
+
+lifecycle = WorkerLifecycle()
@@ -0,0 +1,411 @@
+"""
+Per-worker admission control and fair scheduling of outbound model calls.
+
+Every call to a model goes through ModelScheduler.run(kind, session_id, fn):
+- a FairLimiter caps concurrent calls per model kind and hands free slots to
+  waiting sessions round-robin, so one busy session cannot starve the others
+- token buckets enforce the provider's request and token quotas (per worker)
+- 429, 5xx, timeout and connection errors are retried with exponential backoff,
+  honouring Retry-After when the provider sends it
+- every call has a deadline (including retries), and slow calls get one hedged
+  backup request (see request_policy.py)
+
+AdmissionController holds new sessions in a waiting state when the worker is
+saturated, instead of letting them pile more calls onto the provider.
+
+Limits are configured per kind with environment variables, e.g.
+SCHEDULER_CHAT_AUDIO_CONCURRENCY, SCHEDULER_CHAT_AUDIO_RPM, SCHEDULER_CHAT_AUDIO_TPM,
+SCHEDULER_CHAT_AUDIO_DEADLINE (seconds, 0 = none).
+RPM/TPM are the provider's organisation quotas and are split across
+SCHEDULER_WORKERS uvicorn workers.
+"""
+import asyncio
+import contextvars
+import inspect
+import logging
+import os
+import random
+import sys
+import time
+from collections import OrderedDict, deque
+from functools import partial
+from typing import Any, Callable, Deque, Dict, Optional
+
+from backend.observability.telemetry import record_deadline_exceeded, record_evicted, record_retry, register_queue
+from backend.scheduling.request_policy import HEDGE_KINDS, HedgePolicy, hedged
+from backend.scheduling.session_memory import memory_exhausted
+
+logger = logging.getLogger(__name__)
+
+WORKERS = int(os.environ.get("SCHEDULER_WORKERS", "5"))
+MAX_RETRIES = int(os.environ.get("SCHEDULER_MAX_RETRIES", "4"))
+BASE_BACKOFF = 0.5
+MAX_BACKOFF = 20.0
+
+# kind -> (concurrency per worker, provider requests/minute, provider tokens/minute; 0 = unlimited)
+DEFAULT_LIMITS = {
+    "chat_audio": (4, 500, 250000),
+    "transcription": (4, 500, 0),
+    "classifier": (6, 5000, 800000),
+    "chat_text": (4, 500, 250000),
+    "tts": (6, 500, 0),
+}
+
+# kind -> seconds until a call (including its retries) is abandoned
+DEFAULT_DEADLINES = {
+    "chat_audio": 60.0,
+    "transcription": 20.0,
+    "classifier": 15.0,
+    "chat_text": 90.0,
+    "tts": 20.0,
+}
+
+MAX_ACTIVE_SESSIONS = int(os.environ.get("MAX_ACTIVE_SESSIONS", "12"))
+# A session is kept waiting while this many calls are already queued for any model kind
+SATURATION_QUEUE_DEPTH = int(os.environ.get("SATURATION_QUEUE_DEPTH", "8"))
+ADMISSION_TIMEOUT = float(os.environ.get("ADMISSION_TIMEOUT", "300"))
+
+
+def estimate_tokens(messages: list) -> int:
+    """Rough prompt size for the token bucket: ~4 characters per text token, ~10 tokens per audio second."""
+    tokens = 0
+    for message in messages:
+        content = message.get("content")
+        parts = content if isinstance(content, list) else [{"type": "text", "text": content or ""}]
+        for part in parts:
+            if part.get("type") == "input_audio":
+                audio_bytes = len(part["input_audio"].get("data", "")) * 3 // 4
+                tokens += audio_bytes // 32000 * 10  # 16 kHz PCM16 is 32000 bytes per second
+            else:
+                tokens += len(str(part.get("text", ""))) // 4
+    return tokens
+
+
+class ModelUnavailableError(Exception):
+    """Raised when a model call still fails after all retries."""
+
+
+class DeadlineExceeded(ModelUnavailableError):
+    """Raised when a model call did not answer before its deadline."""
+
+
+class TokenBucket:
+    """Classic token bucket; `rate` units per second with a burst of `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def try_acquire(self, amount: float = 1.0) -> bool:
+        """Take `amount` only if it is available right now."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < amount:
+            return False
+        self.tokens -= amount
+        return True
+
+
+class FairLimiter:
+    """Concurrency limit whose free slots rotate round-robin over waiting sessions."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._waiters: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(queue) for queue in self._waiters.values())
+
+    def try_acquire(self) -> bool:
+        """Take a free slot without waiting; False when sessions are queued or all slots are busy."""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return True
+        return False
+
+    async def acquire(self, session_id: str) -> None:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(session_id, deque()).append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we were cancelled: pass it on
+                self.release()
+            else:
+                queue = self._waiters.get(session_id)
+                if queue is not None and future in queue:
+                    queue.remove(future)
+                    if not queue:
+                        del self._waiters[session_id]
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            session_id, queue = next(iter(self._waiters.items()))
+            future = queue.popleft()
+            if queue:
+                self._waiters.move_to_end(session_id)
+            else:
+                del self._waiters[session_id]
+            if not future.done():
+                future.set_result(None)  # the slot moves to this waiter
+                return
+        self.active -= 1
+
+
+def _retry_delay(error: Exception, attempt: int) -> Optional[float]:
+    """Seconds to wait before retrying `error`, or None if it is not retryable."""
+    # Imported by the OpenAI provider; a worker without it (e.g. the fake provider) has no openai errors
+    openai = sys.modules.get("openai")
+    if openai is None:
+        return None
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+        pass
+    elif isinstance(error, openai.APIStatusError) and (error.status_code == 429 or error.status_code >= 500):
+        retry_after = error.response.headers.get("retry-after") if error.response is not None else None
+        if retry_after:
+            try:
+                return min(MAX_BACKOFF, float(retry_after))
+            except ValueError:
+                pass
+    else:
+        return None
+    return min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempt) * random.uniform(0.75, 1.25)
+
+
+class _Slot:
+    """
+    A FairLimiter slot held by one call. Once the call has started, the call
+    releases it when it has really finished; a cancelled call running in a
+    thread keeps its slot until the thread returns.
+    """
+
+    def __init__(self, limiter: FairLimiter, held: bool = True):
+        self.limiter = limiter
+        self.held = held
+        self.started = False
+
+    def release(self, *_) -> None:
+        if self.held:
+            self.held = False
+            self.limiter.release()
+
+
+class ModelScheduler:
+    """Fair, rate-limited execution of model calls for one worker."""
+
+    def __init__(self):
+        self.limiters: Dict[str, FairLimiter] = {}
+        self.request_buckets: Dict[str, TokenBucket] = {}
+        self.token_buckets: Dict[str, TokenBucket] = {}
+        self.deadlines: Dict[str, float] = {}
+        self.hedges: Dict[str, HedgePolicy] = {}
+        for kind, defaults in DEFAULT_LIMITS.items():
+            self.configure(kind, *defaults, deadline=DEFAULT_DEADLINES.get(kind, 0.0))
+
+    def configure(self, kind: str, concurrency: int, rpm: int = 0, tpm: int = 0, deadline: float = 0.0) -> None:
+        """Set the limits for a model kind; environment variables take precedence."""
+        prefix = f"SCHEDULER_{kind.upper()}"
+        concurrency = int(os.environ.get(f"{prefix}_CONCURRENCY", concurrency))
+        rpm = int(os.environ.get(f"{prefix}_RPM", rpm))
+        tpm = int(os.environ.get(f"{prefix}_TPM", tpm))
+        self.deadlines[kind] = float(os.environ.get(f"{prefix}_DEADLINE", deadline))
+        self.hedges[kind] = HedgePolicy(kind, enabled=kind in HEDGE_KINDS)
+        limiter = FairLimiter(concurrency)
+        self.limiters[kind] = limiter
+        register_queue(f"model_{kind}", lambda: limiter.waiting)
+        if rpm:
+            per_second = rpm / 60.0 / WORKERS
+            self.request_buckets[kind] = TokenBucket(per_second, max(1.0, per_second * 10))
+        if tpm:
+            per_second = tpm / 60.0 / WORKERS
+            self.token_buckets[kind] = TokenBucket(per_second, per_second * 60)
+
+    def queued(self) -> int:
+        """Calls currently waiting for a slot, over all model kinds."""
+        return sum(limiter.waiting for limiter in self.limiters.values())
+
+    async def run(self, kind: str, session_id: Optional[str], fn: Callable, *args, tokens: int = 0, **kwargs) -> Any:
+        """
+        Execute a model call under the limits for `kind`.
+
+        Args:
+            kind: Model kind ("chat_audio", "transcription", "classifier", ...)
+            session_id: The session the call belongs to (fairness key)
+            fn: Blocking function (run in a thread) or coroutine function
+            tokens: Estimated tokens the call consumes, for the token bucket
+
+        Raises:
+            ModelUnavailableError: If the call still fails after MAX_RETRIES retries
+            DeadlineExceeded: If the call did not answer within the kind's deadline
+        """
+        deadline = self.deadlines.get(kind)
+        call = self._run(kind, session_id or "anonymous", fn, args, kwargs, tokens)
+        if not deadline:
+            return await call
+        try:
+            return await asyncio.wait_for(call, deadline)
+        except asyncio.TimeoutError:
+            record_deadline_exceeded(kind)
+            raise DeadlineExceeded(f"{kind} call exceeded its {deadline:g}s deadline") from None
+
+    async def _run(self, kind: str, key: str, fn: Callable, args: tuple, kwargs: dict, tokens: int) -> Any:
+        limiter = self.limiters[kind]
+        hedge = self.hedges[kind]
+        for attempt in range(MAX_RETRIES + 1):
+            await limiter.acquire(key)
+            slot = _Slot(limiter)
+            backup_slot = _Slot(limiter, held=False)
+            try:
+                if kind in self.request_buckets:
+                    await self.request_buckets[kind].acquire(1)
+                if tokens and kind in self.token_buckets:
+                    await self.token_buckets[kind].acquire(tokens)
+                hedge.on_call()
+                start = time.monotonic()
+                result, _ = await hedged(
+                    partial(self._call, fn, args, kwargs, slot),
+                    partial(self._call, fn, args, kwargs, backup_slot),
+                    hedge.delay(),
+                    partial(self._may_hedge, kind, backup_slot),
+                    kind,
+                )
+                hedge.record(time.monotonic() - start)
+                return result
+            except Exception as e:
+                delay = _retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                if attempt == MAX_RETRIES:
+                    raise ModelUnavailableError(f"{kind} unavailable after {MAX_RETRIES} retries: {e}") from e
+                logger.warning(f"{kind} call failed ({type(e).__name__}), retry {attempt + 1}/{MAX_RETRIES} in {delay:.1f}s")
+                record_retry(kind, type(e).__name__)
+            finally:
+                # Slots of calls that started are released by the calls themselves
+                for held in (slot, backup_slot):
+                    if not held.started:
+                        held.release()
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    async def _call(fn: Callable, args: tuple, kwargs: dict, slot: _Slot) -> Any:
+        slot.started = True
+        if inspect.iscoroutinefunction(fn):
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                slot.release()
+        # Like asyncio.to_thread, but a cancelled call (e.g. the losing hedge) keeps its
+        # slot until its HTTP request has returned, so the per-kind cap holds for real requests
+        future = asyncio.get_running_loop().run_in_executor(
+            None, partial(contextvars.copy_context().run, fn, *args, **kwargs))
+        future.add_done_callback(slot.release)
+        return await asyncio.shield(future)
+
+    def _may_hedge(self, kind: str, slot: _Slot) -> bool:
+        """Take a slot and a request token for a backup call, if the hedge budget allows one."""
+        hedge = self.hedges[kind]
+        if hedge.credit < 1.0 or not self.limiters[kind].try_acquire():
+            return False
+        if kind in self.request_buckets and not self.request_buckets[kind].try_acquire(1):
+            self.limiters[kind].release()
+            return False
+        slot.held = True
+        return hedge.try_spend()
+
+
+class AdmissionController:
+    """Caps active sessions per worker and queues new ones FIFO while saturated."""
+
+    def __init__(self, scheduler: ModelScheduler, max_active: int = MAX_ACTIVE_SESSIONS):
+        self.scheduler = scheduler
+        self.max_active = max_active
+        self.active = 0
+        self._waiting: Deque[asyncio.Future] = deque()
+        register_queue("admission", lambda: len(self._waiting))
+
+    def _has_capacity(self) -> bool:
+        return self.active < self.max_active and self.scheduler.queued() < SATURATION_QUEUE_DEPTH
+
+    async def admit(self, on_wait: Callable[[int], Any], timeout: float = ADMISSION_TIMEOUT) -> bool:
+        """
+        Wait until the session may start.
+
+        Args:
+            on_wait: Coroutine function called with the 1-based queue position while waiting
+            timeout: Give up after this many seconds
+
+        Returns:
+            True once admitted, False on timeout or when the worker is out of memory
+        """
+        if memory_exhausted():
+            record_evicted("memory_limit")
+            return False
+        if not self._waiting and self._has_capacity():
+            self.active += 1
+            return True
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.append(future)
+        deadline = time.monotonic() + timeout
+        last_position = None
+        admitted = False
+        try:
+            while not future.done():
+                position = self._waiting.index(future) + 1
+                if position != last_position:
+                    await on_wait(position)
+                    last_position = position
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 and not future.done():
+                    return False
+                # Re-check periodically: capacity can also free up when model queues drain
+                await asyncio.wait({future}, timeout=min(1.0, max(remaining, 0.0)))
+                self._admit_waiting()
+            admitted = True
+            return True
+        finally:
+            if future.done() and not future.cancelled() and not admitted:
+                # Admitted while being cancelled: give the slot back
+                self.release()
+            elif not future.done():
+                future.cancel()
+            if future in self._waiting:
+                self._waiting.remove(future)
+
+    def _admit_waiting(self) -> None:
+        while self._waiting and self._has_capacity():
+            future = self._waiting.popleft()
+            if not future.done():
+                self.active += 1
+                future.set_result(None)
+
+    def release(self) -> None:
+        """Call when an admitted session ends."""
+        self.active -= 1
+        self._admit_waiting()
+
+
+scheduler = ModelScheduler()
+admission = AdmissionController(scheduler)
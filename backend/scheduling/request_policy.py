@@ -0,0 +1,124 @@
+"""
+Hedged requests for model calls, used by ModelScheduler.run.
+
+A call of a kind in HEDGE_KINDS that has not answered after the
+HEDGE_PERCENTILE-th percentile of the recent latencies of its kind (at least
+HEDGE_MIN_DELAY seconds, once HEDGE_MIN_SAMPLES calls were measured) gets one
+backup request. The first successful answer is used and the other request is
+cancelled. Hedging is capped twice: on average at most HEDGE_BUDGET backup
+requests per call (e.g. 0.05 = 5 %), and a backup is only sent when its kind
+has a free concurrency slot, so hedges never queue ahead of other sessions.
+
+Only idempotent, non-streaming calls can be hedged; the streamed chat_text
+answer is forwarded token by token and is never hedged.
+
+Blocking provider calls run in threads. A cancelled one cannot be interrupted:
+it finishes in the background (bounded by the client's HTTP timeout), its
+result is discarded and its usage is still booked. It also keeps its
+concurrency slot until it has finished (see ModelScheduler._call), so backups
+never push the requests in flight above a kind's cap.
+"""
+import asyncio
+import logging
+import os
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional, Tuple, TypeVar
+
+from backend.observability.telemetry import record_hedge
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+HEDGE_KINDS = {
+    kind for kind in os.environ.get("HEDGE_KINDS", "chat_audio,transcription,classifier,tts").split(",")
+    if kind and kind != "chat_text"
+}
+HEDGE_PERCENTILE = float(os.environ.get("HEDGE_PERCENTILE", "95"))
+HEDGE_BUDGET = float(os.environ.get("HEDGE_BUDGET", "0.05"))
+HEDGE_MIN_SAMPLES = int(os.environ.get("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MIN_DELAY = float(os.environ.get("HEDGE_MIN_DELAY", "0.25"))
+LATENCY_WINDOW = 200
+# Unused budget accumulates up to this many backup requests
+MAX_HEDGE_CREDIT = 5.0
+
+
+class HedgePolicy:
+    """Latency history and hedge budget of one model kind."""
+
+    def __init__(self, kind: str, enabled: bool = True, percentile: float = HEDGE_PERCENTILE,
+                 budget: float = HEDGE_BUDGET, min_samples: int = HEDGE_MIN_SAMPLES, min_delay: float = HEDGE_MIN_DELAY):
+        self.kind = kind
+        self.enabled = enabled and budget > 0
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.credit = 1.0
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, seconds: float) -> None:
+        """Latency of a successful call."""
+        self._latencies.append(seconds)
+
+    def delay(self) -> Optional[float]:
+        """Seconds after which a call gets a backup request, None while hedging is off."""
+        if not self.enabled or len(self._latencies) < self.min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, round(self.percentile / 100.0 * (len(ordered) - 1)))
+        return max(self.min_delay, ordered[index])
+
+    def on_call(self) -> None:
+        self.credit = min(MAX_HEDGE_CREDIT, self.credit + self.budget)
+
+    def try_spend(self) -> bool:
+        if self.credit < 1.0:
+            return False
+        self.credit -= 1.0
+        return True
+
+
+async def hedged(
+    primary: Callable[[], Awaitable[T]],
+    backup: Callable[[], Awaitable[T]],
+    delay: Optional[float],
+    may_hedge: Callable[[], bool],
+    kind: str,
+) -> Tuple[T, bool]:
+    """
+    Run `primary()`; if it has not finished after `delay` seconds and
+    `may_hedge()` allows it, also run `backup()` and take the first successful
+    result. The other call is cancelled.
+
+    Returns:
+        The result and whether it came from the backup request
+    """
+    first = asyncio.ensure_future(primary())
+    second: Optional[asyncio.Future] = None
+    try:
+        if delay is not None:
+            done, _ = await asyncio.wait({first}, timeout=delay)
+            if not done:
+                if may_hedge():
+                    logger.info(f"{kind} call slower than {delay:.2f}s, sending a backup request")
+                    record_hedge(kind, "sent")
+                    second = asyncio.ensure_future(backup())
+                else:
+                    record_hedge(kind, "denied")
+        if second is None:
+            return await first, False
+        pending = {first, second}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception() is None:
+                    if task is second:
+                        record_hedge(kind, "won")
+                    return task.result(), task is second
+        # Both failed: the scheduler retries on the primary's error
+        return first.result(), False
+    finally:
+        for task in (first, second):
+            if task is not None and not task.done():
+                task.cancel()
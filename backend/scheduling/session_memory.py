@@ -0,0 +1,111 @@
+"""
+Memory accounting and eviction of conversation sessions.
+
+Each session counts the bytes of its model context and text history (audio
+turns dominate: the base64 WAV of every recording stays in the context). Once
+a session holds more than SESSION_MEMORY_LIMIT_MB, the audio of its oldest
+user turns is replaced by their transcripts, so long conversations stay
+bounded.
+
+The SessionReaper closes sessions that sit idle between turns for longer than
+SESSION_IDLE_TTL seconds (participants who left the tab open, connections
+that died without a close frame) or that are open longer than SESSION_MAX_AGE,
+and records their session_end. Both are checked every SESSION_REAPER_INTERVAL
+seconds; 0 disables a limit.
+
+WORKER_MEMORY_LIMIT_MB caps the resident memory of a worker: above it new
+sessions are refused (the client is told to try again) before the container
+is OOM-killed with all its conversations.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Mapping
+
+from backend.observability.telemetry import record_evicted, record_memory
+
+logger = logging.getLogger(__name__)
+
+SESSION_MEMORY_LIMIT_MB = float(os.environ.get("SESSION_MEMORY_LIMIT_MB", "64"))
+SESSION_IDLE_TTL = float(os.environ.get("SESSION_IDLE_TTL", "900"))
+SESSION_MAX_AGE = float(os.environ.get("SESSION_MAX_AGE", "7200"))
+SESSION_REAPER_INTERVAL = float(os.environ.get("SESSION_REAPER_INTERVAL", "30"))
+WORKER_MEMORY_LIMIT_MB = float(os.environ.get("WORKER_MEMORY_LIMIT_MB", "0"))
+
+MB = 1024 * 1024
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def content_bytes(content: Any) -> int:
+    """Approximate size of a message content (strings, lists and dicts of them)."""
+    if isinstance(content, (str, bytes)):
+        return len(content)
+    if isinstance(content, dict):
+        return sum(content_bytes(value) for value in content.values())
+    if isinstance(content, list):
+        return sum(content_bytes(item) for item in content)
+    return 0
+
+
+def process_rss() -> int:
+    """Resident memory of this worker in bytes, 0 where /proc is not available."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def memory_exhausted() -> bool:
+    """True when the worker is above WORKER_MEMORY_LIMIT_MB and must not take new sessions."""
+    if not WORKER_MEMORY_LIMIT_MB:
+        return False
+    rss = process_rss()
+    if rss > WORKER_MEMORY_LIMIT_MB * MB:
+        logger.warning(f"Worker memory {rss / MB:.0f} MB above WORKER_MEMORY_LIMIT_MB={WORKER_MEMORY_LIMIT_MB:.0f}, refusing new sessions")
+        return True
+    return False
+
+
+class SessionReaper:
+    """Periodically evicts idle and overage sessions and reports session memory."""
+
+    def __init__(self, sessions: Mapping[str, Any], idle_ttl: float = SESSION_IDLE_TTL,
+                 max_age: float = SESSION_MAX_AGE, interval: float = SESSION_REAPER_INTERVAL):
+        self.sessions = sessions
+        self.idle_ttl = idle_ttl
+        self.max_age = max_age
+        self.interval = interval
+
+    def sweep(self) -> int:
+        """Expire the sessions over their limits; returns how many."""
+        now = time.monotonic()
+        expired = 0
+        total_bytes = 0
+        for session in list(self.sessions.values()):
+            total_bytes += session.memory()
+            # Sessions in the middle of a turn are bounded by the stage timeouts
+            if session.busy or session.end_reason is not None:
+                continue
+            if self.idle_ttl and now - session.last_activity > self.idle_ttl:
+                reason = "idle_timeout"
+            elif self.max_age and now - session.started > self.max_age:
+                reason = "max_age"
+            else:
+                continue
+            logger.warning(f"Closing session {session.id}: {reason} "
+                           f"(idle {now - session.last_activity:.0f}s, open {now - session.started:.0f}s)")
+            session.expire(reason)
+            record_evicted(reason)
+            expired += 1
+        record_memory(total_bytes, process_rss())
+        return expired
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Session reaper sweep failed: {e}")
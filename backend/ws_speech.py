@@ -6,20 +6,21 @@ import json
 import logging
 import os
 import sys
+import threading
 import time
 import uuid
 import wave
 import pathlib
-from typing import Dict, Any, List, AsyncGenerator
+from functools import partial
+from typing import Callable, Dict, Any, List, AsyncGenerator, Optional, Tuple
 
 import websockets
 from fastapi import FastAPI, Request, Response, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
-from openai import OpenAI
 
 # Import the prompts system
-from backend.prompts.system_prompts import get_prompt
+from backend.prompts.system_prompts import INITIAL_USER_MESSAGE, format_propaganda_info
 
 # Import DynamoDB utilities
 from backend.db_utils.dialogue_db import (
@@ -27,48 +28,98 @@ from backend.db_utils.dialogue_db import (
     save_session_init,
     save_propaganda_analysis,
     save_message,
-    save_session_end
+    save_session_end,
+    save_interruption
 )
 
-# Optionally install and import pydub (requires ffmpeg installed)
-from pydub import AudioSegment
-
 # Import conversation evaluation
-from backend.conversation_evaluation.evaluator import evaluate_conversation
-
-# Ensure the logs directory exists inside the working directory (/app/logs)
-os.makedirs("logs", exist_ok=True)
-
-# Configure logging to save logs to both file and console
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
-    handlers=[
-        logging.FileHandler("logs/app.log", mode="a"),
-        logging.StreamHandler()  # This will print to console
-    ]
+from backend.conversation_evaluation.evaluator import classify_conversation
+from backend.conversation_evaluation.stall_model import get_model as get_stall_model, local_verdict
+
+# Streaming uplink (incremental transcription while the user speaks)
+from backend.audio_processing.streaming_uplink import StreamingUplink, DEFAULT_SAMPLE_RATE
+
+# Silence trimming, downmix and resampling before transcription
+from backend.audio_processing.preprocess import preprocess_for_transcription
+
+# Container detection and lazy WAV conversion for compressed uploads
+from backend.audio_processing.formats import UserAudio
+
+# Experiment routes with their precomputed article, analysis, prompt and opening turns
+from backend.generation.experiment_registry import experiment_registry
+
+# Streamed text cut into sentences and synthesized in parallel
+from backend.generation.sentence_pipeline import pipelined_speech
+
+# Barge-in: cancel the running answer when the user starts speaking
+from backend.generation.barge_in import ClientInbox, SpokenSegment, played_transcript
+
+# One writer per connection, coalescing streamed text deltas
+from backend.generation.outbound import ClientOutbox
+
+# Session state and the stages of a conversation turn
+from backend.generation.turn_pipeline import Session, StageTimeout, UserTurn, run_stage
+
+# Tracing spans and Prometheus metrics
+from backend.observability.telemetry import (
+    begin_turn,
+    observe,
+    refresh_queue_depths,
+    register_queue,
+    render_metrics,
+    session_closed,
+    session_opened,
+    setup_tracing,
+    stage,
 )
-logger = logging.getLogger(__name__)
+from backend.observability.logging_setup import bind_session, queue_depth as logging_queue_depth, setup_logging
+# Per-session token, audio and cost accounting with optional budgets
+from backend.observability.usage_ledger import usage_ledger
+
+# Model backend (OpenAI, Azure or the local fake), selected with MODEL_PROVIDER
+from backend.providers.registry import get_provider, get_transcription_provider
 
-client = OpenAI()
+# Graceful drain of the worker's sessions on SIGTERM
+from backend.scheduling.lifecycle import RECONNECT_AFTER, lifecycle
 
-conversation_sessions: Dict[str, dict] = {}
-text_history: Dict[str, List[Dict[str, str]]] = {}
-PROPAGANDA_WS_URL = "ws://13.48.71.178:8000/ws/analyze_propaganda"
+# Idle-session reaper and per-worker memory cap
+from backend.scheduling.session_memory import SessionReaper
 
-# Map subpage (from origin_url) to cached propaganda result file
-EXPERIMENT_SUBPAGE_MAP = {
-    "/dialogue/positive1": "article1.json",
-    "/dialogue/positive2": "article2.json",
-    "/dialogue/positive3": "article3.json",
-    "/dialogue/negative1": "article1.json",
-    "/dialogue/negative2": "article2.json",
-    "/dialogue/negative3": "article3.json",
-}
+# Admission control and fair, rate-limited scheduling of model calls
+from backend.scheduling.model_scheduler import (
+    DeadlineExceeded,
+    ModelUnavailableError,
+    admission,
+    estimate_tokens,
+    scheduler,
+)
+
+# Queue-based JSON logging to logs/app.log (inside the working directory, /app/logs) and console
+setup_logging()
+logger = logging.getLogger(__name__)
+
+provider = get_provider()
+transcriber = get_transcription_provider()
+
+sessions: Dict[str, Session] = {}
+session_reaper = SessionReaper(sessions)
+# "audio": one gpt-4o-audio-preview call per answer, "pipelined": streamed text + per-sentence TTS
+GENERATION_MODE = os.environ.get("GENERATION_MODE", "audio")
+PROPAGANDA_WS_URL = os.environ.get("PROPAGANDA_WS_URL", "ws://13.48.71.178:8000/ws/analyze_propaganda")
 
 def format_error(message: str) -> Dict[str, str]:
     return {"error": message}
 
+async def send_event(websocket: WebSocket, payload: Dict[str, Any]) -> None:
+    """Send a JSON message to the client through the connection's outbox (text deltas are coalesced)."""
+    outbox = getattr(websocket.state, "outbox", None)
+    if outbox is not None:
+        await outbox.send(payload)
+        return
+    start = time.perf_counter()
+    await websocket.send_json(payload)
+    observe("ws.send", time.perf_counter() - start)
+
 def is_valid_wav(audio_base64: str) -> bool:
     try:
         audio_bytes = base64.b64decode(audio_base64)
@@ -79,35 +130,31 @@ def is_valid_wav(audio_base64: str) -> bool:
     except Exception:
         return False
 
-def ensure_valid_wav(audio_base64: str) -> str:
+async def transcribe_audio(audio_bytes: bytes, filename: str = "audio.wav", session_id: Optional[str] = None,
+                           duration: Optional[float] = None) -> str:
     """
-    Checks if the provided base64 audio is a valid WAV file.
-    If not, it tries to convert the audio (detecting if it is a WebM file)
-    using pydub and returns a valid WAV file as base64.
+    Transcribe an audio file with the provider's transcription model without
+    blocking the event loop. The filename extension tells the provider which
+    container the bytes are in; `duration` is the recording's length in
+    seconds, needed for the usage of compressed uploads.
     """
-    audio_bytes = base64.b64decode(audio_base64)
-    # First try to validate as WAV
-    try:
-        with io.BytesIO(audio_bytes) as audio_file:
-            with wave.open(audio_file, 'rb') as wav_file:
-                wav_file.getparams()
-        return audio_base64
-    except wave.Error:
-        pass
+    with stage("transcription", bytes=len(audio_bytes)):
+        transcript = await scheduler.run(
+            "transcription", session_id, transcriber.transcribe, audio_bytes, filename, duration=duration
+        )
+    return transcript.text
 
-    # If that fails, attempt to convert. Check if the file is actually a WebM file.
-    try:
-        if audio_bytes.startswith(b'\x1A\x45\xDF\xA3'):
-            audio = AudioSegment.from_file(io.BytesIO(audio_bytes), format="webm")
-        else:
-            audio = AudioSegment.from_file(io.BytesIO(audio_bytes))
-        buf = io.BytesIO()
-        audio.export(buf, format="wav")
-        valid_bytes = buf.getvalue()
-        return base64.b64encode(valid_bytes).decode('utf-8')
-    except Exception as e:
-        logger.error("Audio conversion failed: %s", str(e).split('\n')[0])
-        raise ValueError("Audio conversion failed") from e
+async def receive_message(websocket: WebSocket) -> Any:
+    """
+    Receive the next client message. Text frames are decoded as JSON,
+    binary frames (streamed audio chunks) are returned as bytes.
+    """
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    if message.get("bytes") is not None:
+        return message["bytes"]
+    return json.loads(message["text"])
 
 async def detect_propaganda(input_article: str) -> Dict[str, Any]:
     logger.info("Starting propaganda detection...")
@@ -117,43 +164,49 @@ async def detect_propaganda(input_article: str) -> Dict[str, Any]:
         "text": input_article
     }
     results: List[Dict[str, Any]] = []
-    try:
-        async with websockets.connect(PROPAGANDA_WS_URL) as websocket:
-            logger.info("Connected to propaganda detection service")
-            await websocket.send(json.dumps(data))
-            async for message in websocket:
-                try:
-                    result = json.loads(message)
-                    results.append(result)
-                    logger.info("Received propaganda detection result")
-                except json.JSONDecodeError:
-                    logger.error("Received invalid JSON from propaganda service")
-    except websockets.exceptions.ConnectionClosed as e:
-        logger.error("Propaganda service connection closed")
+    with stage("propaganda.detect", article_chars=len(input_article)):
+        try:
+            async with websockets.connect(PROPAGANDA_WS_URL) as websocket:
+                logger.info("Connected to propaganda detection service")
+                await websocket.send(json.dumps(data))
+                async for message in websocket:
+                    try:
+                        result = json.loads(message)
+                        results.append(result)
+                        logger.info("Received propaganda detection result")
+                    except json.JSONDecodeError:
+                        logger.error("Received invalid JSON from propaganda service")
+        except websockets.exceptions.ConnectionClosed as e:
+            logger.error("Propaganda service connection closed")
     
     logger.info("Propaganda detection completed")
     return results[-1] if results else {}
 
-async def chat_completion_streaming(messages: list) -> AsyncGenerator[Dict[str, Any], None]:
+async def persist(save: Callable[..., Any], session_id: str, *args, **kwargs) -> None:
+    """Persist stage for one blocking DynamoDB write, timed as db.<function>; failures are logged, not raised."""
+    try:
+        await run_stage(
+            "persist", asyncio.to_thread(save, session_id, *args, **kwargs), metric=f"db.{save.__name__}", session_id=session_id
+        )
+    except Exception as e:
+        logger.error(f"DB ERROR: {save.__name__} failed - ID: {session_id}, Error: {str(e)}")
+
+async def chat_completion_streaming(messages: list, session_id: Optional[str] = None) -> AsyncGenerator[Dict[str, Any], None]:
     start_time = time.time()
     def blocking_stream():
         logger.info("Generating assistant response...")
-        completion = client.chat.completions.create(
-            model="gpt-4o-audio-preview",
-            modalities=["text", "audio"],
-            audio={"voice": "alloy", "format": "wav"},
-            messages=messages
-        )
-        transcript = completion.choices[0].message.audio.transcript
-        audio_data = completion.choices[0].message.audio.data
-        audio_id = completion.choices[0].message.audio.id
+        reply = provider.chat_audio(messages)
+        transcript = reply.transcript
+        audio_data = reply.audio
+        audio_id = reply.audio_id
         
         # Calculate audio duration from WAV data
         audio_duration = None
         try:
             audio_bytes = base64.b64decode(audio_data)
-            with io.BytesIO(audio_bytes) as audio_file:
-                # Use pydub to calculate duration
+            with io.BytesIO(audio_bytes) as audio_file, stage("generation.audio_duration"):
+                # Use pydub to calculate duration (imported here, it warns at import without ffmpeg)
+                from pydub import AudioSegment
                 audio = AudioSegment.from_file(audio_file, format="wav")
                 audio_duration = len(audio) / 1000.0  # pydub returns duration in milliseconds
                 logger.info(f"Audio duration from pydub: {audio_duration:.2f} seconds")
@@ -172,7 +225,8 @@ async def chat_completion_streaming(messages: list) -> AsyncGenerator[Dict[str,
             "audio_duration": audio_duration
         }
     
-    stream_data = await asyncio.to_thread(blocking_stream)
+    with stage("generation.model_call"):
+        stream_data = await scheduler.run("chat_audio", session_id, blocking_stream, tokens=estimate_tokens(messages))
     
     # Store accumulated text for the transcript
     accumulated_text = ""
@@ -184,7 +238,12 @@ async def chat_completion_streaming(messages: list) -> AsyncGenerator[Dict[str,
         await asyncio.sleep(0.1)
     
     # Send the audio last without logging
-    yield {"audio": stream_data["audio"], "audio_id": stream_data["audio_id"]}
+    yield {
+        "audio": stream_data["audio"],
+        "audio_id": stream_data["audio_id"],
+        "transcript": stream_data["full_transcript"],
+        "duration": stream_data["audio_duration"]
+    }
     
     # Send the full transcript as a special final event
     yield {"full_transcript": stream_data["full_transcript"]}
@@ -206,6 +265,542 @@ async def chat_completion_streaming(messages: list) -> AsyncGenerator[Dict[str,
         }
     }
 
+async def stream_text(messages: list, session_id: Optional[str] = None) -> AsyncGenerator[str, None]:
+    """Stream the text of the assistant's answer; the blocking stream is consumed in a thread."""
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    # Set when the consumer is gone (e.g. the user interrupted) so the thread stops reading tokens
+    stopped = threading.Event()
+    
+    def blocking_stream():
+        emitted = False
+        texts = provider.stream_text(messages)
+        try:
+            for text in texts:
+                if stopped.is_set():
+                    break
+                emitted = True
+                loop.call_soon_threadsafe(queue.put_nowait, text)
+        except Exception as e:
+            if emitted:
+                # Part of the answer was already sent, a retry would repeat it
+                raise RuntimeError(f"Text stream interrupted: {e}") from e
+            raise
+        finally:
+            texts.close()
+    
+    call = asyncio.create_task(
+        scheduler.run("chat_text", session_id, blocking_stream, tokens=estimate_tokens(messages))
+    )
+    call.add_done_callback(lambda _: queue.put_nowait(None))
+    try:
+        while (text := await queue.get()) is not None:
+            yield text
+        await call
+    finally:
+        stopped.set()
+        call.cancel()
+
+async def synthesize_speech(text: str, session_id: Optional[str] = None) -> bytes:
+    """Text-to-speech for one sentence of the answer, as WAV."""
+    with stage("tts", chars=len(text)):
+        speech = await scheduler.run("tts", session_id, provider.synthesize, text)
+    return speech.audio
+
+async def chat_completion_pipelined(messages: list, session_id: Optional[str] = None) -> AsyncGenerator[Dict[str, Any], None]:
+    """
+    Same events as chat_completion_streaming, but the audio arrives as one segment
+    per sentence (with a "segment" index) while the text is still being generated.
+    """
+    start_time = time.time()
+    full_transcript = ""
+    audio_duration = 0.0
+    first_audio = None
+    logger.info("Generating assistant response (sentence pipeline)...")
+    async for delta in pipelined_speech(
+        stream_text(messages, session_id), partial(synthesize_speech, session_id=session_id)
+    ):
+        if "text" in delta:
+            full_transcript += delta["text"]
+        elif delta["segment"] == 0:
+            first_audio = time.time() - start_time
+            logger.info("Time to first audio: %.2f seconds", first_audio)
+            observe("generation.first_audio", first_audio)
+        audio_duration += delta.get("duration") or 0
+        yield delta
+    logger.info("ASSISTANT: %s", full_transcript)
+    yield {"full_transcript": full_transcript}
+    
+    generation_time = time.time() - start_time
+    logger.info("Model response generation time: %.2f seconds", generation_time)
+    # Playback starts with the first segment and overlaps the rest of the generation
+    yield {
+        "timing": {
+            "model_generation_time": generation_time,
+            "model_audio_duration": audio_duration,
+            "total_response_time": max(generation_time, (first_audio or generation_time) + audio_duration)
+        }
+    }
+
+def generate_response(messages: list, session_id: Optional[str] = None) -> AsyncGenerator[Dict[str, Any], None]:
+    """The assistant's answer with the configured GENERATION_MODE."""
+    if GENERATION_MODE == "pipelined":
+        return chat_completion_pipelined(messages, session_id)
+    return chat_completion_streaming(messages, session_id)
+
+async def serve_opening(opening) -> AsyncGenerator[Dict[str, Any], None]:
+    """Replay a pre-generated opening turn with the same events as chat_completion_streaming."""
+    start_time = time.time()
+    yield {"text": opening.transcript}
+    yield {"audio": opening.audio, "audio_id": None, "transcript": opening.transcript, "duration": opening.audio_duration}
+    yield {"full_transcript": opening.transcript}
+    generation_time = time.time() - start_time
+    yield {
+        "timing": {
+            "model_generation_time": generation_time,
+            "model_audio_duration": opening.audio_duration,
+            "total_response_time": generation_time + (opening.audio_duration or 0)
+        }
+    }
+
+async def relay_answer(
+    websocket: WebSocket,
+    session: Session,
+    answer: AsyncGenerator[Dict[str, Any], None]
+) -> Tuple[str, Optional[float], List[SpokenSegment]]:
+    """
+    Send the deltas of an assistant answer to the client while watching for an
+    interrupt. Other client messages arriving meanwhile are held for the
+    conversation loop.
+    
+    Returns:
+        The transcript (trimmed to what was heard if the user interrupted), the
+        seconds of audio played before the interrupt (None if the answer was
+        not interrupted) and the audio segments sent
+    """
+    inbox = session.inbox
+    start_time = time.time()
+    full_transcript = ""
+    segments: List[SpokenSegment] = []
+    next_delta: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if next_delta is None:
+                next_delta = asyncio.ensure_future(answer.__anext__())
+            incoming = inbox.incoming()
+            await asyncio.wait({next_delta, incoming}, return_when=asyncio.FIRST_COMPLETED)
+            
+            if incoming.done():
+                message = inbox.take()
+                if isinstance(message, dict) and message.get("type") == "interrupt":
+                    played_seconds = float(message.get("played_seconds") or 0)
+                    logger.info(f"User interrupted the answer after {played_seconds:.2f}s of audio, cancelling generation")
+                    elapsed = time.time() - start_time
+                    session.last_model_generation_time = elapsed
+                    session.last_model_audio_duration = played_seconds
+                    session.last_total_response_time = elapsed
+                    return played_transcript(segments, played_seconds), played_seconds, segments
+                inbox.hold(message)
+            
+            if not next_delta.done():
+                continue
+            try:
+                delta = next_delta.result()
+            except StopAsyncIteration:
+                return full_transcript, None, segments
+            next_delta = None
+            
+            # Check if this is the timing yield
+            if "timing" in delta:
+                session.last_model_generation_time = delta["timing"]["model_generation_time"]
+                session.last_model_audio_duration = delta["timing"].get("model_audio_duration")
+                session.last_total_response_time = delta["timing"]["total_response_time"]
+                continue
+            
+            # Check if this is the full transcript yield
+            if "full_transcript" in delta:
+                full_transcript = delta["full_transcript"]
+                continue
+            
+            await send_event(websocket, {"type": "assistant_delta", "payload": delta})
+            if "text" in delta:
+                full_transcript += delta["text"]
+            if "audio" in delta:
+                segments.append(SpokenSegment(delta.get("transcript", ""), delta.get("duration")))
+    finally:
+        # Cancels the model call of an interrupted (or timed out) answer
+        if next_delta is not None and not next_delta.done():
+            next_delta.cancel()
+            await asyncio.wait({next_delta})
+        await answer.aclose()
+
+async def finish_answer(
+    websocket: WebSocket,
+    session: Session,
+    response_id: str,
+    transcript: str,
+    played_seconds: Optional[float],
+    segments: List[SpokenSegment]
+) -> None:
+    """
+    Persist and emit stages of an answer: keep it (or the part heard before an
+    interrupt) in the text history, then store it while the client is told.
+    """
+    if transcript:
+        session.add_text("assistant", transcript)
+    
+    # Save assistant message to DynamoDB with timing info
+    timing_info = session.timing()
+    if played_seconds is not None:
+        timing_info["played_duration"] = played_seconds
+    logger.info(f"DB: Saving assistant message - ID: {session.id}, Gen time: {timing_info['model_generation_time']:.2f}s, Audio duration: {timing_info['model_audio_duration'] or 0:.2f}s, Total: {timing_info['total_response_time']:.2f}s")
+    session.spawn(persist(save_message, session.id, "assistant", transcript, response_id, timing_info,
+                          usage_info=usage_ledger.take_turn(session.id)))
+    
+    # Send the final message with the complete (or heard) transcript
+    await run_stage("emit", send_event(websocket, {
+        "type": "assistant_final" if played_seconds is None else "assistant_interrupted",
+        "payload": {
+            "text": transcript,
+            "id": response_id,
+            "timing": timing_info
+        }
+    }), session_id=session.id)
+    
+    # Update the last response time for the next user response
+    session.last_response_time = time.time()
+    session.last_answer = {
+        "id": response_id,
+        "transcript": transcript,
+        "segments": segments,
+        "interrupted": played_seconds is not None
+    }
+
+async def answer(websocket: WebSocket, session: Session, stream: AsyncGenerator[Dict[str, Any], None], metric: str = "generation") -> None:
+    """Generate stage of a turn, followed by the persist and emit stages of the answer."""
+    response_id = f"assistant_{uuid.uuid4()}"
+    try:
+        full_transcript, played_seconds, segments = await run_stage(
+            "generate", relay_answer(websocket, session, stream), metric=metric, session_id=session.id
+        )
+    except (StageTimeout, DeadlineExceeded) as e:
+        logger.error(f"Answer for session {session.id} abandoned: {e}")
+        await send_event(websocket, format_error("The assistant took too long to answer, please try again."))
+        return
+    await finish_answer(websocket, session, response_id, full_transcript, played_seconds, segments)
+
+async def trim_last_answer(websocket: WebSocket, session: Session, played_seconds: float) -> None:
+    """
+    The user interrupted the playback of an answer that was already sent and
+    stored: trim it in the text history and record the interruption.
+    """
+    last_answer = session.last_answer
+    if last_answer is None or last_answer["interrupted"]:
+        return
+    last_answer["interrupted"] = True
+    transcript = played_transcript(last_answer["segments"], played_seconds)
+    logger.info(f"User interrupted playback after {played_seconds:.2f}s, keeping {len(transcript)} of {len(last_answer['transcript'])} chars")
+    history = session.text_history
+    if history and history[-1]["role"] == "assistant" and history[-1]["content"] == last_answer["transcript"]:
+        if transcript:
+            history[-1]["content"] = transcript
+        else:
+            history.pop()
+    session.spawn(persist(save_interruption, session.id, last_answer["id"], transcript, played_seconds))
+    await send_event(websocket, {
+        "type": "assistant_interrupted",
+        "payload": {"text": transcript, "id": last_answer["id"], "timing": {"played_duration": played_seconds}}
+    })
+
+async def handle_control(websocket: WebSocket, session: Session, message: Any) -> bool:
+    """
+    Client messages that do not start a turn: barge-in after an answer, the
+    streaming uplink's start and audio chunks, and invalid messages. Returns
+    False for the messages that start a turn.
+    """
+    # Barge-in after the answer was fully sent, while its audio was still playing
+    if isinstance(message, dict) and message.get("type") == "interrupt":
+        await trim_last_answer(websocket, session, float(message.get("played_seconds") or 0))
+        return True
+    
+    # Streaming uplink: raw PCM16 chunks arrive as binary frames while the user records
+    if isinstance(message, bytes):
+        if session.uplink is None:
+            await send_event(websocket, format_error("Received audio chunk without 'audio_stream_start'."))
+        else:
+            session.uplink.feed(message)
+        return True
+    if message.get("type") == "audio_stream_start":
+        if session.uplink is not None:
+            session.uplink.cancel()
+        try:
+            session.uplink = StreamingUplink(
+                partial(transcribe_audio, session_id=session.id),
+                int(message.get("sample_rate", DEFAULT_SAMPLE_RATE))
+            )
+        except ValueError as e:
+            session.uplink = None
+            await send_event(websocket, format_error(str(e)))
+            return True
+        logger.info(f"Streaming uplink started for session {session.id} at {session.uplink.sample_rate} Hz")
+        return True
+    if message.get("type") == "audio_stream_stop":
+        if session.uplink is None:
+            await send_event(websocket, format_error("Received 'audio_stream_stop' without 'audio_stream_start'."))
+            return True
+        return False
+    if message.get("type") != "user":
+        await send_event(websocket, format_error("Invalid message type. Expected 'user'."))
+        return True
+    return False
+
+def frontend_timing(timing: Any) -> Dict[str, float]:
+    """Thinking, recording and response time measured by the frontend, as stored with the user message."""
+    if not isinstance(timing, dict):
+        return {}
+    thinking_time = timing.get("thinking_time")  # Time from assistant response to starting recording
+    recording_duration = timing.get("recording_duration")  # Duration of recording
+    total_response_time = timing.get("total_response_time")  # Total time from assistant response to end of recording
+    logger.info(f"Received timing from frontend - Thinking: {thinking_time}, Recording: {recording_duration}, Total: {total_response_time}")
+    timing_info = {}
+    if thinking_time is not None:
+        timing_info["thinking_time"] = thinking_time
+    if recording_duration is not None:
+        timing_info["recording_duration"] = recording_duration
+    if total_response_time is not None:
+        timing_info["total_response_time"] = total_response_time
+    return timing_info
+
+async def ingest(websocket: WebSocket, session: Session, user_msg: Dict[str, Any]) -> Optional[UserTurn]:
+    """
+    Ingest stage: turn a 'user' message, or the end of a streamed recording,
+    into a UserTurn with preprocessed audio and a running transcription.
+    Returns None after telling the client why the message cannot be used.
+    """
+    audio_stats = {}
+    streamed_transcript = None
+    if user_msg.get("type") == "audio_stream_stop":
+        uplink, session.uplink = session.uplink, None
+        stop_time = time.time()
+        with stage("uplink.finish", session_id=session.id):
+            streamed_transcript, speech_wav = await uplink.finish()
+        logger.info(f"Streaming uplink finished for session {session.id}: {uplink.received_bytes} bytes received, transcript ready {time.time() - stop_time:.3f}s after stop")
+        if speech_wav is None:
+            await send_event(websocket, format_error("No speech detected in recording."))
+            return None
+        with stage("audio.preprocess"):
+            preprocessed = await asyncio.to_thread(preprocess_for_transcription, speech_wav)
+        if preprocessed.is_empty:
+            await send_event(websocket, format_error("No speech detected in recording."))
+            return None
+        audio_stats = {
+            "original_bytes": uplink.received_bytes,
+            "sent_bytes": len(preprocessed.wav_bytes),
+            "bytes_saved": uplink.received_bytes - len(preprocessed.wav_bytes),
+            "original_duration": uplink.received_bytes / 2 / uplink.sample_rate,
+            "speech_duration": preprocessed.speech_duration
+        }
+        # Continue as a regular audio turn, the transcript is already known
+        user_msg = {
+            "type": "user",
+            "content": [{
+                "type": "input_audio",
+                "input_audio": {"data": base64.b64encode(preprocessed.wav_bytes).decode("utf-8"), "format": "wav"}
+            }],
+            "timing": user_msg.get("timing")
+        }
+    
+    user_content = user_msg.get("content")
+    if not user_content:
+        await send_event(websocket, format_error("No content provided in user message."))
+        return None
+    turn = UserTurn(f"user_{uuid.uuid4()}", user_content, frontend_timing(user_msg.get("timing")), audio_stats)
+    if streamed_transcript is not None:
+        turn.transcript = streamed_transcript
+        return turn
+    if isinstance(user_content, list):
+        for content_item in user_content:
+            audio_info = content_item.get("input_audio") if content_item.get("type") == "input_audio" else None
+            if audio_info and audio_info.get("data"):
+                # Process audio without logging the data
+                if not await ingest_audio(websocket, session, turn, audio_info):
+                    return None
+                break
+    return turn
+
+async def ingest_audio(websocket: WebSocket, session: Session, turn: UserTurn, audio_info: Dict[str, Any]) -> bool:
+    """
+    Decode and preprocess an uploaded recording in place for the chat model and
+    start its transcription. Returns False after reporting unusable or empty audio.
+    """
+    user_audio = UserAudio(base64.b64decode(audio_info["data"]))
+    try:
+        # The chat model needs PCM audio in any case: decode once and check it
+        # for speech before any API call
+        if user_audio.format != "wav":
+            with stage("audio.convert", audio_format=user_audio.format or "unknown"):
+                await asyncio.to_thread(user_audio.wav)
+        with stage("audio.preprocess"):
+            preprocessed = await asyncio.to_thread(preprocess_for_transcription, user_audio.wav())
+        # Drop recordings without speech before any API call
+        if preprocessed.is_empty:
+            await send_event(websocket, format_error("No speech detected in recording."))
+            return False
+        
+        # Compressed uploads go to the transcription model as is; the chat model
+        # gets the trimmed 16 kHz recording
+        transcription_bytes, filename = user_audio.transcription_payload(preprocessed.wav_bytes)
+        turn.audio_stats = {
+            "original_bytes": len(user_audio.data),
+            "sent_bytes": len(transcription_bytes),
+            "bytes_saved": len(user_audio.data) - len(transcription_bytes),
+            "original_duration": preprocessed.original_duration,
+            "speech_duration": preprocessed.speech_duration
+        }
+        # Transcription is billed by the seconds sent: the whole compressed upload or the trimmed WAV
+        duration = preprocessed.speech_duration if filename == "audio.wav" else preprocessed.original_duration
+        logger.info(f"Transcribing user audio ({filename}, {len(transcription_bytes)} bytes, {duration:.2f}s)...")
+        turn.transcription = asyncio.create_task(
+            transcribe_audio(transcription_bytes, filename, session_id=session.id, duration=duration)
+        )
+        model_audio, model_format = preprocessed.wav_bytes, "wav"
+    except (ValueError, EOFError, wave.Error) as e:
+        if turn.transcription is not None:
+            turn.transcription.cancel()
+        logger.error("Audio conversion failed: %s", e)
+        await send_event(websocket, format_error("Audio conversion failed"))
+        return False
+    audio_info["data"] = base64.b64encode(model_audio).decode("utf-8")
+    audio_info["format"] = model_format
+    return True
+
+async def transcribe(turn: UserTurn) -> Optional[str]:
+    """Transcribe stage: the participant's words, None if the transcription failed."""
+    if turn.transcription is not None:
+        try:
+            turn.transcript = await turn.transcription
+        except Exception as e:
+            logger.error(f"Failed to transcribe audio: {e}")
+            # Continue even if transcription fails
+    return turn.transcript
+
+async def classify(session: Session) -> Optional[str]:
+    """Classify stage: why the conversation should end instead of being answered, or None."""
+    logger.debug(f"Text history for session {session.id}: {len(session.text_history)} messages")
+    history = list(session.text_history)
+    # The local model answers confident cases in-process; the rest go to the LLM
+    with stage("classification.local", session_id=session.id):
+        is_stalled = local_verdict(history)
+    if is_stalled is None:
+        with stage("classification", session_id=session.id):
+            try:
+                is_stalled = await scheduler.run(
+                    "classifier", session.id, classify_conversation, history, tokens=estimate_tokens(history)
+                )
+            except Exception as e:
+                logger.error(f"Classification failed: {e}")
+                is_stalled = 0  # Default to active if classification fails
+    logger.info(f"Conversation stalled: {is_stalled}")
+    if is_stalled:
+        logger.warning(f"Conversation for session {session.id} appears to be stalled")
+        return "conversation_stalled"
+    exceeded_budget = usage_ledger.over_budget(session.id)
+    if exceeded_budget:
+        logger.warning(f"Session {session.id} exceeded its {exceeded_budget}, ending the conversation")
+        return "budget_exceeded"
+    return None
+
+async def run_turn(websocket: WebSocket, session: Session, user_msg: Dict[str, Any]) -> Optional[str]:
+    """
+    One participant turn through the pipeline. Returns the reason to end the
+    conversation, or None once the turn is done (answered or rejected).
+    """
+    try:
+        turn = await run_stage("ingest", ingest(websocket, session, user_msg), session_id=session.id)
+    except StageTimeout as e:
+        logger.error(f"Recording of session {session.id} dropped: {e}")
+        await send_event(websocket, format_error("Processing the recording took too long, please try again."))
+        return None
+    if turn is None:
+        return None
+    try:
+        await run_stage("transcribe", transcribe(turn), session_id=session.id)
+    except StageTimeout as e:
+        logger.error(f"Failed to transcribe audio: {e}")
+    
+    # Keep the full content (including audio) for the conversation context
+    text = turn.text()
+    session.add_message("user", turn.content, text)
+    logger.info("Appended user message to conversation. Total messages: %d", len(session.messages))
+    
+    # The user message is stored and its transcript shown while the conversation is classified
+    if turn.timing:
+        logger.info(f"DB: Saving user message - ID: {session.id}, Timing: {turn.timing}")
+    # Only save the transcript text, not the audio content
+    session.spawn(persist(save_message, session.id, "user", turn.transcript or turn.content, turn.message_id,
+                          turn.timing, turn.audio_stats))
+    emitted = None
+    if turn.transcript:
+        logger.info(f"USER: {turn.transcript}")
+        emitted = asyncio.create_task(run_stage("emit", send_event(websocket, {
+            "type": "user_transcript",
+            "payload": {
+                "text": turn.transcript,
+                "transcript": turn.transcript,
+                "item_id": turn.message_id
+            }
+        }), session_id=session.id))
+    try:
+        end_reason = await run_stage("classify", classify(session), session_id=session.id)
+    except StageTimeout as e:
+        logger.error(f"Classification failed: {e}")
+        end_reason = None
+    finally:
+        if emitted is not None:
+            await emitted
+    if end_reason:
+        return end_reason
+    
+    logger.info("Processing user input...")
+    await answer(websocket, session, generate_response(session.messages, session.id))
+    logger.info("Sent complete assistant response")
+    return None
+
+def closing_event(reason: str) -> Dict[str, Any]:
+    """What the client is told when the server ends its session."""
+    if reason == "server_shutdown":
+        return {
+            "type": "server_restart",
+            "payload": {
+                "message": "The server is restarting. Your conversation will start again in a moment...",
+                "retry_after": RECONNECT_AFTER
+            }
+        }
+    return {
+        "type": "conversation_end",
+        "payload": {
+            "message": "The conversation was closed after a long period of inactivity." if reason == "idle_timeout"
+                       else "The conversation reached its maximum duration.",
+            "reason": reason
+        }
+    }
+
+async def end_session(session: Session, reason: str) -> None:
+    """Store the end of the session once the writes of its turns are done."""
+    await session.settle()
+    logger.info(f"DB: Saving session end - ID: {session.id}, Reason: {reason}")
+    await persist(save_session_end, session.id, reason, usage_ledger.summary(session.id))
+
+async def close_by_server(websocket: WebSocket, session: Session) -> None:
+    """Record the end of a session the server closed and tell the client if it is still there."""
+    await end_session(session, session.end_reason)
+    try:
+        await run_stage("emit", send_event(websocket, closing_event(session.end_reason)), session_id=session.id)
+        code = 1012 if session.end_reason == "server_shutdown" else 1000
+        await run_stage("emit", websocket.close(code=code), session_id=session.id)
+    except Exception:
+        pass
+
 app = FastAPI()
 
 app.add_middleware(
@@ -216,38 +811,113 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize DynamoDB on startup
+# Startup only does what the first session cannot do without; the rest warms up in the background
 @app.on_event("startup")
 async def startup_event():
-    initialize_db()
-    logger.info("DynamoDB initialized")
+    experiment_registry.load()
+    # Sessions write to the table from their first message on, so it must exist before the worker accepts them
+    with stage("startup.dynamodb"):
+        await asyncio.to_thread(initialize_db)
+    setup_tracing()
+    loop = asyncio.get_running_loop()
+    register_queue("thread_pool", lambda: thread_pool_backlog(loop))
+    register_queue("logging", logging_queue_depth)
+    register_queue("uplink_transcriptions", lambda: sum(
+        s.uplink.pending_transcriptions for s in list(sessions.values()) if s.uplink is not None
+    ))
+    if hasattr(transcriber, "batcher"):
+        register_queue("local_transcriptions", lambda: transcriber.batcher.pending)
+    asyncio.create_task(refresh_queue_depths())
+    asyncio.create_task(session_reaper.run())
+    asyncio.create_task(experiment_registry.watch())
+    lifecycle.install(drain_sessions)
+    asyncio.create_task(warm_up())
+
+async def warm_up() -> None:
+    """
+    Load what sessions need after the worker accepts connections: the local
+    stall classifier, model clients or local models, and the first API
+    connection. A session that arrives earlier loads these on first use
+    (imports and model loads are shared, never repeated).
+    """
+    start = time.perf_counter()
+    steps = [("stall_model", get_stall_model), ("provider", provider.warmup)]
+    if transcriber is not provider:
+        steps.append(("transcriber", transcriber.warmup))
+    steps.append(("preconnect", provider.preconnect))
+    for name, step in steps:
+        try:
+            with stage(f"startup.{name}"):
+                await asyncio.to_thread(step)
+        except Exception as e:
+            logger.error(f"Warm-up step {name} failed: {e}")
+    logger.info(f"Worker warmed up in {time.perf_counter() - start:.2f}s")
+
+def thread_pool_backlog(loop: asyncio.AbstractEventLoop) -> int:
+    """Blocking calls waiting for a thread in the loop's default executor (asyncio.to_thread)."""
+    executor = getattr(loop, "_default_executor", None)
+    return executor._work_queue.qsize() if executor is not None else 0
+
+async def drain_sessions(deadline: float) -> None:
+    """
+    End every session of this worker for a shutdown: each one once its running
+    turn is done, the rest at the deadline. Returns when their session_end
+    records are written (or a few seconds after the deadline).
+    """
+    loop = asyncio.get_running_loop()
+    logger.info(f"Draining {len(sessions)} sessions")
+    while sessions and loop.time() < deadline + 5:
+        for session in list(sessions.values()):
+            if session.end_reason is None and (not session.busy or loop.time() >= deadline):
+                session.expire("server_shutdown")
+        await asyncio.sleep(0.1)
+    if sessions:
+        logger.error(f"{len(sessions)} sessions still open after the drain")
+
+@app.get("/health")
+async def health():
+    """Health check for the load balancer; 503 while the worker drains."""
+    if lifecycle.draining:
+        raise HTTPException(status_code=503, detail="Draining")
+    return {"status": "ok", "sessions": len(sessions)}
+
+@app.get("/metrics")
+async def metrics():
+    rendered = render_metrics()
+    if rendered is None:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    body, content_type = rendered
+    return Response(content=body, media_type=content_type)
 
 @app.websocket("/ws/conversation")
 async def realtime_conversation(websocket: WebSocket):
     session_id = str(uuid.uuid4())
+    bind_session(session_id)
     logger.info(f"New conversation session started: {session_id}")
     await websocket.accept()
-    
-    # Initialize text history for this session
-    text_history[session_id] = []
-    
-    conversation_sessions[session_id] = {
-        "conversation": [],
-        "last_response_time": None,
-        "last_model_generation_time": None,
-        "last_model_audio_duration": None,
-        "last_total_response_time": None
-    }
-    messages = conversation_sessions[session_id]["conversation"]
+    websocket.state.outbox = ClientOutbox(websocket.send_text)
+    if lifecycle.draining:
+        # The worker shuts down: send the client to another one
+        await send_event(websocket, closing_event("server_shutdown"))
+        websocket.state.outbox.close()
+        await websocket.close(code=1012)
+        return
+    session_opened()
+    turn = None
+    admitted = False
+    session = Session(session_id, ClientInbox(partial(receive_message, websocket)))
+    session.task = asyncio.current_task()
+    sessions[session_id] = session
     
     try:
         init_msg = await websocket.receive_json()
+        session.touch()
         if init_msg.get("type") != "start":
-            await websocket.send_json(format_error("Expected 'start' message with article"))
+            await send_event(websocket, format_error("Expected 'start' message with article"))
             return
         article = init_msg.get("article", "")
         if not article:
-            await websocket.send_json(format_error("Article not provided."))
+            await send_event(websocket, format_error("Article not provided."))
             return
             
         # Get the dialogue mode from the message, default to "critical" if not provided
@@ -264,337 +934,148 @@ async def realtime_conversation(websocket: WebSocket):
             
         logger.info("Received article for analysis (length: %d chars)", len(article))
         
-        # Save the initial session information to DynamoDB
-        try:
-            logger.info(f"DB: Saving session init - ID: {session_id}, Mode: {dialogue_mode}, Article: {len(article)} chars")
-            save_session_init(session_id, article, dialogue_mode, origin_url, prolific_id)
-        except Exception as e:
-            logger.error(f"DB ERROR: Failed to save session init - ID: {session_id}, Error: {str(e)}")
+        # Hold the session while the worker is saturated, with feedback to the client
+        async def notify_waiting(position: int):
+            logger.info(f"Session {session_id} waiting for admission, position {position}")
+            await send_event(websocket, {
+                "type": "session_waiting",
+                "payload": {
+                    "position": position,
+                    "message": "Many participants are talking to the assistant right now. Your conversation will start shortly..."
+                }
+            })
+        admitted = await admission.admit(notify_waiting)
+        if not admitted:
+            await send_event(websocket, format_error("The server is busy, please try again in a few minutes."))
+            return
+        turn = begin_turn("initial", session_id=session_id)
+        session.busy = True
+        
+        # Bootstrap: the DB writes and the warm-up of the provider connection run in the
+        # background; the first answer only waits for the analysis and the prompt
+        condition = experiment_registry.match(origin_url)
+        usage_ledger.start(
+            session_id,
+            dialogue_mode=dialogue_mode,
+            article=condition.article if condition else "custom",
+            prolific_id=prolific_id
+        )
+        logger.info(f"DB: Saving session init - ID: {session_id}, Mode: {dialogue_mode}, Article: {len(article)} chars")
+        session.spawn(persist(save_session_init, session_id, article, dialogue_mode, origin_url, prolific_id))
+        session.spawn(asyncio.to_thread(provider.preconnect))
         
         # Get propaganda info for all modes
-        propaganda_result = None
-        cached_file = None
-        if origin_url:
-            for subpage, filename in EXPERIMENT_SUBPAGE_MAP.items():
-                if origin_url.endswith(subpage):
-                    cached_file = filename
-                    break
-        if cached_file:
-            path = pathlib.Path(__file__).parent / "model_output" / cached_file
-            with open(path, "r", encoding="utf-8") as f:
-                propaganda_result = json.load(f)
-            logger.info(f"Loaded cached propaganda result from {cached_file} for subpage {subpage}")
+        if condition:
+            propaganda_result = condition.analysis
+            logger.info(f"Using the precomputed analysis {condition.analysis_file} of {condition.route}")
         else:
             # Not a known experiment subpage, run detection
             propaganda_result = await detect_propaganda(article)
-        propaganda_info = {
-            cat: [
-                {k: entry[k] for k in ['explanation', 'location', 'contextualize'] if k in entry}
-                for entry in entries
-            ]
-            for cat, entries in propaganda_result.get('data', {}).items()
-        }
         
         # Save propaganda analysis results to DynamoDB
-        try:
-            logger.info(f"DB: Saving propaganda analysis - ID: {session_id}, Results: {len(propaganda_result.get('data', {}))} categories")
-            save_propaganda_analysis(session_id, propaganda_result)
-        except Exception as e:
-            logger.error(f"DB ERROR: Failed to save propaganda analysis - ID: {session_id}, Error: {str(e)}")
+        logger.info(f"DB: Saving propaganda analysis - ID: {session_id}, Results: {len(propaganda_result.get('data', {}))} categories")
+        session.spawn(persist(save_propaganda_analysis, session_id, propaganda_result))
         
-        # Get the appropriate system prompt based on mode
+        # Get the appropriate system prompt based on mode (precomputed for experiment routes)
         logger.info(f"Constructing system prompt for mode: {dialogue_mode}")
-        system_prompt = get_prompt(dialogue_mode, article, propaganda_info)
-        logger.info(f"System prompt constructed. {system_prompt}")
-        messages.append({"role": "system", "content": system_prompt})
-        
-        # Store system prompt in text history
-        text_history[session_id].append({
-            "role": "system",
-            "content": system_prompt
-        })
+        with stage("prompt.render"):
+            if condition:
+                system_prompt = condition.prompt_for(experiment_registry, dialogue_mode, article)
+            else:
+                system_prompt = experiment_registry.render(dialogue_mode, article, format_propaganda_info(propaganda_result))
+        logger.info(f"System prompt constructed ({len(system_prompt)} chars)")
+        logger.debug(f"System prompt: {system_prompt}")
+        session.add_message("system", system_prompt, system_prompt)
         
         # Add initial user message to conversation flow (but don't save to DB)
-        initial_user_message = "Please start the conversation."
-        initial_user_content = [{"type": "text", "text": initial_user_message}]
-        messages.append({"role": "user", "content": initial_user_content})
-        
-        # Store initial user message in text history
-        text_history[session_id].append({
-            "role": "user",
-            "content": initial_user_message
-        })
-        
-        logger.info("Generating initial assistant response...")
-        full_transcript = ""
-        response_id = f"assistant_{uuid.uuid4()}"
-        
-        async for delta in chat_completion_streaming(messages):
-            # Check if this is the timing yield
-            if "timing" in delta:
-                conversation_sessions[session_id]["last_model_generation_time"] = delta["timing"]["model_generation_time"]
-                conversation_sessions[session_id]["last_model_audio_duration"] = delta["timing"].get("model_audio_duration")
-                conversation_sessions[session_id]["last_total_response_time"] = delta["timing"]["total_response_time"]
-                continue
-                
-            # Check if this is the full transcript yield
-            if "full_transcript" in delta:
-                full_transcript = delta["full_transcript"]
-                continue
-                
-            await websocket.send_json({"type": "assistant_delta", "payload": delta})
-            if "text" in delta:
-                full_transcript += delta["text"]
-        
-        # Store assistant response in text history
-        text_history[session_id].append({
-            "role": "assistant",
-            "content": full_transcript
-        })
-        
-        # Save assistant message to DynamoDB with timing info
-        timing_info = {
-            "model_generation_time": conversation_sessions[session_id]["last_model_generation_time"],
-            "model_audio_duration": conversation_sessions[session_id].get("last_model_audio_duration"),
-            "total_response_time": conversation_sessions[session_id]["last_total_response_time"]
-        }
-        try:
-            logger.info(f"DB: Saving assistant message - ID: {session_id}, Gen time: {timing_info['model_generation_time']:.2f}s, Audio duration: {timing_info.get('model_audio_duration'):.2f}s, Total: {timing_info['total_response_time']:.2f}s")
-            save_message(session_id, "assistant", full_transcript, response_id, timing_info)
-        except Exception as e:
-            logger.error(f"DB ERROR: Failed to save assistant message - ID: {session_id}, Error: {str(e)}")
+        session.add_message("user", [{"type": "text", "text": INITIAL_USER_MESSAGE}], INITIAL_USER_MESSAGE)
         
-        # Send the final message with the complete transcript
+        # Known experiment articles open with a pre-generated turn instead of a live model call
+        opening = None
+        if condition:
+            with stage("opening_cache.pick", session_id=session_id):
+                opening = await asyncio.to_thread(condition.pick_opening, dialogue_mode, system_prompt)
+        if opening is not None:
+            logger.info(f"Serving pre-generated opening turn {opening.variant} for {condition.article} ({dialogue_mode})")
+            await answer(websocket, session, serve_opening(opening), metric="generation.cached")
+        else:
+            logger.info("Generating initial assistant response...")
+            await answer(websocket, session, generate_response(session.messages, session_id))
         logger.info("Initial assistant response completed")
-        await websocket.send_json({
-            "type": "assistant_final", 
-            "payload": {
-                "text": full_transcript,
-                "id": response_id,
-                "timing": timing_info
-            }
-        })
-        
-        # Update the last response time for the next user response
-        conversation_sessions[session_id]["last_response_time"] = time.time()
+        turn.finish()
+        session.busy = False
+        session.touch()
         
         while True:
-            user_msg = await websocket.receive_json()
-            
-            # Get user response time from frontend if provided
-            thinking_time = None
-            recording_duration = None
-            total_response_time = None
-            if "timing" in user_msg:
-                timing = user_msg["timing"]
-                if isinstance(timing, dict):
-                    thinking_time = timing.get("thinking_time")  # Time from assistant response to starting recording
-                    recording_duration = timing.get("recording_duration")  # Duration of recording
-                    total_response_time = timing.get("total_response_time")  # Total time from assistant response to end of recording
-                    logger.info(f"Received timing from frontend - Thinking: {thinking_time}, Recording: {recording_duration}, Total: {total_response_time}")
-            
-            if user_msg.get("type") != "user":
-                await websocket.send_json(format_error("Invalid message type. Expected 'user'."))
+            user_msg = await session.inbox.receive()
+            session.touch()
+            if await handle_control(websocket, session, user_msg):
                 continue
-                
-            user_content = user_msg.get("content")
-            if not user_content:
-                await websocket.send_json(format_error("No content provided in user message."))
+            turn = begin_turn("user", session_id=session_id)
+            session.busy = True
+            end_reason = await run_turn(websocket, session, user_msg)
+            turn.finish()
+            session.busy = False
+            session.touch()
+            if end_reason is None:
                 continue
             
-            # Generate a unique ID for this user message
-            user_message_id = f"user_{uuid.uuid4()}"
-            
-            # Process any audio content
-            transcript_text = None
-            if isinstance(user_content, list):
-                for content_item in user_content:
-                    if content_item.get("type") == "input_audio":
-                        audio_info = content_item.get("input_audio")
-                        if audio_info and audio_info.get("format") == "wav":
-                            try:
-                                data = audio_info.get("data")
-                                # Process audio without logging the data
-                                audio_info["data"] = ensure_valid_wav(data)
-                                
-                                # We need to perform speech-to-text here to get the transcript
-                                try:
-                                    audio_bytes = base64.b64decode(audio_info["data"])
-                                    with open("temp_audio.wav", "wb") as f:
-                                        f.write(audio_bytes)
-                                    
-                                    # Use OpenAI's Whisper API for transcription
-                                    with open("temp_audio.wav", "rb") as audio_file:
-                                        logger.info("Transcribing user audio...")
-                                        transcript = client.audio.transcriptions.create(
-                                            model="whisper-1",
-                                            file=audio_file,
-                                            language="en"
-                                        )
-                                    
-                                    # Send the transcript to the client for display
-                                    if transcript.text:
-                                        transcript_text = transcript.text
-                                        logger.info(f"USER: {transcript_text}")
-                                        await websocket.send_json({
-                                            "type": "user_transcript",
-                                            "payload": {
-                                                "text": transcript_text,
-                                                "transcript": transcript_text,
-                                                "item_id": user_message_id
-                                            }
-                                        })
-                                except Exception as e:
-                                    logger.error(f"Failed to transcribe audio: {e}")
-                                    # Continue even if transcription fails
-                            except ValueError as e:
-                                logger.error("Audio conversion failed: %s", e)
-                                await websocket.send_json(format_error(str(e)))
-                                continue
-            
-            # Save the user message to DynamoDB with timing info
-            timing_info = {}
-            if thinking_time is not None:
-                timing_info["thinking_time"] = thinking_time
-            if recording_duration is not None:
-                timing_info["recording_duration"] = recording_duration
-            if total_response_time is not None:
-                timing_info["total_response_time"] = total_response_time
-
-            try:
-                if timing_info:
-                    logger.info(f"DB: Saving user message - ID: {session_id}, Timing: {timing_info}")
-                # Only save the transcript text, not the audio content
-                save_message(session_id, "user", transcript_text or user_content, user_message_id, timing_info)
-            except Exception as e:
-                logger.error(f"DB ERROR: Failed to save user message - ID: {session_id}, Error: {str(e)}")
-            
-            # Keep the full content (including audio) for the conversation context
-            messages.append({"role": "user", "content": user_content})
-            logger.info("Appended user message to conversation. Total messages: %d", len(messages))
-            
-            # Store user message in text history right after receiving it
-            if transcript_text:
-                # If we have a transcript, use that
-                text_history[session_id].append({
-                    "role": "user",
-                    "content": transcript_text
-                })
-            elif isinstance(user_content, list):
-                # If it's a list (like with audio), find the text content
-                for item in user_content:
-                    if item.get("type") == "text":
-                        text_history[session_id].append({
-                            "role": "user",
-                            "content": item.get("text")
-                        })
-                        break
-            
-            # Get the assistant response with transcript
-            logger.info("Processing user input...")
-            full_transcript = ""
-            response_id = f"assistant_{uuid.uuid4()}"
-            
-            # Check if conversation has stalled before generating response
-            logger.info(f"Text history for session:{session_id}:", "\n", text_history[session_id])
-            is_stalled = evaluate_conversation(text_history[session_id])
-            logger.info(f"Conversation stalled: {is_stalled}")
-            
-            if is_stalled:
-                logger.warning(f"Conversation for session {session_id} appears to be stalled")
-                # Send final message to frontend
-                await websocket.send_json({
-                    "type": "conversation_end",
-                    "payload": {
-                        "message": "Thank you for participating in our experiment. Your feedback and engagement have been valuable. The conversation will now end.",
-                        "reason": "conversation_stalled"
-                    }
-                })
-                # Save session end with stalled reason
-                try:
-                    logger.info(f"DB: Saving session end - ID: {session_id}, Reason: conversation_stalled")
-                    save_session_end(session_id, "conversation_stalled")
-                except Exception as e:
-                    logger.error(f"DB ERROR: Failed to save session end - ID: {session_id}, Error: {str(e)}")
-                # Clean up the session
-                del text_history[session_id]
-                del conversation_sessions[session_id]
-                return
-            
-            # If not stalled, proceed with normal assistant response
-            async for delta in chat_completion_streaming(messages):
-                # Check if this is the timing yield
-                if "timing" in delta:
-                    conversation_sessions[session_id]["last_model_generation_time"] = delta["timing"]["model_generation_time"]
-                    conversation_sessions[session_id]["last_model_audio_duration"] = delta["timing"].get("model_audio_duration")
-                    conversation_sessions[session_id]["last_total_response_time"] = delta["timing"]["total_response_time"]
-                    continue
-                    
-                # Check if this is the full transcript yield
-                if "full_transcript" in delta:
-                    full_transcript = delta["full_transcript"]
-                    continue
-                
-                await websocket.send_json({"type": "assistant_delta", "payload": delta})
-                if "text" in delta:
-                    full_transcript += delta["text"]
-            
-            # Store assistant response in text history
-            text_history[session_id].append({
-                "role": "assistant",
-                "content": full_transcript
-            })
-            
-            # Save assistant message to DynamoDB with timing info
-            timing_info = {
-                "model_generation_time": conversation_sessions[session_id]["last_model_generation_time"],
-                "model_audio_duration": conversation_sessions[session_id].get("last_model_audio_duration"),
-                "total_response_time": conversation_sessions[session_id]["last_total_response_time"]
-            }
-            try:
-                logger.info(f"DB: Saving assistant message - ID: {session_id}, Gen time: {timing_info['model_generation_time']:.2f}s, Audio duration: {timing_info.get('model_audio_duration'):.2f}s, Total: {timing_info['total_response_time']:.2f}s")
-                save_message(session_id, "assistant", full_transcript, response_id, timing_info)
-            except Exception as e:
-                logger.error(f"DB ERROR: Failed to save assistant message - ID: {session_id}, Error: {str(e)}")
-            
-            # Send the final message with the complete transcript
-            logger.info("Sent complete assistant response")
-            await websocket.send_json({
-                "type": "assistant_final", 
+            # Send final message to frontend
+            await send_event(websocket, {
+                "type": "conversation_end",
                 "payload": {
-                    "text": full_transcript,
-                    "id": response_id,
-                    "timing": timing_info
+                    "message": "Thank you for participating in our experiment. Your feedback and engagement have been valuable. The conversation will now end.",
+                    "reason": end_reason
                 }
             })
-            
-            # Update the last response time for the next user response
-            conversation_sessions[session_id]["last_response_time"] = time.time()
+            # Save session end with the reason
+            await end_session(session, end_reason)
+            return
     
     except WebSocketDisconnect:
         logger.info(f"WebSocket disconnected for session {session_id}")
         # Log the final text history
         logger.info(f"Text history for session {session_id}:")
-        for msg in text_history[session_id]:
-            logger.info(f"{msg['role'].upper()}: {msg['content']}")
-        # Clean up the text history
-        del text_history[session_id]
+        for msg in session.text_history:
+            if msg["role"] != "system":
+                logger.info(f"{msg['role'].upper()}: {msg['content']}")
         # Save session end with normal disconnection reason
+        await end_session(session, "client_disconnected")
+    except asyncio.CancelledError:
+        if session.end_reason is None:
+            raise
+        # Closed by the idle reaper or the shutdown drain. The close runs as its own task: it does not
+        # depend on this task's cancellation state, and a second cancel cannot cut it short
+        logger.info(f"Session {session_id} closed by the server: {session.end_reason}")
+        await asyncio.shield(asyncio.ensure_future(close_by_server(websocket, session)))
+    except ModelUnavailableError as e:
+        logger.error(f"Model unavailable for session {session_id}: {e}")
+        await end_session(session, "model_unavailable")
         try:
-            reason = "client_disconnected"
-            logger.info(f"DB: Saving session end - ID: {session_id}, Reason: {reason}")
-            save_session_end(session_id, reason)
-        except Exception as e:
-            logger.error(f"DB ERROR: Failed to save session end - ID: {session_id}, Error: {str(e)}")
+            await send_event(websocket, format_error("The assistant is overloaded right now, please try again in a few minutes."))
+        except Exception:
+            pass
     except Exception as e:
         logger.exception(f"Error during realtime conversation for session {session_id}")
         # Save session end with error reason
-        save_session_end(session_id, f"error: {str(e)}")
+        await end_session(session, f"error: {str(e)}")
         # Try to notify client about the error
         try:
-            await websocket.send_json(format_error(str(e)))
+            await send_event(websocket, format_error(str(e)))
         except:
             pass
+    finally:
+        if admitted:
+            admission.release()
+        if turn is not None:
+            turn.finish()
+        if session.uplink is not None:
+            session.uplink.cancel()
+        sessions.pop(session_id, None)
+        session.inbox.close()
+        websocket.state.outbox.close()
+        usage_ledger.finish(session_id)
+        session_closed()
 
 if __name__ == "__main__":
     logger.info("Starting server on 0.0.0.0:8080")
@@ -2,6 +2,10 @@
 
 import { useState, useRef, useEffect } from "react";
 import dynamic from 'next/dynamic';
+import config from '../utils/config';
+
+// Sample rates the server accepts for the streaming uplink
+const UPLINK_SAMPLE_RATES = [16000, 24000, 44100, 48000];
 
 // Dynamically import confetti to avoid SSR issues
 const ReactConfetti = dynamic(() => import('react-confetti'), {
@@ -43,6 +47,7 @@ export default function DialogueChatConfigurable({ websocketUrl, promptConfig, i
   const [audioFinished, setAudioFinished] = useState(false);
   const [showTranscript, setShowTranscript] = useState(true); // Always show transcript panel
   const [audioStarted, setAudioStarted] = useState(false);
+  const [audioSegment, setAudioSegment] = useState(0); // Remounts the player for each segment
   const [pendingAssistantResponse, setPendingAssistantResponse] = useState(""); // Buffer for current assistant response until audio finishes
 
   // Timing state
@@ -53,8 +58,40 @@ export default function DialogueChatConfigurable({ websocketUrl, promptConfig, i
   const wsRef = useRef(null);
   const recorderRef = useRef(null);
   const streamRef = useRef(null);
+  const uplinkRef = useRef(null); // AudioContext and processor of the streaming uplink
   const transcriptRef = useRef(null);
 
+  // Sentence-pipelined answers arrive as several audio segments that play back to back
+  const audioQueueRef = useRef([]);
+  const segmentsPendingRef = useRef(false);
+  const segmentPlayingRef = useRef(false);
+  // Barge-in: seconds of the current answer already played, and whether the user interrupted it
+  const audioElementRef = useRef(null);
+  const playedSecondsRef = useRef(0);
+  const interruptedRef = useRef(false);
+
+  // Called when the assistant's audio has finished playing
+  const finishAssistantAudio = (responseText) => {
+    // Enable recording when audio finishes
+    setAudioFinished(true);
+    
+    // Add the assistant response to the transcript
+    if (responseText) {
+      setTranscript(prev => [
+        ...prev,
+        {
+          id: `assistant_${Date.now()}`,
+          role: "assistant",
+          content: responseText,
+          final: true
+        }
+      ]);
+    }
+    
+    // Update the assistant response time when audio finishes
+    setAssistantResponseTime(Date.now());
+  };
+
   // Auto-scroll the transcript to bottom
   useEffect(() => {
     if (transcriptRef.current) {
@@ -106,6 +143,9 @@ export default function DialogueChatConfigurable({ websocketUrl, promptConfig, i
       console.log("WebSocket message received:", msgType, payload);
 
       if (msgType === "assistant_delta") {
+        // Deltas still in flight when the user interrupted are dropped
+        if (interruptedRef.current) return;
+        
         // Handle text and audio in parallel - audio can come in first message or later
         
         // Store text in the pending response until audio finishes
@@ -124,23 +164,68 @@ export default function DialogueChatConfigurable({ websocketUrl, promptConfig, i
           const audioSrc = payload.audio.startsWith("data:")
             ? payload.audio
             : `data:audio/wav;base64,${payload.audio}`;
-          setAssistantAudio(audioSrc);
+          if (payload.segment === undefined) {
+            setAssistantAudio(audioSrc);
+          } else if (segmentPlayingRef.current) {
+            // Queue the segment until the previous one has finished playing
+            audioQueueRef.current.push(audioSrc);
+          } else {
+            segmentsPendingRef.current = true;
+            segmentPlayingRef.current = true;
+            setAudioSegment(n => n + 1);
+            setAssistantAudio(audioSrc);
+          }
         }
       } else if (msgType === "assistant_final") {
         // Clear spinner but only allow recording if audio is finished
         setLoadingMessage("");
+        interruptedRef.current = false;
         
         // If there's no audio component, or audio has already finished, enable recording
         if (!assistantAudio) {
           setAudioFinished(true);
         }
         
+        // All segments have arrived; if the last one already finished playing, finish the turn now
+        if (segmentsPendingRef.current) {
+          segmentsPendingRef.current = false;
+          if (!segmentPlayingRef.current) {
+            finishAssistantAudio(payload.text);
+          }
+        }
+        
         // Final assistant message received - store the complete text
         if (payload.text) {
           console.log("Assistant final:", payload.text);
           // Replace pending response with final text if provided
           setPendingAssistantResponse(payload.text);
         }
+      } else if (msgType === "assistant_interrupted") {
+        // The server kept only the part of the answer that was played before the interrupt
+        interruptedRef.current = false;
+        setPendingAssistantResponse("");
+        if (payload.text) {
+          setTranscript(prev => [
+            ...prev,
+            {
+              id: payload.id || `assistant_${Date.now()}`,
+              role: "assistant",
+              content: `${payload.text} …`,
+              final: true
+            }
+          ]);
+        }
+      } else if (msgType === "session_waiting") {
+        // The server is saturated and holds the session until a slot frees up
+        setLoadingMessage(payload.message);
+      } else if (msgType === "server_restart") {
+        // The server worker is shutting down (redeploy): start a new conversation on another one
+        setLoadingMessage(payload.message);
+        ws.onclose = null;
+        setTimeout(() => {
+          setTranscript([]);
+          startConversation();
+        }, (payload.retry_after || 3) * 1000);
       } else if (msgType === "user_transcript") {
         // This follows the OpenAI API conversation.item.input_audio_transcription.completed pattern
         if (payload.text || payload.transcript) {
@@ -218,21 +303,58 @@ export default function DialogueChatConfigurable({ websocketUrl, promptConfig, i
     };
   };
 
-  // Start recording using dynamic import of RecordRTC.
+  // Stream the microphone as PCM16 chunks while recording. Returns false if the
+  // browser's sample rate is not accepted by the server, the caller then records.
+  const startStreamingUplink = (stream) => {
+    const AudioContextClass = window.AudioContext || window.webkitAudioContext;
+    const audioContext = new AudioContextClass();
+    if (!UPLINK_SAMPLE_RATES.includes(audioContext.sampleRate)) {
+      console.warn(`Sample rate ${audioContext.sampleRate} Hz not supported by the uplink, recording instead`);
+      audioContext.close();
+      return false;
+    }
+    const ws = wsRef.current;
+    ws.send(JSON.stringify({ type: "audio_stream_start", sample_rate: audioContext.sampleRate }));
+
+    const source = audioContext.createMediaStreamSource(stream);
+    // 4096 samples are about 85-93 ms at 44.1/48 kHz
+    const processor = audioContext.createScriptProcessor(4096, 1, 1);
+    processor.onaudioprocess = (e) => {
+      const samples = e.inputBuffer.getChannelData(0);
+      const pcm = new Int16Array(samples.length);
+      for (let i = 0; i < samples.length; i++) {
+        const s = Math.max(-1, Math.min(1, samples[i]));
+        pcm[i] = s < 0 ? s * 0x8000 : s * 0x7fff;
+      }
+      if (ws.readyState === WebSocket.OPEN) {
+        ws.send(pcm.buffer);
+      }
+    };
+    source.connect(processor);
+    processor.connect(audioContext.destination);
+    uplinkRef.current = { audioContext, source, processor };
+    return true;
+  };
+
+  // Start recording: stream over the uplink if enabled, otherwise record with RecordRTC (dynamic import).
   const startRecording = async () => {
     try {
-      // Dynamically import RecordRTC and its StereoAudioRecorder.
-      const { default: RecordRTC, StereoAudioRecorder } = await import("recordrtc");
-
       const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
       streamRef.current = stream;
-      const recorder = new RecordRTC(stream, {
-        type: "audio",
-        mimeType: "audio/wav",
-        recorderType: StereoAudioRecorder,
-      });
-      recorderRef.current = recorder;
-      recorder.startRecording();
+      const streaming = config.streamUplink()
+        && wsRef.current && wsRef.current.readyState === WebSocket.OPEN
+        && startStreamingUplink(stream);
+      if (!streaming) {
+        // Dynamically import RecordRTC and its StereoAudioRecorder.
+        const { default: RecordRTC, StereoAudioRecorder } = await import("recordrtc");
+        const recorder = new RecordRTC(stream, {
+          type: "audio",
+          mimeType: "audio/wav",
+          recorderType: StereoAudioRecorder,
+        });
+        recorderRef.current = recorder;
+        recorder.startRecording();
+      }
       setIsRecording(true);
       setRecordingStatus("Recording...");
       setRecordingStartTime(Date.now());
@@ -242,43 +364,94 @@ export default function DialogueChatConfigurable({ websocketUrl, promptConfig, i
     }
   };
 
+  // Barge-in: stop the assistant's audio, tell the server how much was heard and start recording.
+  const interruptAndRecord = () => {
+    const player = audioElementRef.current;
+    const playedSeconds = playedSecondsRef.current + (player ? player.currentTime : 0);
+    if (player) {
+      player.pause();
+    }
+    interruptedRef.current = true;
+    if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
+      wsRef.current.send(JSON.stringify({ type: "interrupt", played_seconds: playedSeconds }));
+    }
+    audioQueueRef.current = [];
+    segmentsPendingRef.current = false;
+    segmentPlayingRef.current = false;
+    setAssistantAudio(null);
+    setAudioStarted(false);
+    setLoadingMessage("");
+    setAssistantResponseTime(Date.now());
+    startRecording();
+  };
+
+  // Reset the UI after recording and return the timing metrics sent with the user turn.
+  const finishRecording = () => {
+    // Stop all tracks from the media stream.
+    if (streamRef.current) {
+      streamRef.current.getTracks().forEach((track) => track.stop());
+    }
+    setIsRecording(false);
+    setRecordingStatus("");
+    setLoadingMessage("Thinking...");
+    
+    // Reset audio state for next response
+    audioQueueRef.current = [];
+    playedSecondsRef.current = 0;
+    segmentsPendingRef.current = false;
+    segmentPlayingRef.current = false;
+    setAssistantAudio(null);
+    setAudioStarted(false);
+    setAudioFinished(false);
+    setPendingAssistantResponse("");
+
+    // Following the OpenAI API pattern, we'll add a temporary placeholder
+    // and wait for the conversation.item.input_audio_transcription.completed event
+    setTranscript(prev => [
+      ...prev,
+      { 
+        id: `placeholder_${Date.now()}`,
+        role: "user", 
+        content: "Processing your audio...", 
+        final: false,
+        isPlaceholder: true
+      }
+    ]);
+
+    // Calculate timing metrics
+    const thinkingTime = (recordingStartTime - assistantResponseTime) / 1000; // Time from assistant response to starting recording
+    const recordingDuration = (Date.now() - recordingStartTime) / 1000; // Duration of recording
+    const totalResponseTime = (Date.now() - assistantResponseTime) / 1000; // Total time from assistant response to end of recording
+    return {
+      thinking_time: thinkingTime,
+      recording_duration: recordingDuration,
+      total_response_time: totalResponseTime
+    };
+  };
+
   // Stop recording, send audio over WebSocket, and show a "Thinking..." spinner.
   const stopRecording = () => {
+    if (uplinkRef.current) {
+      // Streaming uplink: the audio is already on the server, only the stop is left
+      const { audioContext, source, processor } = uplinkRef.current;
+      uplinkRef.current = null;
+      processor.onaudioprocess = null;
+      source.disconnect();
+      processor.disconnect();
+      audioContext.close();
+      const timing = finishRecording();
+      if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
+        wsRef.current.send(JSON.stringify({ type: "audio_stream_stop", timing }));
+      } else {
+        console.error("WebSocket is not open");
+      }
+      return;
+    }
     if (!recorderRef.current) return;
 
     recorderRef.current.stopRecording(() => {
       const wavBlob = recorderRef.current.getBlob();
-      // Stop all tracks from the media stream.
-      if (streamRef.current) {
-        streamRef.current.getTracks().forEach((track) => track.stop());
-      }
-      setIsRecording(false);
-      setRecordingStatus("");
-      setLoadingMessage("Thinking...");
-      
-      // Reset audio state for next response
-      setAssistantAudio(null);
-      setAudioStarted(false);
-      setAudioFinished(false);
-      setPendingAssistantResponse("");
-
-      // Following the OpenAI API pattern, we'll add a temporary placeholder
-      // and wait for the conversation.item.input_audio_transcription.completed event
-      setTranscript(prev => [
-        ...prev,
-        { 
-          id: `placeholder_${Date.now()}`,
-          role: "user", 
-          content: "Processing your audio...", 
-          final: false,
-          isPlaceholder: true
-        }
-      ]);
-
-      // Calculate timing metrics
-      const thinkingTime = (recordingStartTime - assistantResponseTime) / 1000; // Time from assistant response to starting recording
-      const recordingDuration = (Date.now() - recordingStartTime) / 1000; // Duration of recording
-      const totalResponseTime = (Date.now() - assistantResponseTime) / 1000; // Total time from assistant response to end of recording
+      const timing = finishRecording();
 
       // Convert the blob to base64.
       const reader = new FileReader();
@@ -295,11 +468,7 @@ export default function DialogueChatConfigurable({ websocketUrl, promptConfig, i
               },
             },
           ],
-          timing: {
-            thinking_time: thinkingTime,
-            recording_duration: recordingDuration,
-            total_response_time: totalResponseTime
-          }
+          timing
         };
         if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
           wsRef.current.send(JSON.stringify(userMessage));
@@ -314,6 +483,9 @@ export default function DialogueChatConfigurable({ websocketUrl, promptConfig, i
   // Clean up WebSocket connection when the component unmounts.
   useEffect(() => {
     return () => {
+      if (uplinkRef.current) {
+        uplinkRef.current.audioContext.close();
+      }
       if (wsRef.current) {
         wsRef.current.close();
       }
@@ -400,34 +572,35 @@ export default function DialogueChatConfigurable({ websocketUrl, promptConfig, i
               {/* Step 3: Assistant audio response */}
               {assistantAudio && audioStarted && (
                 <audio
+                  key={audioSegment}
+                  ref={audioElementRef}
                   controls
                   autoPlay
                   src={assistantAudio}
                   className="audio-player"
-                  onEnded={() => {
-                    // Enable recording when audio finishes
-                    setAudioFinished(true);
-                    
-                    // Add the assistant response to the transcript
-                    if (pendingAssistantResponse) {
-                      setTranscript(prev => [
-                        ...prev,
-                        {
-                          id: `assistant_${Date.now()}`,
-                          role: "assistant",
-                          content: pendingAssistantResponse,
-                          final: true
-                        }
-                      ]);
+                  onEnded={(event) => {
+                    playedSecondsRef.current += event.currentTarget.duration || 0;
+                    // Play the next queued segment of a pipelined answer
+                    const nextSegment = audioQueueRef.current.shift();
+                    if (nextSegment) {
+                      setAudioSegment(n => n + 1);
+                      setAssistantAudio(nextSegment);
+                      return;
                     }
-                    
-                    // Update the assistant response time when audio finishes
-                    setAssistantResponseTime(Date.now());
+                    segmentPlayingRef.current = false;
+                    // More segments are still on their way
+                    if (segmentsPendingRef.current) return;
+                    finishAssistantAudio(pendingAssistantResponse);
                   }}
                 />
               )}
 
-              {/* Step 4: Recording control */}
+              {/* Step 4: Recording control; the assistant can be interrupted while it is speaking */}
+              {assistantAudio && audioStarted && !audioFinished && !isRecording && !conversationEnded && (
+                <button onClick={interruptAndRecord} className="button">
+                  Interrupt &amp; Respond
+                </button>
+              )}
               {audioFinished && !isRecording && !conversationEnded && (
                 <button onClick={startRecording} className="button">
                   Record Response
@@ -14,9 +14,16 @@ const getWebsocketUrl = () => {
     : 'wss://21b5-16-170-227-168.ngrok-free.app/ws/conversation';
 };
 
+// Stream the microphone to the server while recording instead of uploading
+// the whole recording on stop (set NEXT_PUBLIC_STREAM_UPLINK=true at build time)
+const streamUplink = () => {
+  return process.env.NEXT_PUBLIC_STREAM_UPLINK === 'true';
+};
+
 const config = {
   isDevelopment,
   getWebsocketUrl,
+  streamUplink,
 };
 
 export default config;
\ No newline at end of file
@@ -0,0 +1,15 @@
+import os
+import sys
+import tempfile
+
+# The app and its providers read their configuration at import time
+_tmp = tempfile.mkdtemp(prefix="apollolytics_tests_")
+os.environ.setdefault("MODEL_PROVIDER", "fake")
+os.environ.setdefault("FAKE_TOKEN_INTERVAL", "0")
+for role in ("CHAT_AUDIO", "CHAT_TEXT", "TRANSCRIPTION", "TTS", "CLASSIFIER"):
+    os.environ.setdefault(f"FAKE_LATENCY_{role}", "0.01")
+os.environ.setdefault("LOG_FILE", os.path.join(_tmp, "app.log"))
+os.environ.setdefault("OPENING_CACHE_DIR", os.path.join(_tmp, "opening_turns"))
+os.environ.setdefault("CONTENT_STORE_URL", f"file://{os.path.join(_tmp, 'content_store')}")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,116 @@
+"""Article and analysis bodies are stored once, inline in the table or in the object store."""
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from backend.db_utils import content_store
+from backend.db_utils.content_store import (ContentStore, LocalObjectStore, ObjectStore, ObjectStoreNotConfigured,
+                                           compress, encode_body, is_content_item)
+
+
+@pytest.fixture
+def table(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.delenv("AWS_ENDPOINT_URL", raising=False)
+    with mock_aws():
+        dynamodb = boto3.resource("dynamodb", region_name="eu-north-1")
+        yield dynamodb.create_table(
+            TableName="apollolytics_dialogues_test",
+            KeySchema=[
+                {"AttributeName": "session_id", "KeyType": "HASH"},
+                {"AttributeName": "timestamp", "KeyType": "RANGE"}
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "session_id", "AttributeType": "S"},
+                {"AttributeName": "timestamp", "AttributeType": "N"}
+            ],
+            BillingMode="PAY_PER_REQUEST"
+        )
+
+
+def items(table):
+    return table.scan()["Items"]
+
+
+def test_small_body_is_stored_inline_once(table, tmp_path):
+    store = ContentStore(lambda: table, LocalObjectStore(str(tmp_path)))
+    analysis = {"claims": [{"text": "Prices doubled", "techniques": ["Exaggeration"]}], "score": 0.7}
+
+    ref = store.put(analysis, "propaganda_result")
+    assert ref.startswith("sha256:")
+    # Equal values give the same reference, whatever the key order
+    assert store.put({"score": 0.7, "claims": analysis["claims"]}, "propaganda_result") == ref
+
+    stored = items(table)
+    assert len(stored) == 1 and is_content_item(stored[0])
+    assert "body" in stored[0] and "object_key" not in stored[0]
+    assert not any(tmp_path.iterdir())
+
+    # A fresh store (another worker) reads it from the table
+    assert ContentStore(lambda: table, LocalObjectStore(str(tmp_path))).get(ref) == analysis
+
+
+def test_large_body_overflows_to_the_object_store(table, tmp_path):
+    store = ContentStore(lambda: table, LocalObjectStore(str(tmp_path)), inline_max_bytes=64)
+    article = " ".join(f"Sentence {i} of the article, {os.urandom(8).hex()}." for i in range(200))
+
+    ref = store.put(article, "article")
+    item, = items(table)
+    assert "body" not in item
+    assert (tmp_path / item["object_key"]).is_file()
+    assert item["size"] > item["stored_size"] > 64
+
+    assert ContentStore(lambda: table, LocalObjectStore(str(tmp_path)), inline_max_bytes=64).get(ref) == article
+
+
+def test_existing_body_is_not_written_again(table, tmp_path):
+    ref = ContentStore(lambda: table, LocalObjectStore(str(tmp_path))).put("An article", "article")
+    first, = items(table)
+
+    # Another worker that has not seen the body yet: the conditional write keeps the first item
+    assert ContentStore(lambda: table, LocalObjectStore(str(tmp_path))).put("An article", "article") == ref
+    assert items(table) == [first]
+
+
+def test_unknown_and_corrupt_references(table, tmp_path):
+    store = ContentStore(lambda: table, LocalObjectStore(str(tmp_path)), inline_max_bytes=0)
+    with pytest.raises(ValueError):
+        store.get("md5:abc")
+    with pytest.raises(KeyError):
+        store.get("sha256:" + "0" * 64)
+
+    ref = store.put({"text": "original"}, "article")
+    item, = items(table)
+    other = ContentStore(lambda: table, LocalObjectStore(str(tmp_path)), inline_max_bytes=0)
+    # A body that decompresses fine but does not match its hash
+    (tmp_path / item["object_key"]).write_bytes(compress(encode_body({"text": "tampered"}))[1])
+    with pytest.raises(ValueError, match="corrupt"):
+        other.get(ref)
+
+
+def test_object_keys_stay_inside_the_store(tmp_path):
+    with pytest.raises(ValueError):
+        LocalObjectStore(str(tmp_path)).put("../outside", b"data")
+
+
+def test_large_body_is_refused_without_an_object_store(table, monkeypatch):
+    monkeypatch.setattr(content_store, "CONTENT_STORE_URL", "")
+    store = ContentStore(lambda: table, inline_max_bytes=64)
+
+    assert store.get(store.put("A short article", "article")) == "A short article"
+    with pytest.raises(ObjectStoreNotConfigured):
+        store.put(" ".join(os.urandom(8).hex() for _ in range(100)), "article")
+    # Nothing references the refused body
+    assert len(items(table)) == 1
+
+
+def test_object_store_requires_put_and_get():
+    class ReadOnlyStore(ObjectStore):
+        def get(self, key):
+            return b""
+
+    with pytest.raises(TypeError):
+        ReadOnlyStore()
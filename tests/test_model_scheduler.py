@@ -0,0 +1,166 @@
+"""Rate limits and the fair concurrency limit of the model scheduler."""
+import asyncio
+import threading
+import time
+
+from backend.scheduling import model_scheduler
+from backend.scheduling.model_scheduler import FairLimiter, TokenBucket
+
+
+class Clock:
+    """Stands in for time.monotonic."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_allows_a_burst_then_refills(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(model_scheduler.time, "monotonic", clock)
+    bucket = TokenBucket(rate=2, capacity=4)
+
+    assert bucket.try_acquire(3)
+    assert not bucket.try_acquire(2)
+    clock.now += 0.5  # one unit back
+    assert bucket.try_acquire(2)
+    assert not bucket.try_acquire(1)
+    clock.now += 60  # never more than the capacity
+    assert bucket.try_acquire(4)
+    assert not bucket.try_acquire(1)
+
+
+def test_token_bucket_acquire_waits_for_refill():
+    async def run():
+        bucket = TokenBucket(rate=50, capacity=1)
+        await bucket.acquire()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await bucket.acquire()
+        return loop.time() - started
+
+    assert asyncio.run(run()) >= 0.015
+
+
+def test_token_bucket_acquire_caps_amount_at_capacity():
+    async def run():
+        bucket = TokenBucket(rate=1000, capacity=10)
+        # A request larger than the burst would otherwise wait forever
+        await asyncio.wait_for(bucket.acquire(25), timeout=1)
+
+    asyncio.run(run())
+
+
+def test_fair_limiter_rotates_slots_over_sessions():
+    async def run():
+        limiter = FairLimiter(limit=1)
+        assert limiter.try_acquire()
+        order = []
+
+        async def call(session_id, index):
+            await limiter.acquire(session_id)
+            order.append(f"{session_id}{index}")
+
+        # Session a queues three calls before b and c queue one each
+        tasks = [asyncio.create_task(call("a", i)) for i in range(3)]
+        tasks += [asyncio.create_task(call("b", 0)), asyncio.create_task(call("c", 0))]
+        await asyncio.sleep(0)
+        assert limiter.waiting == 5
+        assert not limiter.try_acquire()
+
+        for _ in range(5):
+            limiter.release()
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        assert order == ["a0", "b0", "c0", "a1", "a2"]
+        assert limiter.active == 1
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(run())
+
+
+def test_fair_limiter_cancelled_waiter_leaves_the_queue():
+    async def run():
+        limiter = FairLimiter(limit=1)
+        await limiter.acquire("a")
+        waiter = asyncio.create_task(limiter.acquire("b"))
+        await asyncio.sleep(0)
+        assert limiter.waiting == 1
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert limiter.waiting == 0
+        limiter.release()
+        assert limiter.active == 0
+        assert limiter.try_acquire()
+
+    asyncio.run(run())
+
+
+def test_fair_limiter_slot_handed_to_cancelled_waiter_is_passed_on():
+    async def run():
+        limiter = FairLimiter(limit=1)
+        await limiter.acquire("a")
+        first = asyncio.create_task(limiter.acquire("b"))
+        second = asyncio.create_task(limiter.acquire("c"))
+        await asyncio.sleep(0)
+        limiter.release()  # the slot goes to b ...
+        first.cancel()  # ... which is cancelled before it runs
+        await asyncio.gather(first, return_exceptions=True)
+        await asyncio.wait_for(second, timeout=1)
+        assert limiter.active == 1 and limiter.waiting == 0
+
+    asyncio.run(run())
+
+
+def test_losing_hedge_keeps_its_slot_until_its_thread_returns():
+    async def run():
+        scheduler = model_scheduler.ModelScheduler()
+        scheduler.configure("classifier", concurrency=2)
+        hedge = scheduler.hedges["classifier"]
+        hedge.enabled, hedge.min_delay = True, 0.02
+        for _ in range(hedge.min_samples):
+            hedge.record(0.01)
+
+        lock = threading.Lock()
+        first_released = threading.Event()
+        in_flight = []
+        peak = []
+        calls = []
+
+        def classify(index):
+            with lock:
+                calls.append(index)
+                first = len(calls) == 1
+                in_flight.append(index)
+                peak.append(len(in_flight))
+            try:
+                # The first request hangs until the test lets it go, its backup answers at once
+                if first:
+                    first_released.wait(5)
+                else:
+                    time.sleep(0.05)
+                return index
+            finally:
+                with lock:
+                    in_flight.remove(index)
+
+        assert await scheduler.run("classifier", "a", classify, 0) == 0
+        assert len(calls) == 2  # the hedge won while the first request is still running
+
+        # With the first request still holding a slot, the other calls run one at a time
+        others = asyncio.gather(*(scheduler.run("classifier", s, classify, i) for i, s in enumerate("bcd", 1)))
+        await asyncio.sleep(0.1)
+        assert scheduler.limiters["classifier"].active == 2
+        first_released.set()
+        assert await others == [1, 2, 3]
+        assert max(peak) <= 2
+        for _ in range(50):
+            if scheduler.limiters["classifier"].active == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert scheduler.limiters["classifier"].active == 0
+
+    asyncio.run(run())
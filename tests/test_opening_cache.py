@@ -0,0 +1,54 @@
+"""Re-generating the opening turns never changes the audio a loaded manifest points to."""
+import base64
+import itertools
+
+import pytest
+
+from backend.generation import opening_cache
+from backend.generation.opening_cache import OpeningCache, pregenerate
+
+SYSTEM_PROMPT = "Discuss the article."
+
+
+class Provider:
+    models = {"chat_audio": "fake-audio"}
+
+
+@pytest.fixture
+def generations(monkeypatch):
+    counter = itertools.count()
+
+    def generate_variant(provider, system_prompt):
+        n = next(counter)
+        return {"transcript": f"opening {n}", "audio_bytes": f"audio {n}".encode(), "audio_duration": 1.0,
+                "generation_time": 0.0}
+
+    monkeypatch.setattr(opening_cache, "generate_variant", generate_variant)
+
+
+def served(cache):
+    turn = cache.pick("article1", "critical", SYSTEM_PROMPT)
+    return turn.transcript, base64.b64decode(turn.audio).decode()
+
+
+def test_regeneration_keeps_loaded_variants_consistent(generations, tmp_path):
+    target = tmp_path / "article1_critical"
+    pregenerate(Provider(), "article1", "critical", SYSTEM_PROMPT, 1, tmp_path)
+    first = OpeningCache(tmp_path)
+    assert first.load() == 1
+    first_files = set(p.name for p in target.glob("*.wav"))
+
+    pregenerate(Provider(), "article1", "critical", SYSTEM_PROMPT, 1, tmp_path)
+    # A worker that has not reloaded yet still serves the old transcript with its own audio
+    assert served(first) == ("opening 0", "audio 0")
+    second = OpeningCache(tmp_path)
+    second.load()
+    assert served(second) == ("opening 1", "audio 1")
+
+    # The generation before the previous one is removed
+    pregenerate(Provider(), "article1", "critical", SYSTEM_PROMPT, 1, tmp_path)
+    remaining = set(p.name for p in target.glob("*.wav"))
+    assert not first_files & remaining
+    assert len(remaining) == 2
+    assert served(second) == ("opening 1", "audio 1")
+    assert not list(target.glob("*.tmp"))
@@ -0,0 +1,79 @@
+"""User recordings are trimmed, normalized and resampled before transcription."""
+import io
+import wave
+
+import numpy as np
+
+from backend.audio_processing.preprocess import (
+    PADDING_MS,
+    TARGET_SAMPLE_RATE,
+    decode_wav,
+    preprocess_for_transcription,
+)
+
+
+def to_wav(samples: np.ndarray, sample_rate: int, channels: int = 1) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes((np.clip(samples, -1.0, 1.0) * 32767.0).astype("<i2").tobytes())
+    return buf.getvalue()
+
+
+def tone(seconds: float, sample_rate: int, amplitude: float = 0.3) -> np.ndarray:
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    return (np.sin(2 * np.pi * 220 * t) * amplitude).astype(np.float32)
+
+
+def silence(seconds: float, sample_rate: int) -> np.ndarray:
+    return np.zeros(int(seconds * sample_rate), dtype=np.float32)
+
+
+def test_silent_recording_is_empty():
+    wav_bytes = to_wav(silence(2.0, 24000), 24000)
+    result = preprocess_for_transcription(wav_bytes)
+    assert result.is_empty
+    assert result.wav_bytes is None
+    assert result.original_bytes == len(wav_bytes)
+    assert result.original_duration == 2.0
+    assert result.speech_duration == 0.0
+
+
+def test_zero_length_recording_is_empty():
+    result = preprocess_for_transcription(to_wav(silence(0, 24000), 24000))
+    assert result.is_empty
+    assert result.original_duration == 0.0
+
+
+def test_too_little_speech_is_empty():
+    # A click of 50 ms is below MIN_SPEECH_MS
+    samples = np.concatenate([silence(1.0, 24000), tone(0.05, 24000), silence(1.0, 24000)])
+    assert preprocess_for_transcription(to_wav(samples, 24000)).is_empty
+
+
+def test_silence_is_trimmed_around_the_speech():
+    sample_rate = 48000
+    samples = np.concatenate([silence(2.0, sample_rate), tone(1.0, sample_rate), silence(3.0, sample_rate)])
+    wav_bytes = to_wav(np.stack([samples, samples], axis=1).reshape(-1), sample_rate, channels=2)
+
+    result = preprocess_for_transcription(wav_bytes)
+    assert not result.is_empty
+    assert result.original_duration == 6.0
+    # The speech plus PADDING_MS on both sides, within a frame
+    assert abs(result.speech_duration - (1.0 + 2 * PADDING_MS / 1000)) < 0.05
+    assert result.bytes_saved > 0.9 * len(wav_bytes)
+
+    processed, processed_rate = decode_wav(result.wav_bytes)
+    assert processed_rate == TARGET_SAMPLE_RATE
+    with wave.open(io.BytesIO(result.wav_bytes), "rb") as wav_file:
+        assert wav_file.getnchannels() == 1 and wav_file.getsampwidth() == 2
+    assert len(processed) / processed_rate == result.speech_duration
+
+
+def test_quiet_speech_is_amplified_within_the_ceiling():
+    result = preprocess_for_transcription(to_wav(tone(1.0, 16000, amplitude=0.02), 16000))
+    processed, _ = decode_wav(result.wav_bytes)
+    peak = float(np.max(np.abs(processed)))
+    assert 0.05 < peak <= 10 ** (-1.0 / 20) + 1e-3
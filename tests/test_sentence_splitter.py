@@ -0,0 +1,44 @@
+"""Streamed answer text is cut into sentences for per-sentence TTS."""
+from backend.generation.sentence_pipeline import SentenceSplitter
+
+
+def feed_all(splitter, chunks):
+    sentences = []
+    for chunk in chunks:
+        sentences.extend(splitter.feed(chunk))
+    return sentences
+
+
+def test_sentence_is_returned_once_its_boundary_arrives():
+    splitter = SentenceSplitter(min_chars=0)
+    assert splitter.feed("The article makes a claim") == []
+    assert splitter.feed(". What do you") == ["The article makes a claim."]
+    assert splitter.feed(" think?") == []
+    assert splitter.feed(" ") == ["What do you think?"]
+    assert splitter.flush() is None
+
+
+def test_boundaries():
+    splitter = SentenceSplitter(min_chars=0)
+    text = 'Really?! He said "stop." Then (after a while) he left.) Next\n\nparagraph'
+    assert splitter.feed(text) == ["Really?!", 'He said "stop."', "Then (after a while) he left.)", "Next"]
+    assert splitter.flush() == "paragraph"
+
+
+def test_abbreviations_do_not_end_a_sentence():
+    splitter = SentenceSplitter(min_chars=0)
+    sentences = feed_all(splitter, ["Dr. Smith cites sources, e.g. ", "polls vs. surveys", ", etc. and more. ", "Done."])
+    assert sentences == ["Dr. Smith cites sources, e.g. polls vs. surveys, etc. and more."]
+    assert splitter.flush() == "Done."
+
+
+def test_short_sentences_are_merged_up_to_min_chars():
+    splitter = SentenceSplitter(min_chars=20)
+    assert splitter.feed("Yes. I see. That is a fair point. ") == ["Yes. I see. That is a fair point."]
+
+
+def test_flush_returns_the_rest_and_resets():
+    splitter = SentenceSplitter(min_chars=0)
+    assert splitter.feed("No boundary yet") == []
+    assert splitter.flush() == "No boundary yet"
+    assert splitter.flush() is None
@@ -0,0 +1,98 @@
+"""Sessions closed by the server (idle reaper, shutdown drain) still store their end and tell the client."""
+import asyncio
+import json
+import types
+
+import pytest
+
+from backend import ws_speech
+
+
+class FakeWebSocket:
+    """The parts of starlette's WebSocket the conversation handler uses."""
+
+    def __init__(self):
+        self.state = types.SimpleNamespace()
+        self.incoming: asyncio.Queue = asyncio.Queue()
+        self.sent = []
+        self.close_code = None
+
+    async def accept(self):
+        pass
+
+    async def receive(self):
+        return await self.incoming.get()
+
+    async def receive_json(self):
+        return json.loads((await self.receive())["text"])
+
+    async def send_text(self, data):
+        self.sent.append(json.loads(data))
+
+    async def send_json(self, payload):
+        self.sent.append(payload)
+
+    async def close(self, code=1000):
+        self.close_code = code
+
+    def types_sent(self):
+        return [event.get("type") for event in self.sent]
+
+
+@pytest.fixture(scope="module", autouse=True)
+def registry():
+    # Known experiment routes use their cached analysis instead of the propaganda service
+    assert ws_speech.experiment_registry.load()
+
+
+@pytest.fixture
+def ended(monkeypatch):
+    """Session ends passed to the database, which is not touched otherwise."""
+    ends = []
+    for name in ("save_session_init", "save_propaganda_analysis", "save_message", "save_interruption"):
+        monkeypatch.setattr(ws_speech, name, lambda *args, **kwargs: None)
+    monkeypatch.setattr(ws_speech, "save_session_end", lambda session_id, reason, *args: ends.append(reason))
+    return ends
+
+
+async def started_session(websocket):
+    task = asyncio.ensure_future(ws_speech.realtime_conversation(websocket))
+    await websocket.incoming.put({"type": "websocket.receive", "text": json.dumps({
+        "type": "start", "article": "Some article", "mode": "critical",
+        "origin_url": "http://localhost:3000/dialogue/positive1"
+    })})
+    for _ in range(500):
+        if "assistant_final" in websocket.types_sent():
+            break
+        await asyncio.sleep(0.01)
+    assert "assistant_final" in websocket.types_sent()
+    session = next(s for s in ws_speech.sessions.values() if s.task is task)
+    return task, session
+
+
+def test_idle_session_is_closed(ended):
+    async def run():
+        websocket = FakeWebSocket()
+        task, session = await started_session(websocket)
+        session.expire("idle_timeout")
+        await asyncio.wait_for(task, 10)
+        assert ended == ["idle_timeout"]
+        assert websocket.types_sent()[-1] == "conversation_end"
+        assert websocket.close_code == 1000
+
+    asyncio.run(run())
+
+
+def test_drain_closes_sessions_for_a_restart(ended):
+    async def run():
+        websockets = [FakeWebSocket(), FakeWebSocket()]
+        tasks = [(await started_session(websocket))[0] for websocket in websockets]
+        await asyncio.wait_for(ws_speech.drain_sessions(asyncio.get_running_loop().time()), 10)
+        await asyncio.wait_for(asyncio.gather(*tasks), 10)
+        assert ended == ["server_shutdown", "server_shutdown"]
+        for websocket in websockets:
+            assert websocket.sent[-1]["type"] == "server_restart"
+            assert websocket.sent[-1]["payload"]["retry_after"] == ws_speech.RECONNECT_AFTER
+            assert websocket.close_code == 1012
+
+    asyncio.run(run())
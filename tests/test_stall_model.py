@@ -0,0 +1,80 @@
+"""The local stall classifier survives a save/load round trip."""
+import json
+
+import numpy as np
+import pytest
+
+from backend.conversation_evaluation import stall_model
+from backend.conversation_evaluation.stall_model import DENSE_FEATURES, HASH_BUCKETS, StallModel, extract_features
+
+
+def history(*user_turns):
+    messages = [{"role": "system", "content": "You discuss an article."}]
+    for text in user_turns:
+        messages.append({"role": "assistant", "content": "What do you think about the article's main claim?"})
+        messages.append({"role": "user", "content": text})
+    return messages
+
+
+ENGAGED = [
+    history("I think the author exaggerates, because the numbers in the second paragraph are not sourced."),
+    history("Why would they leave out the opposing view?", "That seems one-sided, the evidence is weak."),
+    history("The claim about prices is misleading since wages rose as well, I disagree with it."),
+]
+STALLED = [
+    history("ok", "ok", "ok"),
+    history("yes", "i don't know", "idk"),
+    history("fine", "whatever", "no"),
+]
+
+
+@pytest.fixture
+def model():
+    X = np.stack([extract_features(h) for h in ENGAGED + STALLED])
+    y = np.array([0] * len(ENGAGED) + [1] * len(STALLED))
+    model = StallModel.fit(X, y, iterations=300)
+    model.metrics = {"accuracy": 1.0}
+    return model
+
+
+def test_save_load_round_trip(model, tmp_path):
+    path = tmp_path / "stall_model.json"
+    model.save(path)
+    loaded = StallModel.load(path)
+
+    np.testing.assert_array_equal(loaded.weights, model.weights)
+    np.testing.assert_array_equal(loaded.mean, model.mean)
+    np.testing.assert_array_equal(loaded.scale, model.scale)
+    assert loaded.bias == model.bias
+    assert loaded.metrics == {"accuracy": 1.0}
+    for text_history in ENGAGED + STALLED:
+        assert loaded.stalled_probability(text_history) == model.stalled_probability(text_history)
+    assert loaded.stalled_probability(STALLED[0]) > 0.5 > loaded.stalled_probability(ENGAGED[0])
+
+    saved = json.loads(path.read_text(encoding="utf-8"))
+    assert saved["features"][:len(DENSE_FEATURES)] == list(DENSE_FEATURES)
+    assert len(saved["features"]) == len(DENSE_FEATURES) + HASH_BUCKETS
+
+
+def test_load_rejects_another_feature_set(model, tmp_path):
+    path = tmp_path / "stall_model.json"
+    model.save(path)
+    saved = json.loads(path.read_text(encoding="utf-8"))
+    saved["weights"] = saved["weights"][:-1]
+    path.write_text(json.dumps(saved), encoding="utf-8")
+    with pytest.raises(ValueError):
+        StallModel.load(path)
+
+
+def test_local_verdict_uses_the_saved_model(model, tmp_path, monkeypatch):
+    path = tmp_path / "stall_model.json"
+    model.save(path)
+    monkeypatch.setattr(stall_model, "MODEL_PATH", path)
+    monkeypatch.setattr(stall_model, "ENABLED", True)
+    monkeypatch.setattr(stall_model, "CONFIDENCE", 0.5)
+    monkeypatch.setattr(stall_model, "_model", None)
+    monkeypatch.setattr(stall_model, "_loaded", False)
+
+    assert stall_model.local_verdict(STALLED[1]) == 1
+    assert stall_model.local_verdict(ENGAGED[1]) == 0
+    assert stall_model.local_verdict([]) is None
@@ -0,0 +1,66 @@
+"""Streamed recordings are cut into segments and transcribed while the user speaks."""
+import asyncio
+
+import numpy as np
+
+from backend.audio_processing.streaming_uplink import MAX_SEGMENT_SECONDS, StreamingUplink
+
+
+def speech(seconds: float, sample_rate: int) -> np.ndarray:
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    return (np.sin(2 * np.pi * 220 * t) * 6000).astype(np.int16)
+
+
+def silence(seconds: float, sample_rate: int) -> np.ndarray:
+    return np.zeros(int(seconds * sample_rate), dtype=np.int16)
+
+
+def stream(uplink: StreamingUplink, samples: np.ndarray, chunk_seconds: float) -> None:
+    data = samples.tobytes()
+    chunk = int(chunk_seconds * uplink.sample_rate) * 2
+    for i in range(0, len(data), chunk):
+        uplink.feed(data[i:i + chunk])
+
+
+def test_continuous_speech_longer_than_a_segment_is_cut():
+    async def run():
+        sample_rate = 16000
+        segments = []
+
+        async def transcribe(wav_bytes):
+            segments.append(len(wav_bytes))
+            return f"part{len(segments)}"
+
+        uplink = StreamingUplink(transcribe, sample_rate)
+        # The leading silence moves the segment start off the one second slices the ring is written in
+        samples = np.concatenate([silence(0.5, sample_rate), speech(MAX_SEGMENT_SECONDS + 1, sample_rate)])
+        stream(uplink, samples, 0.2)
+        transcript, wav_bytes = await uplink.finish()
+        assert transcript == "part1 part2"
+        assert len(segments) == 2
+        speech_samples = (len(wav_bytes) - 44) // 2
+        assert MAX_SEGMENT_SECONDS + 1 <= speech_samples / sample_rate <= MAX_SEGMENT_SECONDS + 1.5
+
+    asyncio.run(run())
+
+
+def test_pause_closes_a_segment_and_silence_is_no_speech():
+    async def run():
+        sample_rate = 24000
+
+        async def transcribe(wav_bytes):
+            return "words"
+
+        uplink = StreamingUplink(transcribe, sample_rate)
+        stream(uplink, np.concatenate([speech(1.0, sample_rate), silence(1.0, sample_rate)]), 0.1)
+        assert len(uplink._tasks) == 1  # transcribed before the stop
+        stream(uplink, speech(0.5, sample_rate), 0.1)
+        transcript, wav_bytes = await uplink.finish()
+        assert transcript == "words words"
+        assert wav_bytes is not None
+
+        silent = StreamingUplink(transcribe, sample_rate)
+        stream(silent, silence(2.0, sample_rate), 0.1)
+        assert await silent.finish() == ("", None)
+
+    asyncio.run(run())
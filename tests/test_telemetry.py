@@ -0,0 +1,14 @@
+"""Metrics helpers are no-ops when METRICS_ENABLED=0."""
+import asyncio
+
+from backend.observability import telemetry
+
+
+def test_queue_refresher_does_not_run_without_metrics(monkeypatch):
+    monkeypatch.setattr(telemetry, "METRICS_ENABLED", False)
+    calls = []
+    monkeypatch.setattr(telemetry, "_update_queue_depths", lambda: calls.append(1))
+
+    asyncio.run(asyncio.wait_for(telemetry.refresh_queue_depths(interval=0.01), timeout=1))
+    assert calls == []
+    assert telemetry.render_metrics() is None